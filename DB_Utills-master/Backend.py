@@ -24,27 +24,33 @@ from models.manufacturer import manufacturer
 from models.classroom import classroom
 from models.web_user import WebUser
 from models.ticket import Ticket
-from models.db_session import create_session, Base
+from models.db_session import create_session, get_db, get_read_db, pool_stats, Base
+from models.read_rows import (
+    TICKET_STATUSES, DeviceRow, TicketRow, decode_ticket_cursor, encode_ticket_cursor, get_device_row, label_rows,
+    list_ticket_rows, search_device_rows,
+)
+from services.serialization import FastJSONResponse, device_serializer, encode_listing
 from schemas import (
     EquipmentCreate, EquipmentUpdate,
     CategoryCreate, CategoryUpdate, CategoryResponse,
     ManufacturerCreate, ManufacturerUpdate, ManufacturerResponse,
-    ClassroomCreate, ClassroomUpdate, ClassroomResponse,
+    ClassroomCreate, ClassroomUpdate, ClassroomResponse, ClassroomAssignRequest,
     LoginRequest, TokenResponse, RefreshRequest,
     UserCreate, UserUpdate, UserResponse,
     TicketCreate, TicketStatusUpdate, TicketResponse,
+    DiscoveryProfileCreate, DiscoveryProfileUpdate,
 )
 from auth import (
-    hash_password, verify_password,
+    hash_password_async, verify_password_async,
     create_access_token, create_refresh_token, decode_token,
-    get_current_user, require_role,
+    get_current_user, require_role, invalidate_principal,
 )
 from datetime import datetime
 from fastapi.middleware import Middleware
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-import qrcode
-import io
+from typing import List, Optional
+import json
+from dataclasses import asdict
 try:
     from services.snmp_service import SNMPService
     SNMP_AVAILABLE = True
@@ -54,15 +60,34 @@ except ImportError as e:
     SNMPService = None
 
 try:
-    from services.network_discovery_service import NetworkDiscoveryService
+    from services.network_discovery_service import NetworkDiscoveryService, DiscoveryProgress, normalize_subnet
     DISCOVERY_AVAILABLE = True
 except ImportError as e:
     DISCOVERY_AVAILABLE = False
     print(f"WARNING: Network discovery service not available: {e}")
     NetworkDiscoveryService = None
+    DiscoveryProgress = None
+    normalize_subnet = None
+
+try:
+    from services.discovery_scheduler import DiscoveryScheduler, next_window_start
+except ImportError as e:
+    print(f"WARNING: Discovery scheduler not available: {e}")
+    DiscoveryScheduler = None
 
 from models.device_snmp_config import DeviceSNMPConfig
+from models.discovered_host import DiscoveredHost
+from models.discovery_profile import DiscoveryProfile, DiscoveryRun
 from models.config import Settings
+from services.invalidation_bus import invalidation_bus
+from services.classroom_assignment import classroom_assignment_jobs
+from services.map_clusters import get_map_devices, invalidate_map_devices
+from services.map_bundle import get_map_bundle
+from services.ticket_counters import ticket_counters
+from services.qr_codes import (
+    LABEL_FORMATS, QR_FORMATS, LabelQueueFull, equipment_url, label_renderer, qr_cache, qr_etag,
+)
+from models.db_replicas import replicas
 from sqlalchemy import select
 import logging
 
@@ -95,8 +120,12 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    from models.db_session import global_init
-    await global_init()
+    from models.db_session import global_init, get_database_url
+    await global_init(settings)
+    # Инвалидация кэшей (пользователи и др.) между воркерами
+    await invalidation_bus.start(get_database_url())
+    # Реплики для чтения: первая проверка отставания до приёма запросов
+    await replicas.start()
     
     # Создаем дефолтные места, если их нет
     async with create_session() as db:
@@ -119,17 +148,31 @@ async def lifespan(app: FastAPI):
             await WebUser.create(
                 db,
                 username="admin",
-                hashed_password=hash_password("admin"),
+                hashed_password=await hash_password_async("admin"),
                 full_name="Администратор",
                 role="admin",
             )
             print("WARNING: Создан администратор по умолчанию (admin/admin). Смените пароль!")
 
+    # Плановая SNMP Discovery по профилям
+    scheduler = None
+    if DISCOVERY_AVAILABLE and DiscoveryScheduler and settings.DISCOVERY_SCHEDULER_ENABLED:
+        scheduler = DiscoveryScheduler(poll_interval=settings.DISCOVERY_SCHEDULER_POLL_SECONDS)
+        scheduler.start()
+
+    classroom_assignment_jobs.start(settings.CLASSROOM_ASSIGN_HEARTBEAT_SECONDS)
+    label_renderer.start(settings.QR_LABEL_WORKERS)
+
     yield
     # Shutdown
-    pass
+    if scheduler is not None:
+        await scheduler.stop()
+    await classroom_assignment_jobs.stop()
+    label_renderer.stop()
+    await invalidation_bus.stop()
+    await replicas.stop()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -137,6 +180,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset"],
 )
 
 # Обработчик для preflight запросов
@@ -153,241 +197,194 @@ async def options_handler(request: Request, path: str):
     )
 
 @app.get("/places", tags=["Карты"])
-async def get_places(current_user: WebUser = Depends(get_current_user)):
+async def get_places(db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить все карты (места)"""
-    async with create_session() as db:
-        places = await place.get_all_places(db)
-        return [{"id": p.id, "name": p.name} for p in places]
+    places = await place.get_all_places(db)
+    return [{"id": p.id, "name": p.name} for p in places]
 
 @app.post("/add_place", tags=["оборудование"])
-async def add_place(place_data: dict, current_user: WebUser = Depends(require_role("admin"))):
-    async with create_session() as db:
-        existing = await db.execute(select(place).where(place.name == place_data["name"]))
-        existing = existing.scalar_one_or_none()
-        
-        if existing:
-            raise HTTPException(status_code=400, detail="Place with this name already exists")
-        
-        new_place = place(name=place_data["name"])
-        db.add(new_place)
-        await db.commit()
-        await db.refresh(new_place)
-        return {"message": "Place added successfully", "id": new_place.id}
+async def add_place(place_data: dict, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    existing = await db.execute(select(place).where(place.name == place_data["name"]))
+    existing = existing.scalar_one_or_none()
+    
+    if existing:
+        raise HTTPException(status_code=400, detail="Place with this name already exists")
+    
+    new_place = place(name=place_data["name"])
+    db.add(new_place)
+    await db.commit()
+    await db.refresh(new_place)
+    return {"message": "Place added successfully", "id": new_place.id}
 
 @app.post("/add_device", tags=["оборудование"])
-async def add_device(equipment: EquipmentCreate, current_user: WebUser = Depends(require_role("admin", "operator"))):
-    async with create_session() as db:
-        existing = await db.execute(select(device).where(device.name == equipment.name))
-        existing = existing.scalar_one_or_none()
-        
-        if existing:
-            raise HTTPException(status_code=400, detail="Device with this name already exists")
-        
-        # Преобразуем строки дат в объекты date
-        equipment_dict = equipment.model_dump()
-        equipment_dict["releaseDate"] = datetime.strptime(equipment_dict["releaseDate"], "%Y-%m-%d").date()
-        equipment_dict["softwareStartDate"] = datetime.strptime(equipment_dict["softwareStartDate"], "%Y-%m-%d").date()
-        
-        # Обрабатываем опциональные даты
-        if equipment_dict.get("softwareEndDate"):
-            equipment_dict["softwareEndDate"] = datetime.strptime(equipment_dict["softwareEndDate"], "%Y-%m-%d").date()
-        else:
-            equipment_dict["softwareEndDate"] = None
-            
-        if equipment_dict.get("updateDate"):
-            equipment_dict["updateDate"] = datetime.strptime(equipment_dict["updateDate"], "%Y-%m-%d").date()
-        else:
-            equipment_dict["updateDate"] = None
-        
-        # Обрабатываем числовые поля
-        if equipment_dict.get("xCord") is not None and equipment_dict["xCord"] != "":
-            equipment_dict["xCord"] = float(equipment_dict["xCord"])
-        else:
-            equipment_dict["xCord"] = None
-            
-        if equipment_dict.get("yCord") is not None and equipment_dict["yCord"] != "":
-            equipment_dict["yCord"] = float(equipment_dict["yCord"])
-        else:
-            equipment_dict["yCord"] = None
-            
-        if equipment_dict.get("mapId") is not None and equipment_dict["mapId"] != "":
-            equipment_dict["mapId"] = int(equipment_dict["mapId"])
-        else:
-            equipment_dict["mapId"] = None
-        
-        new_device = device(**equipment_dict)
-        db.add(new_device)
-        await db.commit()
-        await db.refresh(new_device)
-        return {"message": "Device added successfully", "id": new_device.id, "device": {
-            "id": new_device.id,
-            "name": new_device.name,
-            "category": new_device.category,
-            "xCord": new_device.xCord,
-            "yCord": new_device.yCord,
-            "place_id": new_device.place_id,
-            "version": new_device.version,
-            "releaseDate": new_device.releaseDate.isoformat() if new_device.releaseDate else None,
-            "softwareStartDate": new_device.softwareStartDate.isoformat() if new_device.softwareStartDate else None,
-            "softwareEndDate": new_device.softwareEndDate.isoformat() if new_device.softwareEndDate else None,
-            "updateDate": new_device.updateDate.isoformat() if new_device.updateDate else None,
-            "manufacturer": new_device.manufacturer,
-            "mapId": new_device.mapId,
-        }}
+async def add_device(equipment: EquipmentCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin", "operator"))):
+    existing = await db.execute(select(device).where(device.name == equipment.name))
+    existing = existing.scalar_one_or_none()
+    
+    if existing:
+        raise HTTPException(status_code=400, detail="Device with this name already exists")
+    
+    # Преобразуем строки дат в объекты date
+    equipment_dict = equipment.model_dump()
+    equipment_dict["releaseDate"] = datetime.strptime(equipment_dict["releaseDate"], "%Y-%m-%d").date()
+    equipment_dict["softwareStartDate"] = datetime.strptime(equipment_dict["softwareStartDate"], "%Y-%m-%d").date()
+    
+    # Обрабатываем опциональные даты
+    if equipment_dict.get("softwareEndDate"):
+        equipment_dict["softwareEndDate"] = datetime.strptime(equipment_dict["softwareEndDate"], "%Y-%m-%d").date()
+    else:
+        equipment_dict["softwareEndDate"] = None
+        
+    if equipment_dict.get("updateDate"):
+        equipment_dict["updateDate"] = datetime.strptime(equipment_dict["updateDate"], "%Y-%m-%d").date()
+    else:
+        equipment_dict["updateDate"] = None
+    
+    # Обрабатываем числовые поля
+    if equipment_dict.get("xCord") is not None and equipment_dict["xCord"] != "":
+        equipment_dict["xCord"] = float(equipment_dict["xCord"])
+    else:
+        equipment_dict["xCord"] = None
+        
+    if equipment_dict.get("yCord") is not None and equipment_dict["yCord"] != "":
+        equipment_dict["yCord"] = float(equipment_dict["yCord"])
+    else:
+        equipment_dict["yCord"] = None
+        
+    if equipment_dict.get("mapId") is not None and equipment_dict["mapId"] != "":
+        equipment_dict["mapId"] = int(equipment_dict["mapId"])
+    else:
+        equipment_dict["mapId"] = None
+
+    try:
+        await device.resolve_references(db, [equipment_dict])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    new_device = device(**equipment_dict)
+    db.add(new_device)
+    await db.commit()
+    await db.refresh(new_device)
+    await invalidate_map_devices(new_device.mapId)
+    return {"message": "Device added successfully", "id": new_device.id, "device": device_serializer.dict(new_device)}
 
 @app.get("/equipment/{device_id}", tags=["оборудование"])
-async def get_device_by_id(device_id: int, current_user: WebUser = Depends(get_current_user)):
+async def get_device_by_id(device_id: int, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить информацию об оборудовании по ID"""
-    async with create_session() as db:
-        # Сначала проверяем существование устройства
-        device_result = await db.execute(select(device).where(device.id == device_id))
-        d = device_result.scalar_one_or_none()
-        
-        if not d:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        # Получаем категорию если она есть
-        cat = None
-        if d.category:
-            category_result = await db.execute(select(category).where(category.name == d.category))
-            cat = category_result.scalar_one_or_none()
-        
-        # Получаем SNMP конфигурацию
-        snmp_config = await DeviceSNMPConfig.get_by_device_id(db, d.id)
-        
-        device_dict = {
-            "name": d.name, 
-            "category": d.category, 
-            "categoryIcon": cat.icon if cat else 'default',
-            "xCord": d.xCord, 
-            "yCord": d.yCord,
-            "id": d.id,
-            "place_id": d.place_id,
-            "version": d.version,
-            "releaseDate": d.releaseDate.isoformat() if d.releaseDate else None,
-            "softwareStartDate": d.softwareStartDate.isoformat() if d.softwareStartDate else None,
-            "softwareEndDate": d.softwareEndDate.isoformat() if d.softwareEndDate else None,
-            "updateDate": d.updateDate.isoformat() if d.updateDate else None,
-            "manufacturer": d.manufacturer,
-            "mapId": d.mapId,
-        }
-        
-        # Добавляем SNMP конфигурацию если есть
-        if snmp_config:
-            snmp_config_dict = snmp_config.to_dict()
-            # Если SNMP отключен, очищаем статус в возвращаемых данных, чтобы фронтенд не показывал его
-            if not snmp_config.enabled:
-                snmp_config_dict['status'] = None
-                snmp_config_dict['response_time'] = None
-                snmp_config_dict['last_check'] = None
-            device_dict["snmp_config"] = snmp_config_dict
-            # НЕ возвращаем статус если SNMP отключен или статус 'disabled'
-            if snmp_config.enabled and snmp_config.status and snmp_config.status != 'disabled':
-                device_dict["snmp_status"] = {
-                    "status": snmp_config.status,
-                    "message": f"Last check: {snmp_config.last_check.isoformat() if snmp_config.last_check else 'Never'}",
-                    "response_time": snmp_config.response_time,
-                    "timestamp": snmp_config.last_check.isoformat() if snmp_config.last_check else None
-                }
-        
-        return device_dict
+    row = await get_device_row(db, device_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return FastJSONResponse(row.to_dict())
 
 @app.get("/equipment/{device_id}/qr", tags=["оборудование"])
-async def get_device_qr_code(device_id: int, current_user: WebUser = Depends(get_current_user)):
-    """Генерирует QR код для оборудования"""
-    async with create_session() as db:
-        result = await db.execute(select(device).where(device.id == device_id))
-        db_device = result.scalar_one_or_none()
-        
-        if not db_device:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        # Создаем URL для QR кода из конфигурации
-        # URL фронтенда можно задать через переменную окружения FRONTEND_URL
-        # Например: export FRONTEND_URL="http://university.local:5173"
-        frontend_url = settings.FRONTEND_URL
-        qr_url = f"{frontend_url}/equipment/{device_id}"
-        
-        # Генерируем QR код
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        
-        # Создаем изображение
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Сохраняем в байтовый поток
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(img_byte_arr.read()),
-            media_type="image/png",
-            headers={"Content-Disposition": f"inline; filename=qr_{device_id}.png"}
+async def get_device_qr_code(device_id: int, request: Request, format: str = "png", db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
+    """QR код оборудования (format: png | svg); готовые коды кэшируются, ETag для повторных запросов"""
+    if format not in QR_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be png or svg")
+    exists = (await db.execute(select(device.id).where(device.id == device_id))).scalar_one_or_none()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    # URL фронтенда можно задать через переменную окружения FRONTEND_URL
+    # Например: export FRONTEND_URL="http://university.local:5173"
+    qr_url = equipment_url(settings.FRONTEND_URL, device_id)
+    headers = {"ETag": qr_etag(qr_url, format), "Cache-Control": "private, max-age=86400"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    body = await qr_cache.get(device_id, qr_url, format)
+    headers["Content-Disposition"] = f"inline; filename=qr_{device_id}.{format}"
+    return Response(body, media_type=QR_FORMATS[format], headers=headers)
+
+@app.get("/labels", tags=["оборудование"])
+async def get_label_sheet(category_id: Optional[int] = None, map_id: Optional[int] = None, format: str = "pdf",
+                          offset: Optional[int] = None,
+                          db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(require_role("admin", "operator"))):
+    """
+    Наклейки с QR кодами для устройств категории и/или карты: PDF (листы A4) или ZIP с PNG (operator, admin).
+    Не больше QR_LABEL_MAX_DEVICES устройств за запрос; большой набор печатается частями:
+    offset=0, затем offset из заголовка X-Next-Offset, пока он есть.
+    """
+    if format not in LABEL_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be pdf or zip")
+    if category_id is None and map_id is None:
+        raise HTTPException(status_code=400, detail="category_id or map_id is required")
+    if offset is not None and offset < 0:
+        raise HTTPException(status_code=400, detail="offset must be >= 0")
+    part_size = settings.QR_LABEL_MAX_DEVICES
+    rows = await label_rows(db, category_id, map_id, offset=offset or 0, limit=part_size + 1)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No devices found")
+    next_offset = None
+    if len(rows) > part_size:
+        if offset is None:
+            raise HTTPException(status_code=400, detail=f"Too many devices, at most {part_size} per sheet; "
+                                                         f"print in parts with offset=0, {part_size}, ...")
+        rows, next_offset = rows[:part_size], offset + part_size
+    labels = [(device_id, equipment_url(settings.FRONTEND_URL, device_id), name, room or "")
+              for device_id, name, room in rows]
+    try:
+        body = await label_renderer.render(
+            labels, format, workers=settings.QR_LABEL_WORKERS, font_path=settings.QR_LABEL_FONT_PATH,
+            queue_timeout=settings.QR_LABEL_QUEUE_TIMEOUT_SECONDS,
         )
+    except LabelQueueFull:
+        raise HTTPException(status_code=503, detail="Label rendering is busy, try again later", headers={"Retry-After": "5"})
+    scope = "_".join(f"{name}{value}" for name, value in (("category", category_id), ("map", map_id)) if value is not None)
+    if offset is not None:
+        scope += f"_from{offset}"
+    headers = {"Content-Disposition": f"attachment; filename=labels_{scope}.{format}"}
+    if next_offset is not None:
+        headers["X-Next-Offset"] = str(next_offset)
+    return Response(body, media_type=LABEL_FORMATS[format], headers=headers)
 
 @app.get("/search", tags=["оборудование"])
-async def search_devices(current_user: WebUser = Depends(get_current_user)):
-    async with create_session() as db:
-        # Делаем JOIN с таблицей категорий, чтобы получить иконку
-        result = await db.execute(
-            select(device, category)
-            .outerjoin(category, device.category == category.name)
-        )
-        devices_with_categories = result.all()
-        
-        devices_list = []
-        for d, cat in devices_with_categories:
-            # Получаем SNMP конфигурацию для каждого устройства
-            snmp_config = await DeviceSNMPConfig.get_by_device_id(db, d.id)
-            
-            device_dict = {
-                "name": d.name, 
-                "category": d.category, 
-                "categoryIcon": cat.icon if cat else 'default',  # Добавляем иконку категории
-                "xCord": d.xCord, 
-                "yCord": d.yCord,
-                "id": d.id,
-                "place_id": d.place_id,
-                "version": d.version,
-                "releaseDate": d.releaseDate.isoformat() if d.releaseDate else None,
-                "softwareStartDate": d.softwareStartDate.isoformat() if d.softwareStartDate else None,
-                "softwareEndDate": d.softwareEndDate.isoformat() if d.softwareEndDate else None,
-                "updateDate": d.updateDate.isoformat() if d.updateDate else None,
-                "manufacturer": d.manufacturer,
-                "mapId": d.mapId,
-            }
-            
-            # Добавляем SNMP конфигурацию если есть
-            if snmp_config:
-                snmp_config_dict = snmp_config.to_dict()
-                # Если SNMP отключен, очищаем статус в возвращаемых данных, чтобы фронтенд не показывал его
-                if not snmp_config.enabled:
-                    snmp_config_dict['status'] = None
-                    snmp_config_dict['response_time'] = None
-                    snmp_config_dict['last_check'] = None
-                device_dict["snmp_config"] = snmp_config_dict
-                # Также добавляем статус как отдельное поле для удобства
-                # НЕ возвращаем статус если SNMP отключен или статус 'disabled'
-                if snmp_config.enabled and snmp_config.status and snmp_config.status != 'disabled':
-                    device_dict["snmp_status"] = {
-                        "status": snmp_config.status,
-                        "message": f"Last check: {snmp_config.last_check.isoformat() if snmp_config.last_check else 'Never'}",
-                        "response_time": snmp_config.response_time,
-                        "timestamp": snmp_config.last_check.isoformat() if snmp_config.last_check else None
-                    }
-            
-            devices_list.append(device_dict)
-        
-        return {
-            "devices": devices_list
-        }
+async def search_devices(request: Request, q: Optional[str] = None, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
+    # Один запрос с JOIN категории (иконка) и SNMP-конфигурации, без ORM-объектов
+    pattern = None
+    if q:
+        # Подстрока в имени — на PostgreSQL идёт по триграммному индексу ix_device_name_trgm
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    rows = await search_device_rows(db, pattern)
+    # Accept: application/vnd.columnar+json | application/msgpack — компактные форматы для больших списков
+    return encode_listing(request, rows, DeviceRow.to_dict, DeviceRow.FIELDS, DeviceRow.to_row, key="devices")
+
+@app.get("/maps/{map_id}/devices", tags=["оборудование"])
+async def get_map_devices_in_viewport(map_id: int, zoom: int = 0, min_x: Optional[float] = None, min_y: Optional[float] = None,
+                                      max_x: Optional[float] = None, max_y: Optional[float] = None,
+                                      db: AsyncSession = Depends(get_read_db), primary_db: AsyncSession = Depends(get_db),
+                                      current_user: WebUser = Depends(get_current_user)):
+    """Устройства карты в окне просмотра: отдельные маркеры или кластеры сетки уровня zoom (количество, худший статус SNMP)"""
+    viewport = (min_x, min_y, max_x, max_y)
+    if all(v is None for v in viewport):
+        viewport = None
+    elif any(v is None for v in viewport):
+        raise HTTPException(status_code=400, detail="Viewport needs min_x, min_y, max_x and max_y")
+    if zoom < 0:
+        raise HTTPException(status_code=400, detail="Zoom must be non-negative")
+    result = await get_map_devices(
+        db, map_id, zoom, viewport,
+        grid=settings.MAP_CLUSTER_GRID, max_zoom=settings.MAP_CLUSTER_MAX_ZOOM,
+        max_markers=settings.MAP_CLUSTER_MAX_MARKERS, ttl=settings.MAP_CLUSTER_CACHE_TTL_SECONDS,
+        # Сводка кэшируется до инвалидации — с основной базы; маркеры — с реплики
+        primary=primary_db,
+    )
+    return FastJSONResponse(result)
+
+@app.get("/maps/{map_id}/bundle", tags=["Карты"])
+async def get_map_bundle_endpoint(map_id: int, request: Request, simplify: Optional[float] = None,
+                                  db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(get_current_user)):
+    """Карта, её аудитории (simplify — допуск упрощения полигонов), маркеры устройств со статусом и иконки категорий одним ответом"""
+    if simplify is not None and not 0 <= simplify <= 10:
+        raise HTTPException(status_code=400, detail="simplify must be between 0 and 10")
+    # Фрагменты кэшируются до инвалидации — читаем с основной базы, не с реплики
+    bundle = await get_map_bundle(db, map_id, simplify, markers_ttl=settings.MAP_CLUSTER_CACHE_TTL_SECONDS)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Map not found")
+    body, etag = bundle
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 async def _delete_device_dependents(db: AsyncSession, device_id: int) -> None:
@@ -396,412 +393,417 @@ async def _delete_device_dependents(db: AsyncSession, device_id: int) -> None:
 
 
 @app.delete("/delete_device/{device_id}", tags=["оборудование"])
-async def delete_device(device_id: int, current_user: WebUser = Depends(require_role("admin", "operator"))):
-    async with create_session() as db:
-        result = await db.execute(select(device).where(device.id == device_id))
-        db_device = result.scalar_one_or_none()
-        
-        if not db_device:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        await _delete_device_dependents(db, device_id)
-        await db.execute(delete(device).where(device.id == device_id))
-        await db.commit()
-        
-        return {"message": f"Device {device_id} deleted successfully"}
+async def delete_device(device_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin", "operator"))):
+    result = await db.execute(select(device).where(device.id == device_id))
+    db_device = result.scalar_one_or_none()
+    
+    if not db_device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    await _delete_device_dependents(db, device_id)
+    await db.execute(delete(device).where(device.id == device_id))
+    await db.commit()
+    await invalidate_map_devices(db_device.mapId)
+    
+    return {"message": f"Device {device_id} deleted successfully"}
 
 @app.delete("/delete_devices_by_category/{category_id}", tags=["оборудование"])
-async def delete_devices_by_category(category_id: int, current_user: WebUser = Depends(require_role("admin"))):
+async def delete_devices_by_category(category_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Удалить все устройства категории"""
-    async with create_session() as db:
-        # Получаем категорию
-        category_result = await db.execute(select(category).where(category.id == category_id))
-        category_obj = category_result.scalar_one_or_none()
-        
-        if not category_obj:
-            raise HTTPException(status_code=404, detail="Category not found")
-        
-        # Получаем все устройства этой категории
-        devices_result = await db.execute(select(device).where(device.category == category_obj.name))
-        devices = devices_result.scalars().all()
-        
-        if not devices:
-            raise HTTPException(status_code=404, detail="No devices found for this category")
-        
-        for d in devices:
-            await _delete_device_dependents(db, d.id)
-        await db.execute(delete(device).where(device.category == category_obj.name))
-        await db.commit()
-        
-        return {
-            "message": f"All devices from category '{category_obj.name}' deleted successfully",
-            "deleted_count": len(devices)
-        }
+    # Получаем категорию
+    category_result = await db.execute(select(category).where(category.id == category_id))
+    category_obj = category_result.scalar_one_or_none()
+    
+    if not category_obj:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    # Получаем все устройства этой категории
+    devices_result = await db.execute(select(device).where(device.category_id == category_id))
+    devices = devices_result.scalars().all()
+    
+    if not devices:
+        raise HTTPException(status_code=404, detail="No devices found for this category")
+    
+    for d in devices:
+        await _delete_device_dependents(db, d.id)
+    await db.execute(delete(device).where(device.category_id == category_id))
+    await db.commit()
+    await invalidate_map_devices(*(d.mapId for d in devices))
+    
+    return {
+        "message": f"All devices from category '{category_obj.name}' deleted successfully",
+        "deleted_count": len(devices)
+    }
 
 @app.put("/update_device/{device_id}", tags=["оборудование"])
-async def update_device(device_id: int, equipment: EquipmentUpdate, current_user: WebUser = Depends(require_role("admin", "operator"))):
-    async with create_session() as db:
-        result = await db.execute(select(device).where(device.id == device_id))
-        db_device = result.scalar_one_or_none()
-        
-        if not db_device:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        # Преобразуем данные для обновления
-        update_data = equipment.model_dump(exclude_unset=True)
-        
-        # Обрабатываем даты, если они переданы
-        if "releaseDate" in update_data and update_data["releaseDate"]:
-            update_data["releaseDate"] = datetime.strptime(update_data["releaseDate"], "%Y-%m-%d").date()
-        
-        if "softwareStartDate" in update_data and update_data["softwareStartDate"]:
-            update_data["softwareStartDate"] = datetime.strptime(update_data["softwareStartDate"], "%Y-%m-%d").date()
-        
-        if "softwareEndDate" in update_data and update_data["softwareEndDate"]:
-            update_data["softwareEndDate"] = datetime.strptime(update_data["softwareEndDate"], "%Y-%m-%d").date()
-        elif "softwareEndDate" in update_data and update_data["softwareEndDate"] is None:
-            update_data["softwareEndDate"] = None
-            
-        if "updateDate" in update_data and update_data["updateDate"]:
-            update_data["updateDate"] = datetime.strptime(update_data["updateDate"], "%Y-%m-%d").date()
-        elif "updateDate" in update_data and update_data["updateDate"] is None:
-            update_data["updateDate"] = None
-        
-        # Обрабатываем числовые поля
-        if "xCord" in update_data and update_data["xCord"] is not None and update_data["xCord"] != "":
-            update_data["xCord"] = float(update_data["xCord"])
-        elif "xCord" in update_data and (update_data["xCord"] is None or update_data["xCord"] == ""):
-            update_data["xCord"] = None
-            
-        if "yCord" in update_data and update_data["yCord"] is not None and update_data["yCord"] != "":
-            update_data["yCord"] = float(update_data["yCord"])
-        elif "yCord" in update_data and (update_data["yCord"] is None or update_data["yCord"] == ""):
-            update_data["yCord"] = None
-            
-        if "mapId" in update_data and update_data["mapId"] is not None and update_data["mapId"] != "":
-            update_data["mapId"] = int(update_data["mapId"])
-        elif "mapId" in update_data and (update_data["mapId"] is None or update_data["mapId"] == ""):
-            update_data["mapId"] = None
-        
-        # Выполняем обновление
-        await db.execute(update(device).where(device.id == device_id).values(**update_data))
-        await db.commit()
-        
-        # Получаем обновленное устройство
-        result = await db.execute(select(device).where(device.id == device_id))
-        updated_device = result.scalar_one()
-        
-        return {"message": "Device updated successfully", "device": {
-            "id": updated_device.id,
-            "name": updated_device.name,
-            "category": updated_device.category,
-            "xCord": updated_device.xCord,
-            "yCord": updated_device.yCord,
-            "place_id": updated_device.place_id,
-            "version": updated_device.version,
-            "releaseDate": updated_device.releaseDate.isoformat() if updated_device.releaseDate else None,
-            "softwareStartDate": updated_device.softwareStartDate.isoformat() if updated_device.softwareStartDate else None,
-            "softwareEndDate": updated_device.softwareEndDate.isoformat() if updated_device.softwareEndDate else None,
-            "updateDate": updated_device.updateDate.isoformat() if updated_device.updateDate else None,
-            "manufacturer": updated_device.manufacturer,
-            "mapId": updated_device.mapId,
-        }}
+async def update_device(device_id: int, equipment: EquipmentUpdate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin", "operator"))):
+    result = await db.execute(select(device).where(device.id == device_id))
+    db_device = result.scalar_one_or_none()
+    
+    if not db_device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    # Преобразуем данные для обновления
+    update_data = equipment.model_dump(exclude_unset=True)
+    
+    # Обрабатываем даты, если они переданы
+    if "releaseDate" in update_data and update_data["releaseDate"]:
+        update_data["releaseDate"] = datetime.strptime(update_data["releaseDate"], "%Y-%m-%d").date()
+    
+    if "softwareStartDate" in update_data and update_data["softwareStartDate"]:
+        update_data["softwareStartDate"] = datetime.strptime(update_data["softwareStartDate"], "%Y-%m-%d").date()
+    
+    if "softwareEndDate" in update_data and update_data["softwareEndDate"]:
+        update_data["softwareEndDate"] = datetime.strptime(update_data["softwareEndDate"], "%Y-%m-%d").date()
+    elif "softwareEndDate" in update_data and update_data["softwareEndDate"] is None:
+        update_data["softwareEndDate"] = None
+        
+    if "updateDate" in update_data and update_data["updateDate"]:
+        update_data["updateDate"] = datetime.strptime(update_data["updateDate"], "%Y-%m-%d").date()
+    elif "updateDate" in update_data and update_data["updateDate"] is None:
+        update_data["updateDate"] = None
+    
+    # Обрабатываем числовые поля
+    if "xCord" in update_data and update_data["xCord"] is not None and update_data["xCord"] != "":
+        update_data["xCord"] = float(update_data["xCord"])
+    elif "xCord" in update_data and (update_data["xCord"] is None or update_data["xCord"] == ""):
+        update_data["xCord"] = None
+        
+    if "yCord" in update_data and update_data["yCord"] is not None and update_data["yCord"] != "":
+        update_data["yCord"] = float(update_data["yCord"])
+    elif "yCord" in update_data and (update_data["yCord"] is None or update_data["yCord"] == ""):
+        update_data["yCord"] = None
+        
+    if "mapId" in update_data and update_data["mapId"] is not None and update_data["mapId"] != "":
+        update_data["mapId"] = int(update_data["mapId"])
+    elif "mapId" in update_data and (update_data["mapId"] is None or update_data["mapId"] == ""):
+        update_data["mapId"] = None
+
+    try:
+        await device.resolve_references(db, [update_data], current=db_device)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    # Выполняем обновление
+    old_map_id = db_device.mapId
+    await db.execute(update(device).where(device.id == device_id).values(**update_data))
+    await db.commit()
+    await invalidate_map_devices(old_map_id, update_data.get("mapId", old_map_id))
+    
+    # Получаем обновленное устройство
+    result = await db.execute(select(device).where(device.id == device_id))
+    updated_device = result.scalar_one()
+    
+    return {"message": "Device updated successfully", "device": device_serializer.dict(updated_device)}
 
 
 # API endpoints для категорий
 @app.get("/categories", tags=["Категории"])
-async def get_categories(current_user: WebUser = Depends(get_current_user)):
+async def get_categories(db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить все категории"""
-    async with create_session() as db:
-        categories = await category.get_all_categories(db)
-        return [cat.to_dict() for cat in categories]
+    categories = await category.get_all_categories(db)
+    return [cat.to_dict() for cat in categories]
 
 @app.post("/categories", tags=["Категории"])
-async def create_category(category_data: CategoryCreate, current_user: WebUser = Depends(require_role("admin"))):
+async def create_category(category_data: CategoryCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Создать новую категорию"""
-    async with create_session() as db:
-        # Проверяем, существует ли категория с таким именем
-        existing = await category.get_category_by_name(db, category_data.name)
-        if existing:
-            raise HTTPException(status_code=400, detail="Category with this name already exists")
-        
-        new_category = await category.insert_category(db, category_data.model_dump())
-        return new_category.to_dict()
+    # Проверяем, существует ли категория с таким именем
+    existing = await category.get_category_by_name(db, category_data.name)
+    if existing:
+        raise HTTPException(status_code=400, detail="Category with this name already exists")
+    
+    new_category = await category.insert_category(db, category_data.model_dump())
+    return new_category.to_dict()
 
 @app.get("/categories/{category_id}", tags=["Категории"])
-async def get_category(category_id: int, current_user: WebUser = Depends(get_current_user)):
+async def get_category(category_id: int, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить категорию по ID"""
-    async with create_session() as db:
-        cat = await category.get_category_by_id(db, category_id)
-        if not cat:
-            raise HTTPException(status_code=404, detail="Category not found")
-        return cat.to_dict()
+    cat = await category.get_category_by_id(db, category_id)
+    if not cat:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return cat.to_dict()
 
 @app.put("/categories/{category_id}", tags=["Категории"])
-async def update_category(category_id: int, category_data: CategoryUpdate, current_user: WebUser = Depends(require_role("admin"))):
+async def update_category(category_id: int, category_data: CategoryUpdate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Обновить категорию"""
-    async with create_session() as db:
-        # Проверяем, существует ли категория
-        existing = await category.get_category_by_id(db, category_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Category not found")
-        
-        # Если обновляется имя, проверяем уникальность
-        if category_data.name and category_data.name != existing.name:
-            name_check = await category.get_category_by_name(db, category_data.name)
-            if name_check:
-                raise HTTPException(status_code=400, detail="Category with this name already exists")
-        
-        # Обновляем только переданные поля
-        update_data = {k: v for k, v in category_data.model_dump().items() if v is not None}
-        if not update_data:
-            raise HTTPException(status_code=400, detail="No data to update")
-        
-        updated_category = await category.update_category(db, category_id, update_data)
-        return updated_category.to_dict()
+    # Проверяем, существует ли категория
+    existing = await category.get_category_by_id(db, category_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    # Если обновляется имя, проверяем уникальность
+    if category_data.name and category_data.name != existing.name:
+        name_check = await category.get_category_by_name(db, category_data.name)
+        if name_check:
+            raise HTTPException(status_code=400, detail="Category with this name already exists")
+    
+    # Обновляем только переданные поля
+    update_data = {k: v for k, v in category_data.model_dump().items() if v is not None}
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No data to update")
+    
+    updated_category = await category.update_category(db, category_id, update_data)
+    return updated_category.to_dict()
 
 @app.delete("/categories/{category_id}", tags=["Категории"])
-async def delete_category(category_id: int, current_user: WebUser = Depends(require_role("admin"))):
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Удалить категорию"""
-    async with create_session() as db:
-        # Проверяем, существует ли категория
-        existing = await category.get_category_by_id(db, category_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Category not found")
-        
-        # Проверяем, есть ли связанные устройства
-        related_devices = await device.get_devices_by_category(db, existing.name)
-        if related_devices:
-            # Преобразуем устройства в список словарей для JSON ответа
-            devices_list = [device.to_dict() for device in related_devices]
-            raise HTTPException(
-                status_code=400, 
-                detail={
-                    "message": f"Нельзя удалить категорию '{existing.name}', так как к ней привязаны устройства",
-                    "devices": devices_list
-                }
-            )
-        
-        # Удаляем всех производителей этой категории
-        deleted_manufacturers = await manufacturer.delete_manufacturers_by_category(db, category_id)
-        print(f"Deleted {deleted_manufacturers} manufacturers for category {category_id}")
-        
-        success = await category.delete_category(db, category_id)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to delete category")
-        
-        return {"message": f"Category {category_id} deleted successfully"}
+    # Проверяем, существует ли категория
+    existing = await category.get_category_by_id(db, category_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    # Проверяем, есть ли связанные устройства
+    related_devices = await device.get_devices_by_category_id(db, category_id)
+    if related_devices:
+        # Преобразуем устройства в список словарей для JSON ответа
+        devices_list = [device.to_dict() for device in related_devices]
+        raise HTTPException(
+            status_code=400, 
+            detail={
+                "message": f"Нельзя удалить категорию '{existing.name}', так как к ней привязаны устройства",
+                "devices": devices_list
+            }
+        )
+    
+    # Удаляем всех производителей этой категории
+    deleted_manufacturers = await manufacturer.delete_manufacturers_by_category(db, category_id)
+    print(f"Deleted {deleted_manufacturers} manufacturers for category {category_id}")
+    
+    success = await category.delete_category(db, category_id)
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to delete category")
+    
+    return {"message": f"Category {category_id} deleted successfully"}
 
 # API endpoints для производителей
 @app.get("/manufacturers", tags=["Производители"])
-async def get_manufacturers(current_user: WebUser = Depends(get_current_user)):
+async def get_manufacturers(db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить всех производителей"""
-    async with create_session() as db:
-        manufacturers = await manufacturer.get_all_manufacturers(db)
-        return [man.to_dict() for man in manufacturers]
+    manufacturers = await manufacturer.get_all_manufacturers(db)
+    return [man.to_dict() for man in manufacturers]
 
 @app.get("/manufacturers/category/{category_id}", tags=["Производители"])
-async def get_manufacturers_by_category(category_id: int, current_user: WebUser = Depends(get_current_user)):
+async def get_manufacturers_by_category(category_id: int, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить производителей по категории"""
-    async with create_session() as db:
-        # Проверяем, существует ли категория
-        existing_category = await category.get_category_by_id(db, category_id)
-        if not existing_category:
-            raise HTTPException(status_code=404, detail="Category not found")
-        
-        manufacturers = await manufacturer.get_manufacturers_by_category(db, category_id)
-        return [man.to_dict() for man in manufacturers]
+    # Проверяем, существует ли категория
+    existing_category = await category.get_category_by_id(db, category_id)
+    if not existing_category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    manufacturers = await manufacturer.get_manufacturers_by_category(db, category_id)
+    return [man.to_dict() for man in manufacturers]
 
 @app.post("/manufacturers", tags=["Производители"])
-async def create_manufacturer(manufacturer_data: ManufacturerCreate, current_user: WebUser = Depends(require_role("admin"))):
+async def create_manufacturer(manufacturer_data: ManufacturerCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Создать нового производителя"""
-    async with create_session() as db:
-        # Проверяем, существует ли категория
-        existing_category = await category.get_category_by_id(db, manufacturer_data.category_id)
-        if not existing_category:
-            raise HTTPException(status_code=404, detail="Category not found")
-        
-        # Убрана проверка уникальности названия - производители могут иметь одинаковые названия в разных категориях
-        
-        new_manufacturer = await manufacturer.insert_manufacturer(db, manufacturer_data.model_dump())
-        return new_manufacturer.to_dict()
+    # Проверяем, существует ли категория
+    existing_category = await category.get_category_by_id(db, manufacturer_data.category_id)
+    if not existing_category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    # Убрана проверка уникальности названия - производители могут иметь одинаковые названия в разных категориях
+    
+    new_manufacturer = await manufacturer.insert_manufacturer(db, manufacturer_data.model_dump())
+    return new_manufacturer.to_dict()
 
 @app.get("/manufacturers/{manufacturer_id}", tags=["Производители"])
-async def get_manufacturer(manufacturer_id: int, current_user: WebUser = Depends(get_current_user)):
+async def get_manufacturer(manufacturer_id: int, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить производителя по ID"""
-    async with create_session() as db:
-        man = await manufacturer.get_manufacturer_by_id(db, manufacturer_id)
-        if not man:
-            raise HTTPException(status_code=404, detail="Manufacturer not found")
-        return man.to_dict()
+    man = await manufacturer.get_manufacturer_by_id(db, manufacturer_id)
+    if not man:
+        raise HTTPException(status_code=404, detail="Manufacturer not found")
+    return man.to_dict()
 
 @app.put("/manufacturers/{manufacturer_id}", tags=["Производители"])
-async def update_manufacturer(manufacturer_id: int, manufacturer_data: ManufacturerUpdate, current_user: WebUser = Depends(require_role("admin"))):
+async def update_manufacturer(manufacturer_id: int, manufacturer_data: ManufacturerUpdate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Обновить производителя"""
-    async with create_session() as db:
-        # Проверяем, существует ли производитель
-        existing = await manufacturer.get_manufacturer_by_id(db, manufacturer_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Manufacturer not found")
-        
-        # Если обновляется категория, проверяем её существование
-        if manufacturer_data.category_id and manufacturer_data.category_id != existing.category_id:
-            category_check = await category.get_category_by_id(db, manufacturer_data.category_id)
-            if not category_check:
-                raise HTTPException(status_code=404, detail="Category not found")
-        
-        # Убрана проверка уникальности названия - производители могут иметь одинаковые названия в разных категориях
-        
-        # Обновляем только переданные поля
-        update_data = {k: v for k, v in manufacturer_data.model_dump().items() if v is not None}
-        if not update_data:
-            raise HTTPException(status_code=400, detail="No data to update")
-        
-        updated_manufacturer = await manufacturer.update_manufacturer(db, manufacturer_id, update_data)
-        return updated_manufacturer.to_dict()
+    # Проверяем, существует ли производитель
+    existing = await manufacturer.get_manufacturer_by_id(db, manufacturer_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Manufacturer not found")
+    
+    # Если обновляется категория, проверяем её существование
+    if manufacturer_data.category_id and manufacturer_data.category_id != existing.category_id:
+        category_check = await category.get_category_by_id(db, manufacturer_data.category_id)
+        if not category_check:
+            raise HTTPException(status_code=404, detail="Category not found")
+    
+    # Убрана проверка уникальности названия - производители могут иметь одинаковые названия в разных категориях
+    
+    # Обновляем только переданные поля
+    update_data = {k: v for k, v in manufacturer_data.model_dump().items() if v is not None}
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No data to update")
+    
+    updated_manufacturer = await manufacturer.update_manufacturer(db, manufacturer_id, update_data)
+    return updated_manufacturer.to_dict()
 
 @app.delete("/manufacturers/{manufacturer_id}", tags=["Производители"])
-async def delete_manufacturer(manufacturer_id: int, current_user: WebUser = Depends(require_role("admin"))):
+async def delete_manufacturer(manufacturer_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Удалить производителя"""
-    async with create_session() as db:
-        # Проверяем, существует ли производитель
-        existing = await manufacturer.get_manufacturer_by_id(db, manufacturer_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Manufacturer not found")
-        
-        # Проверяем, есть ли связанные устройства
-        related_devices = await device.get_devices_by_manufacturer(db, existing.name)
-        if related_devices:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Нельзя удалить производителя '{existing.name}', так как к нему привязаны устройства"
-            )
-        
-        success = await manufacturer.delete_manufacturer(db, manufacturer_id)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to delete manufacturer")
-        
-        return {"message": f"Manufacturer {manufacturer_id} deleted successfully"}
+    # Проверяем, существует ли производитель
+    existing = await manufacturer.get_manufacturer_by_id(db, manufacturer_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Manufacturer not found")
+    
+    # Проверяем, есть ли связанные устройства
+    related_devices = await device.get_devices_by_manufacturer_id(db, manufacturer_id)
+    if related_devices:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Нельзя удалить производителя '{existing.name}', так как к нему привязаны устройства"
+        )
+    
+    success = await manufacturer.delete_manufacturer(db, manufacturer_id)
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to delete manufacturer")
+    
+    return {"message": f"Manufacturer {manufacturer_id} deleted successfully"}
 
 # API endpoints для аудиторий
 @app.get("/classrooms", tags=["Аудитории"])
-async def get_classrooms(current_user: WebUser = Depends(get_current_user)):
+async def get_classrooms(db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить все аудитории"""
-    async with create_session() as db:
-        classrooms = await classroom.get_all_classrooms(db)
-        return [cls.to_dict() for cls in classrooms]
+    classrooms = await classroom.get_all_classrooms(db)
+    return [cls.to_dict() for cls in classrooms]
 
 @app.get("/classrooms/map/{map_id}", tags=["Аудитории"])
-async def get_classrooms_by_map(map_id: int, current_user: WebUser = Depends(get_current_user)):
-    """Получить все аудитории для конкретной карты"""
-    async with create_session() as db:
+async def get_classrooms_by_map(map_id: int, min_x: Optional[float] = None, min_y: Optional[float] = None,
+                                max_x: Optional[float] = None, max_y: Optional[float] = None,
+                                db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
+    """Получить аудитории карты: все или только пересекающие окно просмотра min_x..max_x, min_y..max_y"""
+    viewport = (min_x, min_y, max_x, max_y)
+    if all(v is None for v in viewport):
         classrooms = await classroom.get_classrooms_by_map(db, map_id)
-        return [cls.to_dict() for cls in classrooms]
+    elif any(v is None for v in viewport):
+        raise HTTPException(status_code=400, detail="Viewport needs min_x, min_y, max_x and max_y")
+    else:
+        classrooms = await classroom.get_classrooms_in_bbox(db, map_id, *viewport)
+    return [cls.to_dict() for cls in classrooms]
 
 @app.get("/classrooms/find-by-point", tags=["Аудитории"])
-async def find_classroom_by_point(map_id: int, x: float, y: float, current_user: WebUser = Depends(get_current_user)):
+async def find_classroom_by_point(map_id: int, x: float, y: float, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(get_current_user)):
     """Найти аудиторию по координатам точки на карте"""
-    async with create_session() as db:
-        found_classroom = await classroom.find_classroom_by_point(db, map_id, x, y)
-        if not found_classroom:
-            return {"classroom": None}
-        return {"classroom": found_classroom.to_dict()}
+    found_classroom = await classroom.find_classroom_by_point(db, map_id, x, y)
+    if not found_classroom:
+        return {"classroom": None}
+    return {"classroom": found_classroom.to_dict()}
 
 @app.post("/classrooms", tags=["Аудитории"])
-async def create_classroom(classroom_data: ClassroomCreate, current_user: WebUser = Depends(require_role("admin"))):
+async def create_classroom(classroom_data: ClassroomCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Создать новую аудиторию"""
-    async with create_session() as db:
-        # Проверяем, существует ли карта
-        place_result = await db.execute(select(place).where(place.id == classroom_data.map_id))
-        place_obj = place_result.scalar_one_or_none()
-        
-        # Если карта не найдена, создаем её автоматически
-        if not place_obj:
-            # Создаем новое место с именем по умолчанию
-            new_place = place(name=f"Карта {classroom_data.map_id}")
-            db.add(new_place)
-            await db.commit()
-            await db.refresh(new_place)
-            # Если ID не совпадает, обновляем map_id
-            if new_place.id != classroom_data.map_id:
-                # Используем созданный ID
-                classroom_data.map_id = new_place.id
-        
-        # Проверяем валидность полигона
-        if not classroom_data.polygon_coordinates or len(classroom_data.polygon_coordinates) < 3:
-            raise HTTPException(status_code=400, detail="Polygon must have at least 3 points")
-        
-        new_classroom = await classroom.insert_classroom(db, classroom_data.model_dump())
-        return new_classroom.to_dict()
+    # Проверяем, существует ли карта
+    place_result = await db.execute(select(place).where(place.id == classroom_data.map_id))
+    place_obj = place_result.scalar_one_or_none()
+    
+    # Если карта не найдена, создаем её автоматически
+    if not place_obj:
+        # Создаем новое место с именем по умолчанию
+        new_place = place(name=f"Карта {classroom_data.map_id}")
+        db.add(new_place)
+        await db.commit()
+        await db.refresh(new_place)
+        # Если ID не совпадает, обновляем map_id
+        if new_place.id != classroom_data.map_id:
+            # Используем созданный ID
+            classroom_data.map_id = new_place.id
+    
+    # Проверяем валидность полигона
+    if not classroom_data.polygon_coordinates or len(classroom_data.polygon_coordinates) < 3:
+        raise HTTPException(status_code=400, detail="Polygon must have at least 3 points")
+    
+    new_classroom = await classroom.insert_classroom(db, classroom_data.model_dump())
+    if settings.CLASSROOM_AUTO_ASSIGN:
+        await classroom_assignment_jobs.submit(db, map_ids=[new_classroom.map_id])
+    return new_classroom.to_dict()
 
 @app.get("/classrooms/{classroom_id}", tags=["Аудитории"])
-async def get_classroom(classroom_id: int, current_user: WebUser = Depends(get_current_user)):
+async def get_classroom(classroom_id: int, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Получить аудиторию по ID"""
-    async with create_session() as db:
-        cls = await classroom.get_classroom_by_id(db, classroom_id)
-        if not cls:
-            raise HTTPException(status_code=404, detail="Classroom not found")
-        return cls.to_dict()
+    cls = await classroom.get_classroom_by_id(db, classroom_id)
+    if not cls:
+        raise HTTPException(status_code=404, detail="Classroom not found")
+    return cls.to_dict()
 
 @app.put("/classrooms/{classroom_id}", tags=["Аудитории"])
-async def update_classroom(classroom_id: int, classroom_data: ClassroomUpdate, current_user: WebUser = Depends(require_role("admin"))):
+async def update_classroom(classroom_id: int, classroom_data: ClassroomUpdate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Обновить аудиторию"""
-    async with create_session() as db:
+    existing = await classroom.get_classroom_by_id(db, classroom_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Classroom not found")
+    
+    # Если обновляется map_id, проверяем существование карты
+    if classroom_data.map_id and classroom_data.map_id != existing.map_id:
+        place_result = await db.execute(select(place).where(place.id == classroom_data.map_id))
+        if not place_result.scalar_one_or_none():
+            raise HTTPException(status_code=404, detail="Map not found")
+    
+    # Проверяем валидность полигона если он обновляется
+    if classroom_data.polygon_coordinates and len(classroom_data.polygon_coordinates) < 3:
+        raise HTTPException(status_code=400, detail="Polygon must have at least 3 points")
+    
+    update_data = {k: v for k, v in classroom_data.model_dump().items() if v is not None}
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No data to update")
+    
+    updated_classroom = await classroom.update_classroom(db, classroom_id, update_data)
+    if settings.CLASSROOM_AUTO_ASSIGN and ('polygon_coordinates' in update_data or 'map_id' in update_data):
+        await classroom_assignment_jobs.submit(db, map_ids=sorted({existing.map_id, updated_classroom.map_id}))
+    return updated_classroom.to_dict()
+
+@app.post("/classrooms/assign-devices", tags=["Аудитории"])
+async def assign_devices_to_classrooms(body: ClassroomAssignRequest, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Назначить устройствам аудитории по координатам (все, одной карты или по списку id)"""
+    map_ids = [body.map_id] if body.map_id is not None else None
+    if body.background:
+        job = await classroom_assignment_jobs.submit(db, map_ids=map_ids, device_ids=body.device_ids,
+                                                     clear_unmatched=body.clear_unmatched)
+        return FastJSONResponse(job, status_code=202)
+    return await device.assign_classrooms(db, map_ids=map_ids, device_ids=body.device_ids,
+                                          clear_unmatched=body.clear_unmatched)
+
+@app.get("/classrooms/assign-devices/jobs/{job_id}", tags=["Аудитории"])
+async def get_classroom_assignment_job(job_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Состояние фонового задания назначения аудиторий"""
+    job = await classroom_assignment_jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/classrooms/{classroom_id}", tags=["Аудитории"])
+async def delete_classroom(classroom_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Удалить аудиторию"""
+    try:
         existing = await classroom.get_classroom_by_id(db, classroom_id)
         if not existing:
             raise HTTPException(status_code=404, detail="Classroom not found")
         
-        # Если обновляется map_id, проверяем существование карты
-        if classroom_data.map_id and classroom_data.map_id != existing.map_id:
-            place_result = await db.execute(select(place).where(place.id == classroom_data.map_id))
-            if not place_result.scalar_one_or_none():
-                raise HTTPException(status_code=404, detail="Map not found")
-        
-        # Проверяем валидность полигона если он обновляется
-        if classroom_data.polygon_coordinates and len(classroom_data.polygon_coordinates) < 3:
-            raise HTTPException(status_code=400, detail="Polygon must have at least 3 points")
+        # Проверяем, есть ли связанные устройства
+        related_devices = await classroom.get_devices_by_classroom(db, classroom_id)
+        if related_devices and len(related_devices) > 0:
+            # Преобразуем устройства в словари синхронно, так как они уже загружены
+            devices_list = []
+            for d in related_devices:
+                devices_list.append({
+                    'id': d.id,
+                    'name': d.name,
+                    'category': d.category,
+                    'place_id': d.place_id,
+                })
+            raise HTTPException(
+                status_code=400, 
+                detail={
+                    "message": f"Нельзя удалить аудиторию '{existing.name}', так как к ней привязаны устройства",
+                    "devices": devices_list
+                }
+            )
         
-        update_data = {k: v for k, v in classroom_data.model_dump().items() if v is not None}
-        if not update_data:
-            raise HTTPException(status_code=400, detail="No data to update")
+        success = await classroom.delete_classroom(db, classroom_id)
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to delete classroom")
         
-        updated_classroom = await classroom.update_classroom(db, classroom_id, update_data)
-        return updated_classroom.to_dict()
-
-@app.delete("/classrooms/{classroom_id}", tags=["Аудитории"])
-async def delete_classroom(classroom_id: int, current_user: WebUser = Depends(require_role("admin"))):
-    """Удалить аудиторию"""
-    try:
-        async with create_session() as db:
-            existing = await classroom.get_classroom_by_id(db, classroom_id)
-            if not existing:
-                raise HTTPException(status_code=404, detail="Classroom not found")
-            
-            # Проверяем, есть ли связанные устройства
-            related_devices = await classroom.get_devices_by_classroom(db, existing.name)
-            if related_devices and len(related_devices) > 0:
-                # Преобразуем устройства в словари синхронно, так как они уже загружены
-                devices_list = []
-                for d in related_devices:
-                    devices_list.append({
-                        'id': d.id,
-                        'name': d.name,
-                        'category': d.category,
-                        'place_id': d.place_id,
-                    })
-                raise HTTPException(
-                    status_code=400, 
-                    detail={
-                        "message": f"Нельзя удалить аудиторию '{existing.name}', так как к ней привязаны устройства",
-                        "devices": devices_list
-                    }
-                )
-            
-            success = await classroom.delete_classroom(db, classroom_id)
-            if not success:
-                raise HTTPException(status_code=500, detail="Failed to delete classroom")
-            
-            return {"message": f"Classroom {classroom_id} deleted successfully"}
+        return {"message": f"Classroom {classroom_id} deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
@@ -812,7 +814,7 @@ async def delete_classroom(classroom_id: int, current_user: WebUser = Depends(re
 snmp_service = SNMPService() if SNMP_AVAILABLE else None
 
 @app.get("/snmp/check/{device_id}", tags=["SNMP Monitoring"])
-async def check_device_snmp(device_id: int, db: AsyncSession = Depends(create_session), current_user: WebUser = Depends(require_role("admin"))):
+async def check_device_snmp(device_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Проверяет статус конкретного устройства через SNMP"""
     if not SNMP_AVAILABLE or not snmp_service:
         raise HTTPException(status_code=503, detail="SNMP service is not available. Install pysnmp: pip install pysnmp")
@@ -866,7 +868,7 @@ async def check_device_snmp(device_id: int, db: AsyncSession = Depends(create_se
         raise HTTPException(status_code=500, detail=f"SNMP check failed: {str(e)}")
 
 @app.get("/snmp/check-all", tags=["SNMP Monitoring"])
-async def check_all_devices_snmp(db: AsyncSession = Depends(create_session), current_user: WebUser = Depends(require_role("admin"))):
+async def check_all_devices_snmp(db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Проверяет статус всех устройств с включенным SNMP мониторингом"""
     if not SNMP_AVAILABLE or not snmp_service:
         raise HTTPException(status_code=503, detail="SNMP service is not available")
@@ -919,7 +921,7 @@ async def check_all_devices_snmp(db: AsyncSession = Depends(create_session), cur
         raise HTTPException(status_code=500, detail=f"Bulk SNMP check failed: {str(e)}")
 
 @app.get("/snmp/interfaces/{device_id}", tags=["SNMP Monitoring"])
-async def get_device_interfaces(device_id: int, db: AsyncSession = Depends(create_session), current_user: WebUser = Depends(require_role("admin"))):
+async def get_device_interfaces(device_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Получает информацию об интерфейсах устройства"""
     if not SNMP_AVAILABLE or not snmp_service:
         raise HTTPException(status_code=503, detail="SNMP service is not available")
@@ -958,7 +960,7 @@ async def get_device_interfaces(device_id: int, db: AsyncSession = Depends(creat
         raise HTTPException(status_code=500, detail=f"Failed to get interface status: {str(e)}")
 
 @app.post("/snmp/config", tags=["SNMP Monitoring"])
-async def create_or_update_snmp_config(snmp_config_data: dict, db: AsyncSession = Depends(create_session), current_user: WebUser = Depends(require_role("admin"))):
+async def create_or_update_snmp_config(snmp_config_data: dict, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Создает или обновляет SNMP конфигурацию устройства"""
     try:
         # Валидируем обязательные поля
@@ -1029,7 +1031,7 @@ async def create_or_update_snmp_config(snmp_config_data: dict, db: AsyncSession
         raise HTTPException(status_code=500, detail=f"Failed to update SNMP config: {str(e)}")
 
 @app.get("/snmp/status", tags=["SNMP Monitoring"])
-async def get_snmp_status_summary(db: AsyncSession = Depends(create_session), current_user: WebUser = Depends(require_role("admin"))):
+async def get_snmp_status_summary(db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Получает сводку по статусу SNMP мониторинга"""
     try:
         # Получаем все устройства
@@ -1097,6 +1099,18 @@ async def discover_network_devices(body: dict, current_user: WebUser = Depends(r
     timeout = body.get("timeout", 2.0)
     port = body.get("port", 161)
     ping_timeout_ms = int(body.get("ping_timeout_ms", 1200))
+    # icmp (по умолчанию), sweep — SNMP GET всех адресов без ping, both — оба
+    mode = body.get("mode", "icmp")
+    packets_per_second = int(body.get("packets_per_second", 2000))
+
+    try:
+        subnet_key = normalize_subnet(subnet)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # Скан идёт минутами, поэтому вместо сессии на запрос — короткие сессии до и после него.
+    # Хосты, живые на прошлом сканировании, опрашиваются первыми
+    async with create_session() as db:
+        known_alive = await DiscoveredHost.get_known_alive_ips(db, subnet_key)
 
     svc = NetworkDiscoveryService(timeout=float(timeout), retries=1, concurrency=50)
     try:
@@ -1105,7 +1119,12 @@ async def discover_network_devices(body: dict, current_user: WebUser = Depends(r
             communities=communities,
             port=int(port),
             ping_timeout_ms=ping_timeout_ms,
+            mode=mode,
+            packets_per_second=packets_per_second,
+            priority_ips=known_alive,
         )
+        async with create_session() as db:
+            result["diff"] = await DiscoveredHost.apply_scan(db, subnet_key, result["discovered"])
         return result
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
@@ -1115,8 +1134,87 @@ async def discover_network_devices(body: dict, current_user: WebUser = Depends(r
         raise HTTPException(status_code=500, detail=f"Discovery failed: {exc}")
 
 
+@app.post("/snmp/discover/stream", tags=["SNMP Discovery"])
+async def discover_network_devices_stream(body: dict, current_user: WebUser = Depends(require_role("admin"))):
+    """Сканирует подсеть и отдаёт найденные хосты построчно (NDJSON) по мере обнаружения"""
+    if not DISCOVERY_AVAILABLE or not discovery_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Network discovery service is not available. Install pysnmp: pip install pysnmp",
+        )
+
+    subnet = body.get("subnet")
+    if not subnet:
+        raise HTTPException(status_code=400, detail="Missing required field: subnet")
+
+    try:
+        subnet_key = normalize_subnet(subnet)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    async with create_session() as db:
+        known_alive = await DiscoveredHost.get_known_alive_ips(db, subnet_key)
+
+    svc = NetworkDiscoveryService(timeout=float(body.get("timeout", 2.0)), retries=1, concurrency=50)
+    progress = DiscoveryProgress()
+    stream = svc.discover_stream(
+        subnet,
+        communities=body.get("communities", ["public"]),
+        port=int(body.get("port", 161)),
+        ping_timeout_ms=int(body.get("ping_timeout_ms", 1200)),
+        mode=body.get("mode", "icmp"),
+        packets_per_second=int(body.get("packets_per_second", 2000)),
+        progress=progress,
+        priority_ips=known_alive,
+    )
+    # Ошибки параметров должны вернуть 400 до начала потока
+    try:
+        first = await anext(stream, None)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    async def ndjson():
+        discovered = []
+        try:
+            if first is not None:
+                discovered.append(asdict(first))
+                yield json.dumps(discovered[-1], ensure_ascii=False) + "\n"
+            async for found in stream:
+                discovered.append(asdict(found))
+                yield json.dumps(discovered[-1], ensure_ascii=False) + "\n"
+        except Exception as exc:
+            logger.error(f"Discovery stream failed: {exc}")
+            yield json.dumps({"error": str(exc)}, ensure_ascii=False) + "\n"
+            return
+        finally:
+            await stream.aclose()
+        # Разница с прошлым сканированием и с инвентарём — в итоговой строке
+        async with create_session() as db:
+            diff = await DiscoveredHost.apply_scan(db, subnet_key, discovered)
+        yield json.dumps({"summary": progress.summary(), "diff": diff}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.get("/snmp/discover/results", tags=["SNMP Discovery"])
+async def get_discovery_results(subnet: str, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Сохранённые результаты сканирования подсети с отметкой об импорте в инвентарь"""
+    try:
+        subnet_key = normalize_subnet(subnet)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    hosts = await DiscoveredHost.get_by_subnet(db, subnet_key)
+    imported = await DiscoveredHost.get_imported_ips(db, [h.ip_address for h in hosts])
+    return {
+        "subnet": subnet_key,
+        "hosts": [
+            {**h.to_dict(), "imported_device_id": imported.get(h.ip_address)}
+            for h in hosts
+        ],
+    }
+
+
 @app.post("/snmp/discover/import", tags=["SNMP Discovery"])
-async def import_discovered_devices(body: dict, db: AsyncSession = Depends(create_session), current_user: WebUser = Depends(require_role("admin"))):
+async def import_discovered_devices(body: dict, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Импортирует выбранные устройства из результатов сканирования в БД"""
     devices_data = body.get("devices", [])
     if not devices_data:
@@ -1128,51 +1226,190 @@ async def import_discovered_devices(body: dict, db: AsyncSession = Depends(creat
     y_cord = body.get("yCord", 0.0)
     map_id = body.get("mapId", None)
 
-    imported = []
-
+    # Исход по каждому хосту в порядке запроса: imported / invalid_ip / ip_exists / name_exists / duplicate
+    results = []
+    candidates = []
     for dev in devices_data:
         ip = dev.get("ip", "")
         try:
             ip = _validate_snmp_target_ip(ip)
         except HTTPException:
             logger.warning(f"Skipped imported device with invalid SNMP IP: {ip}")
+            results.append({"ip": ip, "name": dev.get("name") or ip, "status": "invalid_ip"})
             continue
         name = dev.get("name") or ip
-        manufacturer_name = dev.get("manufacturer_guess", "")
-
-        device_data = {
+        entry = {"ip": ip, "name": name, "status": None}
+        results.append(entry)
+        candidates.append((entry, dev))
+
+    # Уже заведённые адреса и имена — одним запросом по индексу каждый
+    existing_ips = await DeviceSNMPConfig.get_device_ids_by_ips(db, [e["ip"] for e, _ in candidates])
+    existing_names = await device.get_existing_names(db, {e["name"] for e, _ in candidates})
+
+    devices_rows = []
+    snmp_rows = []
+    to_insert = []
+    seen_ips, seen_names = set(), set()
+    for entry, dev in candidates:
+        ip, name = entry["ip"], entry["name"]
+        if ip in existing_ips:
+            entry.update(status="ip_exists", device_id=existing_ips[ip])
+            continue
+        if name in existing_names:
+            entry["status"] = "name_exists"
+            continue
+        if ip in seen_ips or name in seen_names:
+            entry["status"] = "duplicate"
+            continue
+        seen_ips.add(ip)
+        seen_names.add(name)
+        devices_rows.append({
             "name": name,
             "category": category_name,
             "place_id": place_name,
             "version": "",
-            "manufacturer": manufacturer_name,
+            "manufacturer": dev.get("manufacturer_guess", ""),
             "xCord": x_cord,
             "yCord": y_cord,
             "mapId": map_id,
-        }
-        try:
-            new_device = await device.insert_device(db, device_data)
-
-            snmp_config_data = {
-                "enabled": True,
-                "ip_address": ip,
-                "port": dev.get("port", 161),
-                "community": dev.get("community", "public"),
-                "version": dev.get("snmp_version", "2c"),
-                "status": "unknown",
-            }
-            await DeviceSNMPConfig.create_or_update(db, new_device.id, snmp_config_data)
-
-            imported.append({
-                "id": new_device.id,
-                "name": name,
-                "ip": ip,
-            })
-        except Exception as exc:
-            logger.error(f"Failed to import device {ip}: {exc}")
-            continue
+        })
+        snmp_rows.append({
+            "enabled": True,
+            "ip_address": ip,
+            "port": dev.get("port", 161),
+            "community": dev.get("community", "public"),
+            "version": dev.get("snmp_version", "2c"),
+            "status": "unknown",
+        })
+        to_insert.append(entry)
+
+    await device.resolve_references(db, devices_rows)
+    try:
+        device_ids = await device.bulk_insert_with_snmp(db, devices_rows, snmp_rows)
+    except Exception as exc:
+        logger.error(f"Failed to import discovered devices, nothing imported: {exc}")
+        raise HTTPException(status_code=500, detail="Import failed, no devices were imported")
 
-    return {"imported": imported, "count": len(imported)}
+    imported = []
+    for entry, device_id in zip(to_insert, device_ids):
+        entry.update(status="imported", id=device_id)
+        imported.append({"id": device_id, "name": entry["name"], "ip": entry["ip"]})
+    if imported:
+        await invalidate_map_devices(map_id)
+
+    return {
+        "imported": imported,
+        "count": len(imported),
+        "skipped": len(results) - len(imported),
+        "results": results,
+    }
+
+
+def _validate_discovery_profile(data: dict) -> dict:
+    """Проверяет поля профиля discovery и приводит подсети к канонической записи"""
+    if "subnets" in data:
+        if not data["subnets"]:
+            raise HTTPException(status_code=400, detail="At least one subnet is required")
+        try:
+            data["subnets"] = [normalize_subnet(s) for s in data["subnets"]]
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    if "mode" in data and data["mode"] not in ("icmp", "sweep", "both"):
+        raise HTTPException(status_code=400, detail=f"Unknown discovery mode: {data['mode']}")
+    if "communities" in data and not data["communities"]:
+        raise HTTPException(status_code=400, detail="At least one community is required")
+    if data.get("interval_minutes") is not None and data["interval_minutes"] < 5:
+        raise HTTPException(status_code=400, detail="interval_minutes must be at least 5")
+    if data.get("max_packets_per_second") is not None and data["max_packets_per_second"] < 1:
+        raise HTTPException(status_code=400, detail="max_packets_per_second must be positive")
+    return data
+
+
+@app.get("/snmp/discover/profiles", tags=["SNMP Discovery"])
+async def list_discovery_profiles(db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Профили плановой discovery"""
+    profiles = await DiscoveryProfile.get_all(db)
+    return [p.to_dict() for p in profiles]
+
+
+@app.post("/snmp/discover/profiles", tags=["SNMP Discovery"])
+async def create_discovery_profile(body: DiscoveryProfileCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Создаёт профиль; первый запуск — в ближайшее окно обслуживания"""
+    if not DISCOVERY_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Network discovery service is not available")
+    data = _validate_discovery_profile(body.model_dump())
+    data["next_run_at"] = next_window_start(datetime.now(), data["window_start"], data["window_end"])
+    profile = await DiscoveryProfile.create(db, **data)
+    return profile.to_dict()
+
+
+@app.put("/snmp/discover/profiles/{profile_id}", tags=["SNMP Discovery"])
+async def update_discovery_profile(profile_id: int, body: DiscoveryProfileUpdate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Изменяет профиль; окно можно снять, передав null"""
+    data = _validate_discovery_profile(body.model_dump(exclude_unset=True))
+    profile = await DiscoveryProfile.get_by_id(db, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Discovery profile not found")
+    if "window_start" in data or "window_end" in data:
+        # Переносим ближайший запуск в новое окно
+        start = data.get("window_start", profile.window_start)
+        end = data.get("window_end", profile.window_end)
+        data["next_run_at"] = next_window_start(profile.next_run_at or datetime.now(), start, end)
+    profile = await DiscoveryProfile.update_profile(db, profile_id, data)
+    return profile.to_dict()
+
+
+@app.delete("/snmp/discover/profiles/{profile_id}", tags=["SNMP Discovery"])
+async def delete_discovery_profile(profile_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Удаляет профиль вместе с историей запусков"""
+    if not await DiscoveryProfile.delete_profile(db, profile_id):
+        raise HTTPException(status_code=404, detail="Discovery profile not found")
+    return {"message": "Discovery profile deleted"}
+
+
+@app.post("/snmp/discover/profiles/{profile_id}/run", tags=["SNMP Discovery"])
+async def run_discovery_profile(profile_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Ставит профиль в очередь планировщика: запуск в ближайшую проверку внутри окна"""
+    profile = await DiscoveryProfile.get_by_id(db, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Discovery profile not found")
+    next_run = next_window_start(datetime.now(), profile.window_start, profile.window_end)
+    await DiscoveryProfile.set_next_run(db, profile_id, next_run)
+    return {"profile_id": profile_id, "next_run_at": next_run.isoformat()}
+
+
+@app.get("/snmp/discover/runs", tags=["SNMP Discovery"])
+async def list_discovery_runs(profile_id: int = None, limit: int = 50, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """История плановых запусков с количеством изменений"""
+    runs = await DiscoveryRun.get_recent(db, profile_id, min(max(limit, 1), 500))
+    return [r.to_dict() for r in runs]
+
+
+@app.get("/snmp/discover/runs/{run_id}", tags=["SNMP Discovery"])
+async def get_discovery_run(run_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
+    """Запуск с полным diff: new, disappeared, changed, already_imported"""
+    run = await DiscoveryRun.get_by_id(db, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Discovery run not found")
+    return run.to_dict(with_diff=True)
+
+
+@app.get("/metrics/db-pool", tags=["Metrics"])
+async def get_db_pool_metrics(format: str = "json", current_user: WebUser = Depends(require_role("admin"))):
+    """Пул соединений: выдано сейчас, overflow, ожидание соединения; format=prometheus — текстом"""
+    stats = pool_stats()
+    if format == "prometheus":
+        lines = [
+            f"db_pool_{name} {value}"
+            for name, value in stats.items()
+            if isinstance(value, (int, float))
+        ]
+        for replica in stats["replicas"]:
+            lag = replica["lag_s"] if replica["lag_s"] is not None else "NaN"
+            lines.append(f'db_replica_lag_seconds{{url="{replica["url"]}"}} {lag}')
+            lines.append(f'db_replica_usable{{url="{replica["url"]}"}} {int(replica["usable"])}')
+        return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+    return stats
 
 
 # ============================================================
@@ -1184,18 +1421,19 @@ async def login(body: LoginRequest):
     """Аутентификация по логину и паролю, возврат JWT-токенов"""
     async with create_session() as db:
         user = await WebUser.get_by_username(db, body.username)
-        if not user or not verify_password(body.password, user.hashed_password):
-            raise HTTPException(status_code=401, detail="Неверный логин или пароль")
-        if not user.is_active:
-            raise HTTPException(status_code=403, detail="Аккаунт деактивирован")
+    # Соединение с БД не держим, пока bcrypt ждёт своей очереди
+    if not user or not await verify_password_async(body.password, user.hashed_password):
+        raise HTTPException(status_code=401, detail="Неверный логин или пароль")
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="Аккаунт деактивирован")
 
-        access_token = create_access_token({"sub": str(user.id), "role": user.role})
-        refresh_token = create_refresh_token({"sub": str(user.id), "role": user.role})
-        return TokenResponse(access_token=access_token, refresh_token=refresh_token)
+    access_token = create_access_token({"sub": str(user.id), "role": user.role})
+    refresh_token = create_refresh_token({"sub": str(user.id), "role": user.role})
+    return TokenResponse(access_token=access_token, refresh_token=refresh_token)
 
 
 @app.post("/auth/refresh", tags=["Auth"])
-async def refresh_token(body: RefreshRequest):
+async def refresh_token(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
     """Обновление access-токена по refresh-токену"""
     payload = decode_token(body.refresh_token)
     if payload.get("type") != "refresh":
@@ -1205,13 +1443,12 @@ async def refresh_token(body: RefreshRequest):
     if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid token payload")
 
-    async with create_session() as db:
-        user = await WebUser.get_by_id(db, int(user_id))
-        if not user or not user.is_active:
-            raise HTTPException(status_code=401, detail="User not found or deactivated")
-        access_token = create_access_token({"sub": str(user.id), "role": user.role})
-        new_refresh = create_refresh_token({"sub": str(user.id), "role": user.role})
-        return TokenResponse(access_token=access_token, refresh_token=new_refresh)
+    user = await WebUser.get_by_id(db, int(user_id))
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or deactivated")
+    access_token = create_access_token({"sub": str(user.id), "role": user.role})
+    new_refresh = create_refresh_token({"sub": str(user.id), "role": user.role})
+    return TokenResponse(access_token=access_token, refresh_token=new_refresh)
 
 
 @app.get("/auth/me", tags=["Auth"])
@@ -1225,132 +1462,170 @@ async def get_me(current_user: WebUser = Depends(get_current_user)):
 # ============================================================
 
 @app.get("/auth/users", tags=["Users"])
-async def list_users(current_user: WebUser = Depends(require_role("admin"))):
+async def list_users(db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Список всех пользователей (admin)"""
-    async with create_session() as db:
-        users = await WebUser.get_all(db)
-        return [u.to_dict() for u in users]
+    users = await WebUser.get_all(db)
+    return [u.to_dict() for u in users]
 
 
 @app.post("/auth/users", tags=["Users"])
-async def create_user(body: UserCreate, current_user: WebUser = Depends(require_role("admin"))):
+async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Создать пользователя (admin)"""
     if body.role not in ("admin", "operator", "student"):
         raise HTTPException(status_code=400, detail="Роль должна быть admin, operator или student")
-    async with create_session() as db:
-        existing = await WebUser.get_by_username(db, body.username)
-        if existing:
-            raise HTTPException(status_code=400, detail="Пользователь с таким логином уже существует")
-        user = await WebUser.create(
-            db,
-            username=body.username,
-            hashed_password=hash_password(body.password),
-            full_name=body.full_name,
-            email=body.email,
-            role=body.role,
-        )
-        return user.to_dict()
+    existing = await WebUser.get_by_username(db, body.username)
+    if existing:
+        raise HTTPException(status_code=400, detail="Пользователь с таким логином уже существует")
+    user = await WebUser.create(
+        db,
+        username=body.username,
+        hashed_password=await hash_password_async(body.password),
+        full_name=body.full_name,
+        email=body.email,
+        role=body.role,
+    )
+    return user.to_dict()
 
 
 @app.put("/auth/users/{user_id}", tags=["Users"])
-async def update_user(user_id: int, body: UserUpdate, current_user: WebUser = Depends(require_role("admin"))):
+async def update_user(user_id: int, body: UserUpdate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Обновить пользователя (admin)"""
-    async with create_session() as db:
-        user = await WebUser.get_by_id(db, user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-        update_data = {k: v for k, v in body.model_dump(exclude_unset=True).items() if v is not None}
-        if "password" in update_data:
-            update_data["hashed_password"] = hash_password(update_data.pop("password"))
-        if "role" in update_data and update_data["role"] not in ("admin", "operator", "student"):
-            raise HTTPException(status_code=400, detail="Роль должна быть admin, operator или student")
-        if not update_data:
-            raise HTTPException(status_code=400, detail="Нет данных для обновления")
+    user = await WebUser.get_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+    update_data = {k: v for k, v in body.model_dump(exclude_unset=True).items() if v is not None}
+    if "password" in update_data:
+        update_data["hashed_password"] = await hash_password_async(update_data.pop("password"))
+    if "role" in update_data and update_data["role"] not in ("admin", "operator", "student"):
+        raise HTTPException(status_code=400, detail="Роль должна быть admin, operator или student")
+    if not update_data:
+        raise HTTPException(status_code=400, detail="Нет данных для обновления")
 
-        updated = await WebUser.update_user(db, user_id, update_data)
-        return updated.to_dict()
+    updated = await WebUser.update_user(db, user_id, update_data)
+    await invalidate_principal(user_id)
+    return updated.to_dict()
 
 
 @app.delete("/auth/users/{user_id}", tags=["Users"])
-async def delete_user(user_id: int, current_user: WebUser = Depends(require_role("admin"))):
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("admin"))):
     """Удалить пользователя (admin)"""
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Нельзя удалить самого себя")
-    async with create_session() as db:
-        user = await WebUser.get_by_id(db, user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        await WebUser.delete_user(db, user_id)
-        return {"message": f"Пользователь {user_id} удалён"}
+    user = await WebUser.get_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    await WebUser.delete_user(db, user_id)
+    await invalidate_principal(user_id)
+    return {"message": f"Пользователь {user_id} удалён"}
 
 
 # ============================================================
 # Ticket endpoints
 # ============================================================
 
+async def _ticket_page(request: Request, db: AsyncSession, author_id: Optional[int], status: Optional[str],
+                       device_id: Optional[int], map_id: Optional[int], created_from: Optional[datetime],
+                       created_to: Optional[datetime], cursor: Optional[str], limit: Optional[int]):
+    """
+    Страница тикетов, новые первыми; курсор следующей страницы — в заголовке X-Next-Cursor.
+    Без limit и cursor — весь список одним ответом, как до постраничного чтения (веб-интерфейс).
+    """
+    if status is not None and status not in TICKET_STATUSES:
+        raise HTTPException(status_code=400, detail="Статус должен быть open, in_progress или closed")
+    if limit is None and cursor is None:
+        rows = await list_ticket_rows(
+            db, author_id, status=status, device_id=device_id, map_id=map_id,
+            created_from=created_from, created_to=created_to,
+        )
+        return encode_listing(request, rows, TicketRow.to_dict, TicketRow.FIELDS, TicketRow.to_row)
+    limit = limit or settings.TICKETS_PAGE_SIZE
+    if not 1 <= limit <= settings.TICKETS_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {settings.TICKETS_MAX_PAGE_SIZE}")
+    try:
+        after = decode_ticket_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = await list_ticket_rows(
+        db, author_id, status=status, device_id=device_id, map_id=map_id,
+        created_from=created_from, created_to=created_to, after=after, limit=limit + 1,
+    )
+    next_cursor = encode_ticket_cursor(rows[limit - 1]) if len(rows) > limit else None
+    response = encode_listing(request, rows[:limit], TicketRow.to_dict, TicketRow.FIELDS, TicketRow.to_row)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
 @app.get("/tickets", tags=["Tickets"])
-async def list_tickets(current_user: WebUser = Depends(require_role("admin", "operator"))):
-    """Список всех тикетов (operator, admin)"""
-    async with create_session() as db:
-        tickets = await Ticket.get_all(db)
-        return [t.to_dict() for t in tickets]
+async def list_tickets(request: Request, status: Optional[str] = None, device_id: Optional[int] = None,
+                       map_id: Optional[int] = None, author_id: Optional[int] = None,
+                       created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                       cursor: Optional[str] = None, limit: Optional[int] = None,
+                       db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(require_role("admin", "operator"))):
+    """Очередь тикетов постранично (operator, admin): фильтры по статусу, устройству, карте, автору и дате"""
+    return await _ticket_page(request, db, author_id, status, device_id, map_id, created_from, created_to, cursor, limit)
+
+
+@app.get("/tickets/counters", tags=["Tickets"])
+async def get_ticket_counters(db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(require_role("admin", "operator"))):
+    """Число тикетов open / in_progress / closed: всего и по устройствам, категориям и картам"""
+    return await ticket_counters.get(db, settings.TICKET_COUNTERS_TTL_SECONDS)
 
 
 @app.post("/tickets", tags=["Tickets"])
-async def create_ticket(body: TicketCreate, current_user: WebUser = Depends(require_role("student"))):
+async def create_ticket(body: TicketCreate, db: AsyncSession = Depends(get_db), current_user: WebUser = Depends(require_role("student"))):
     """Создать тикет о неисправности (student)"""
-    async with create_session() as db:
-        device_obj = await device.get_device_by_id(db, body.device_id)
-        if not device_obj:
-            raise HTTPException(status_code=404, detail="Устройство не найдено")
-
-        ticket = await Ticket.create(
-            db,
-            device_id=body.device_id,
-            author_id=current_user.id,
-            title=body.title,
-            description=body.description,
-        )
-        return ticket.to_dict()
+    device_obj = await device.get_device_by_id(db, body.device_id)
+    if not device_obj:
+        raise HTTPException(status_code=404, detail="Устройство не найдено")
+
+    ticket = await Ticket.create(
+        db,
+        device_id=body.device_id,
+        author_id=current_user.id,
+        title=body.title,
+        description=body.description,
+    )
+    return ticket.to_dict()
 
 
 @app.get("/tickets/my", tags=["Tickets"])
-async def my_tickets(current_user: WebUser = Depends(require_role("student"))):
-    """Мои тикеты (student)"""
-    async with create_session() as db:
-        tickets = await Ticket.get_by_author(db, current_user.id)
-        return [t.to_dict() for t in tickets]
+async def my_tickets(request: Request, status: Optional[str] = None, device_id: Optional[int] = None,
+                     map_id: Optional[int] = None, created_from: Optional[datetime] = None,
+                     created_to: Optional[datetime] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                     db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(require_role("student"))):
+    """Мои тикеты постранично (student), с теми же фильтрами"""
+    return await _ticket_page(request, db, current_user.id, status, device_id, map_id, created_from, created_to, cursor, limit)
 
 
 @app.get("/tickets/{ticket_id}", tags=["Tickets"])
-async def get_ticket(ticket_id: int, current_user: WebUser = Depends(get_current_user)):
+async def get_ticket(ticket_id: int, db: AsyncSession = Depends(get_read_db), current_user: WebUser = Depends(get_current_user)):
     """Детали тикета (авторизованный пользователь)"""
-    async with create_session() as db:
-        ticket = await Ticket.get_by_id(db, ticket_id)
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Тикет не найден")
-        if current_user.role == "student" and ticket.author_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Нет доступа к этому тикету")
-        return ticket.to_dict()
+    ticket = await Ticket.get_by_id(db, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Тикет не найден")
+    if current_user.role == "student" and ticket.author_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому тикету")
+    return ticket.to_dict()
 
 
 @app.put("/tickets/{ticket_id}/status", tags=["Tickets"])
 async def update_ticket_status(
     ticket_id: int,
     body: TicketStatusUpdate,
+    db: AsyncSession = Depends(get_db),
     current_user: WebUser = Depends(require_role("admin", "operator")),
 ):
     """Изменить статус тикета (operator, admin)"""
-    if body.status not in ("open", "in_progress", "closed"):
+    if body.status not in TICKET_STATUSES:
         raise HTTPException(status_code=400, detail="Статус должен быть open, in_progress или closed")
-    async with create_session() as db:
-        ticket = await Ticket.get_by_id(db, ticket_id)
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Тикет не найден")
-        closed_at = datetime.now() if body.status == "closed" else None
-        updated = await Ticket.update_status(db, ticket_id, body.status, closed_at)
-        return updated.to_dict()
+    ticket = await Ticket.get_by_id(db, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Тикет не найден")
+    closed_at = datetime.now() if body.status == "closed" else None
+    updated = await Ticket.update_status(db, ticket_id, body.status, closed_at)
+    return updated.to_dict()
 
 
 if __name__ == "__main__":
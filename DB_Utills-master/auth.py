@@ -1,5 +1,9 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import bcrypt
 from fastapi import Depends, HTTPException, status
@@ -8,13 +12,50 @@ from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.config import Settings
-from models.db_session import create_session
+from models.db_session import get_db
 from models.web_user import WebUser
+from services.invalidation_bus import invalidation_bus
 
 settings = Settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Тема шины инвалидации для кэша пользователей
+PRINCIPAL_TOPIC = "principal"
+
+# user_id -> (момент устаревания, пользователь); изменения приходят через invalidation_bus
+_principal_cache: Dict[int, Tuple[float, WebUser]] = {}
+# Поколение пользователя растёт при каждой инвалидации: пользователь, прочитанный
+# до неё, не сохраняется в кэш (как в classroom_index и map_clusters)
+_principal_generations: Dict[int, int] = {}
+_principal_epoch = 0
+
+# token -> payload уже проверенных подписей; exp проверяется при каждом попадании
+_token_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _principal_generation(user_id: int) -> Tuple[int, int]:
+    return _principal_epoch, _principal_generations.get(user_id, 0)
+
+
+def _on_principal_invalidated(key: Optional[str]) -> None:
+    global _principal_epoch
+    if key is None:
+        _principal_cache.clear()
+        _principal_epoch += 1
+        return
+    user_id = int(key)
+    _principal_cache.pop(user_id, None)
+    _principal_generations[user_id] = _principal_generations.get(user_id, 0) + 1
+
+
+invalidation_bus.subscribe(PRINCIPAL_TOPIC, _on_principal_invalidated)
+
+
+async def invalidate_principal(user_id: int) -> None:
+    """Сбрасывает кэш пользователя во всех воркерах — после изменения, деактивации или удаления."""
+    await invalidation_bus.publish(PRINCIPAL_TOPIC, str(user_id))
+
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
@@ -24,6 +65,37 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 
+# bcrypt отпускает GIL, поэтому хватает потоков; очередь ограничена семафором
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt",
+)
+_password_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+
+
+async def _run_password_job(func, *args):
+    """Выполняет bcrypt вне цикла событий; 503, если пул занят дольше таймаута."""
+    try:
+        await asyncio.wait_for(_password_slots.acquire(), settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again later",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_slots.release()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (
@@ -40,18 +112,51 @@ def create_refresh_token(data: dict) -> str:
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
 
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 def decode_token(token: str) -> dict:
+    payload = _token_cache.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            _token_cache.move_to_end(token)
+            return payload
+        _token_cache.pop(token, None)
+        raise _invalid_token()
     try:
-        return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _invalid_token()
+    _token_cache[token] = payload
+    if len(_token_cache) > settings.AUTH_TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+    return payload
+
+
+async def _load_principal(db: AsyncSession, user_id: int) -> Optional[WebUser]:
+    now = time.monotonic()
+    cached = _principal_cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    generation = _principal_generation(user_id)
+    user = await WebUser.get_by_id(db, user_id)
+    # Завершаем транзакцию чтения: соединение возвращается в пул до начала работы эндпоинта
+    await db.commit()
+    # Инвалидация пришла во время запроса — пользователь мог уже измениться; не кэшируем
+    if user is not None and generation == _principal_generation(user_id):
+        if len(_principal_cache) >= settings.AUTH_TOKEN_CACHE_SIZE:
+            for key in [k for k, (expires, _) in _principal_cache.items() if expires <= now]:
+                del _principal_cache[key]
+        _principal_cache[user_id] = (now + settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS, user)
+    return user
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> WebUser:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> WebUser:
     payload = decode_token(token)
     if payload.get("type") != "access":
         raise HTTPException(
@@ -64,8 +169,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> WebUser:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload",
         )
-    async with create_session() as db:
-        user = await WebUser.get_by_id(db, int(user_id))
+    user = await _load_principal(db, int(user_id))
     if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
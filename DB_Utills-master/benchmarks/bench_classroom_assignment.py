@@ -0,0 +1,77 @@
+"""
+Пакетное назначение аудиторий устройствам по координатам (device.assign_classrooms).
+
+Карта — плотная сетка аудиторий (по умолчанию 40 x 40 многоугольников), устройства
+разбросаны по ней случайно (по умолчанию 10 000). Замеры:
+  find x N   — поиск по сетке индекса для каждой точки (путь без NumPy);
+  locate     — MapIndex.locate: NumPy по всем точкам и рёбрам кандидатов;
+  backfill   — assign_classrooms целиком на временной SQLite-базе: чтение
+               устройств, locate, пакетный UPDATE; CPU процесса и общее время.
+Перед замером проверяется, что locate и find дают одинаковые аудитории.
+
+    cd DB_Utills-master && python -m benchmarks.bench_classroom_assignment [устройств] [аудиторий по стороне]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models.db_session import Base
+import models.__all_models  # noqa: F401
+from models.classroom import classroom
+from models.device import device
+from models.place import place
+from services import classroom_index
+from benchmarks.bench_classroom_lookup import _rooms
+
+
+async def main(devices: int, side: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        rng = random.Random(42)
+        points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(devices)]
+        async with factory() as db:
+            await db.execute(insert(place), [{"id": 1, "name": "floor"}])
+            await db.execute(insert(classroom), _rooms(side))
+            await db.execute(insert(device), [
+                {"name": f"device-{i}", "place_id": "unknown", "xCord": x, "yCord": y, "mapId": 1}
+                for i, (x, y) in enumerate(points)
+            ])
+            await db.commit()
+
+        print(f"{devices} devices, {side * side} classrooms (numpy: {classroom_index.NUMPY_AVAILABLE})")
+        async with factory() as db:
+            index = await classroom.get_map_index(db, 1)
+        xs, ys = [p[0] for p in points], [p[1] for p in points]
+
+        started = time.perf_counter()
+        by_point = [index.find(x, y) for x, y in points]
+        print(f"find x {devices:<8} {(time.perf_counter() - started) * 1000:9.1f} ms")
+        started = time.perf_counter()
+        located = index.locate(xs, ys)
+        print(f"locate          {(time.perf_counter() - started) * 1000:9.1f} ms")
+        assert [item and item.id for item in located] == [item and item.id for item in by_point], \
+            "locate and find disagree"
+
+        async with factory() as db:
+            cpu, wall = time.process_time(), time.perf_counter()
+            stats = await device.assign_classrooms(db, map_ids=[1])
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        print(f"backfill        {wall * 1000:9.1f} ms  (cpu {cpu * 1000:.1f} ms)  {stats}")
+        async with factory() as db:
+            linked = (await db.execute(select(func.count()).where(device.classroom_id.is_not(None)))).scalar()
+        assert linked == stats["assigned"], (linked, stats)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 40))
@@ -0,0 +1,129 @@
+"""
+Поиск аудитории по точке (/classrooms/find-by-point): прежний путь против индекса карты.
+
+Заполняет временную SQLite-базу картой из плотной сетки аудиторий (по умолчанию
+40 x 40 = 1600 многоугольников со скошенными стенами) и замеряет поиск для
+случайных точек:
+  before — аудитории карты из базы на каждый запрос и перебор всех полигонов;
+  sql    — пока индекс не построен: отбор по прямоугольнику в SQL
+           (ix_classrooms_map_bbox) и точная проверка кандидатов;
+  index  — services/classroom_index.py (база читается один раз, при построении).
+Перед замером проверяется, что оба пути находят одни и те же аудитории.
+
+    cd DB_Utills-master && python -m benchmarks.bench_classroom_lookup [аудиторий по стороне]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models.db_session import Base
+import models.__all_models  # noqa: F401
+from models.classroom import classroom
+from models.place import place
+from services.classroom_index import classroom_index, polygon_bbox
+
+LOOKUPS = 2000
+
+
+def _point_in_polygon(x: float, y: float, polygon: list) -> bool:
+    # Прежняя проверка из models/classroom.py
+    if not polygon or len(polygon) < 3:
+        return False
+    n = len(polygon)
+    inside = False
+    p1x, p1y = polygon[0].get('x', 0), polygon[0].get('y', 0)
+    for i in range(1, n + 1):
+        p2x, p2y = polygon[i % n].get('x', 0), polygon[i % n].get('y', 0)
+        if y > min(p1y, p2y):
+            if y <= max(p1y, p2y):
+                if x <= max(p1x, p2x):
+                    if p1y != p2y:
+                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                    if p1x == p2x or x <= xinters:
+                        inside = not inside
+        p1x, p1y = p2x, p2y
+    return inside
+
+
+async def before(db, map_id: int, x: float, y: float):
+    for room in await classroom.get_classrooms_by_map(db, map_id):
+        if _point_in_polygon(x, y, room.polygon_coordinates):
+            return room
+    return None
+
+
+def _rooms(side: int) -> list:
+    step = 100 / side
+    rooms = []
+    for i in range(side):
+        for j in range(side):
+            x0, y0 = i * step, j * step
+            # Шестиугольник со скошенными углами — не прямоугольник, чтобы работал луч
+            cut = step * 0.2
+            polygon = [
+                {"x": x0 + cut, "y": y0}, {"x": x0 + step - cut, "y": y0}, {"x": x0 + step, "y": y0 + step / 2},
+                {"x": x0 + step - cut, "y": y0 + step}, {"x": x0 + cut, "y": y0 + step}, {"x": x0, "y": y0 + step / 2},
+            ]
+            min_x, min_y, max_x, max_y = polygon_bbox(polygon)
+            rooms.append({"name": f"room-{i}-{j}", "map_id": 1, "polygon_coordinates": polygon,
+                          "min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y})
+    return rooms
+
+
+async def main(side: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with factory() as db:
+            await db.execute(insert(place), [{"id": 1, "name": "floor"}])
+            await db.execute(insert(classroom), _rooms(side))
+            await db.commit()
+
+        rng = random.Random(42)
+        points = [(rng.uniform(-1, 101), rng.uniform(-1, 101)) for _ in range(LOOKUPS)]
+        # Без фоновой сборки индекса, чтобы замерить холодный путь (отбор в SQL)
+        warm, classroom_index.warm = classroom_index.warm, lambda map_id, build: None
+        async with factory() as db:
+            for x, y in points[:200]:
+                old, new = await before(db, 1, x, y), await classroom.find_classroom_by_point(db, 1, x, y)
+                assert (old and old.id) == (new and new.id), (x, y)
+
+        print(f"{side * side} classrooms on the map, {LOOKUPS} lookups")
+        async with factory() as db:
+            count = 200
+            started = time.perf_counter()
+            for x, y in points[:count]:
+                await before(db, 1, x, y)
+            elapsed = time.perf_counter() - started
+            print(f"before {elapsed / count * 1000:10.3f} ms/lookup")
+        async with factory() as db:
+            started = time.perf_counter()
+            for x, y in points:
+                await classroom.find_classroom_by_point(db, 1, x, y)
+            elapsed = time.perf_counter() - started
+            print(f"sql    {elapsed / LOOKUPS * 1000:10.3f} ms/lookup")
+        classroom_index.warm = warm
+        async with factory() as db:
+            await classroom.get_map_index(db, 1)
+            for x, y in points[:200]:
+                old, new = await before(db, 1, x, y), await classroom.find_classroom_by_point(db, 1, x, y)
+                assert (old and old.id) == (new and new.id), (x, y)
+        async with factory() as db:
+            started = time.perf_counter()
+            for x, y in points:
+                await classroom.find_classroom_by_point(db, 1, x, y)
+            elapsed = time.perf_counter() - started
+            print(f"index  {elapsed / LOOKUPS * 1000:10.3f} ms/lookup")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 40))
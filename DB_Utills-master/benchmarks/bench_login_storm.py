@@ -0,0 +1,90 @@
+"""
+Login storm: задержка других эндпоинтов во время 50 одновременных входов.
+
+Поднимает в процессе ASGI-приложение с тремя маршрутами — вход с bcrypt прямо
+в цикле событий (как было), вход через verify_password_async и лёгкий /ping —
+и пока идут входы, опрашивает /ping каждые 10 мс. Для каждого сценария печатает
+задержку /ping (p50 / p99 / max), общее время шторма и коды ответов входа.
+Если ядер мало, часть входов получает 503 по PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS —
+это ожидаемый сброс нагрузки, а не ошибка.
+
+    cd DB_Utills-master && python -m benchmarks.bench_login_storm [число входов]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+
+import httpx
+from fastapi import FastAPI
+
+from auth import hash_password, verify_password, verify_password_async
+
+PING_INTERVAL = 0.01
+
+app = FastAPI()
+_HASH = hash_password("benchmark-password")
+
+
+@app.post("/login-inline")
+async def login_inline():
+    return {"ok": verify_password("benchmark-password", _HASH)}
+
+
+@app.post("/login")
+async def login():
+    return {"ok": await verify_password_async("benchmark-password", _HASH)}
+
+
+@app.get("/ping")
+async def ping():
+    return {}
+
+
+async def _probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list) -> None:
+    # Задержка считается от момента, когда запрос должен был уйти: если цикл событий
+    # занят bcrypt, опоздание самого пробника тоже попадает в замер
+    due = time.perf_counter()
+    while True:
+        await client.get("/ping")
+        finished = time.perf_counter()
+        latencies.append((finished - due) * 1000)
+        if stop.is_set():
+            break
+        due = finished + PING_INTERVAL
+        await asyncio.sleep(PING_INTERVAL)
+
+
+async def _scenario(client: httpx.AsyncClient, login_path: str, logins: int) -> None:
+    stop = asyncio.Event()
+    latencies: list = []
+    probe = asyncio.create_task(_probe(client, stop, latencies))
+    await asyncio.sleep(0.2)  # задержка /ping без нагрузки в начале выборки
+    started = time.perf_counter()
+    if logins:
+        responses = await asyncio.gather(*[client.post(login_path) for _ in range(logins)])
+        statuses = Counter(r.status_code for r in responses)
+    else:
+        await asyncio.sleep(1.0)
+        statuses = Counter()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    title = f"{logins} x {login_path}" if logins else "idle"
+    print(f"{title:<22} storm {elapsed:6.2f} s | /ping p50 {statistics.median(latencies):7.1f} ms"
+          f"  p99 {p99:7.1f} ms  max {latencies[-1]:7.1f} ms  | statuses {dict(statuses)}")
+
+
+async def main(logins: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await _scenario(client, "/ping", 0)
+        await _scenario(client, "/login-inline", logins)
+        await _scenario(client, "/login", logins)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
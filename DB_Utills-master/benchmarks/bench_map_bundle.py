@@ -0,0 +1,113 @@
+"""
+Открытие карты: четыре запроса (/places, /classrooms/map/{id}, /search, /categories)
+против одного /maps/{mapId}/bundle.
+
+Заполняет временную SQLite-базу: 4 карты, на каждой сетка аудиторий (по умолчанию
+20 x 20) и N устройств (по умолчанию 5 000 на карту), часть с SNMP. Замеры — работа
+сервера без HTTP и авторизации:
+  before — четыре ответа, как их собирают прежние эндпоинты (все устройства —
+           /search, фронтенд фильтрует по карте сам);
+  cold   — пакет с пустым кэшем;
+  warm   — повторный пакет: должен обойтись без SQL (проверяется).
+
+    cd DB_Utills-master && python -m benchmarks.bench_map_bundle [устройств на карту] [аудиторий по стороне]
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models.db_session import Base
+import models.__all_models  # noqa: F401
+from models.category import category
+from models.classroom import classroom
+from models.device import device
+from models.device_snmp_config import DeviceSNMPConfig
+from models.place import place
+from models.read_rows import DeviceRow, search_device_rows
+from services.classroom_index import classroom_index
+from services.map_bundle import get_map_bundle, map_bundle_cache
+from services.serialization import dumps
+from benchmarks.bench_classroom_lookup import _rooms
+
+MAPS = 4
+REPEATS = 5
+
+
+async def before(db, map_id: int) -> int:
+    places = [{"id": p.id, "name": p.name} for p in await place.get_all_places(db)]
+    rooms = [c.to_dict() for c in await classroom.get_classrooms_by_map(db, map_id)]
+    devices = [DeviceRow.to_dict(row) for row in await search_device_rows(db)]
+    categories = [c.to_dict() for c in await category.get_all_categories(db)]
+    return sum(len(dumps(body)) for body in (places, rooms, devices, categories))
+
+
+async def main(per_map: int, side: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        rng = random.Random(42)
+        async with factory() as db:
+            await db.execute(insert(place), [{"id": m, "name": f"floor {m}"} for m in range(1, MAPS + 1)])
+            await db.execute(insert(category), [{"id": i, "name": f"cat-{i}", "icon": f"icon-{i}"} for i in range(1, 11)])
+            for m in range(1, MAPS + 1):
+                await db.execute(insert(classroom), [
+                    {**room, "name": f"{m}-{room['name']}", "map_id": m} for room in _rooms(side)])
+            await db.execute(insert(device), [
+                {"id": i + 1, "name": f"device-{i}", "place_id": "unknown", "category_id": i % 10 + 1,
+                 "xCord": rng.uniform(0, 100), "yCord": rng.uniform(0, 100), "mapId": i % MAPS + 1}
+                for i in range(per_map * MAPS)
+            ])
+            await db.execute(insert(DeviceSNMPConfig), [
+                {"device_id": i, "enabled": True, "ip_address": f"10.0.{i >> 8 & 255}.{i & 255}",
+                 "status": rng.choice(["up", "down", "unknown"])}
+                for i in range(1, per_map * MAPS + 1, 4)
+            ])
+            await db.commit()
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+        async with factory() as db:
+            body, etag = await get_map_bundle(db, 1, markers_ttl=30)
+        bundle = json.loads(body)
+        assert bundle["place"] == {"id": 1, "name": "floor 1"}
+        assert len(bundle["classrooms"]) == side * side
+        assert len(bundle["devices"]) == per_map and all(d["categoryIcon"].startswith("icon-") for d in bundle["devices"])
+        assert len(bundle["categories"]) == 10
+
+        print(f"{MAPS} maps x {per_map} devices, {side * side} classrooms per map")
+        async with factory() as db:
+            started = time.perf_counter()
+            for _ in range(REPEATS):
+                size = await before(db, 1)
+            print(f"before {(time.perf_counter() - started) / REPEATS * 1000:9.2f} ms  {size / 1e6:.2f} MB in 4 responses")
+        async with factory() as db:
+            elapsed = 0.0
+            for _ in range(REPEATS):
+                map_bundle_cache._entries.clear()
+                classroom_index.invalidate(None)
+                started = time.perf_counter()
+                body, _ = await get_map_bundle(db, 1, markers_ttl=30)
+                elapsed += time.perf_counter() - started
+            print(f"cold   {elapsed / REPEATS * 1000:9.2f} ms  {len(body) / 1e6:.2f} MB")
+            statements.clear()
+            started = time.perf_counter()
+            for _ in range(REPEATS * 100):
+                body, again = await get_map_bundle(db, 1, markers_ttl=30)
+            print(f"warm   {(time.perf_counter() - started) / (REPEATS * 100) * 1000:9.3f} ms")
+            assert not statements, f"warm bundle ran {len(statements)} SQL statements"
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 20))
@@ -0,0 +1,104 @@
+"""
+Устройства карты для отрисовки (/maps/{mapId}/devices): все маркеры против кластеров.
+
+Заполняет временную SQLite-базу картой с N устройствами (по умолчанию 50 000,
+часть с SNMP-мониторингом в разных статусах) и замеряет:
+  markers — все устройства карты отдельными маркерами (как без кластеризации);
+  cold    — сводка ячеек одним GROUP BY по ix_device_map_xy, для каждого zoom;
+  cached  — тот же запрос из кэша сводок;
+  window  — окно 10 x 10 % на максимальном zoom: маркеры по индексу.
+Перед замером сводка сверяется с подсчётом по ячейкам в Python.
+
+    cd DB_Utills-master && python -m benchmarks.bench_map_clusters [устройств]
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models.db_session import Base
+import models.__all_models  # noqa: F401
+from models.config import Settings
+from models.device import device
+from models.device_snmp_config import DeviceSNMPConfig
+from models.place import place
+from models.read_rows import STATUS_RANKS, map_device_markers, rank_status
+from services.map_clusters import cell_size, get_map_devices, invalidate_map_devices
+
+STATUSES = ["up", "up", "up", "unknown", "error", "down", "disabled"]
+
+
+async def main(devices: int) -> None:
+    settings = Settings()
+    options = dict(grid=settings.MAP_CLUSTER_GRID, max_zoom=settings.MAP_CLUSTER_MAX_ZOOM,
+                   max_markers=settings.MAP_CLUSTER_MAX_MARKERS, ttl=settings.MAP_CLUSTER_CACHE_TTL_SECONDS)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        rng = random.Random(42)
+        points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(devices)]
+        snmp = {i + 1: rng.choice(STATUSES) for i in range(0, devices, 3)}
+        async with factory() as db:
+            await db.execute(insert(place), [{"id": 1, "name": "floor"}])
+            await db.execute(insert(device), [
+                {"id": i + 1, "name": f"device-{i}", "place_id": "unknown", "xCord": x, "yCord": y, "mapId": 1}
+                for i, (x, y) in enumerate(points)
+            ])
+            await db.execute(insert(DeviceSNMPConfig), [
+                {"device_id": device_id, "enabled": status != "disabled", "ip_address": f"10.{device_id >> 16}.{device_id >> 8 & 255}.{device_id & 255}",
+                 "status": status}
+                for device_id, status in snmp.items()
+            ])
+            await db.commit()
+
+        # Проверка сводки zoom 1 по ячейкам, посчитанным в Python
+        size = cell_size(1, options["grid"])
+        expected = defaultdict(lambda: [0, 0])
+        for i, (x, y) in enumerate(points):
+            cell = expected[(math.floor(x / size), math.floor(y / size))]
+            status = snmp.get(i + 1)
+            cell[0] += 1
+            cell[1] = max(cell[1], STATUS_RANKS.get(status, 0) if status != "disabled" else 0)
+        async with factory() as db:
+            result = await get_map_devices(db, 1, 1, None, **options)
+        assert result["mode"] == "clusters", result["mode"]
+        got = {tuple(c["cell"]): (c["count"], c["status"]) for c in result["clusters"]}
+        assert got == {cell: (count, rank_status(rank)) for cell, (count, rank) in expected.items()}
+        async with factory() as db:
+            window = await get_map_devices(db, 1, options["max_zoom"], (40, 40, 50, 50), **options)
+        assert window["mode"] == "devices"
+        assert {d["id"] for d in window["devices"]} == {
+            i + 1 for i, (x, y) in enumerate(points) if 40 <= x <= 50 and 40 <= y <= 50}
+
+        print(f"{devices} devices on the map, {len(snmp)} with SNMP")
+        async with factory() as db:
+            started = time.perf_counter()
+            markers = await map_device_markers(db, 1)
+            print(f"markers        {(time.perf_counter() - started) * 1000:9.1f} ms  {len(markers)} markers")
+            for zoom in range(options["max_zoom"]):
+                await invalidate_map_devices(1)
+                started = time.perf_counter()
+                result = await get_map_devices(db, 1, zoom, None, **options)
+                cold = time.perf_counter() - started
+                started = time.perf_counter()
+                await get_map_devices(db, 1, zoom, None, **options)
+                cached = time.perf_counter() - started
+                print(f"zoom {zoom}  cold {cold * 1000:9.1f} ms  cached {cached * 1000:7.2f} ms  "
+                      f"{result['mode']}: {len(result['clusters']) or len(result['devices'])}")
+            started = time.perf_counter()
+            window = await get_map_devices(db, 1, options["max_zoom"], (40, 40, 50, 50), **options)
+            print(f"window         {(time.perf_counter() - started) * 1000:9.1f} ms  {len(window['devices'])} markers")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000))
@@ -0,0 +1,91 @@
+"""
+QR-коды: одиночный код (/equipment/{id}/qr) и лист наклеек (/labels).
+
+Замеры без базы и HTTP:
+  before     — прежний путь: матрица и PNG заново на каждый запрос и две копии буфера;
+  cached     — services/qr_codes.qr_cache: повторный запрос того же кода;
+  sheet      — PDF-лист на N устройств (по умолчанию 2000) прямо в цикле событий
+               и через пул процессов LabelRenderer; для обоих — самая долгая
+               задержка цикла событий, пока лист рисуется (её увидят другие запросы).
+
+    cd DB_Utills-master && python -m benchmarks.bench_qr_labels [устройств]
+"""
+import asyncio
+import io
+import sys
+import time
+
+import qrcode
+
+from services.qr_codes import equipment_url, label_renderer, qr_cache, render_label_sheet
+
+FRONTEND_URL = "http://localhost:5173"
+REPEATS = 200
+
+
+def before(device_id: int) -> bytes:
+    # Прежний get_device_qr_code без базы
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(equipment_url(FRONTEND_URL, device_id))
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='PNG')
+    img_byte_arr.seek(0)
+    return io.BytesIO(img_byte_arr.read()).getvalue()
+
+
+async def _max_lag(work) -> tuple:
+    """(результат work, время, самая долгая задержка цикла событий за это время)"""
+    lag, done = [0.0], asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag[0] = max(lag[0], time.perf_counter() - started - 0.005)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    result = await work()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await task
+    return result, elapsed, lag[0]
+
+
+async def main(devices: int) -> None:
+    url = equipment_url(FRONTEND_URL, 1)
+    assert before(1) == await qr_cache.get(1, url, "png"), "cached code differs from the old rendering"
+
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        before(1)
+    print(f"before {(time.perf_counter() - started) / REPEATS * 1000:9.3f} ms/request")
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        await qr_cache.get(1, url, "png")
+    print(f"cached {(time.perf_counter() - started) / REPEATS * 1000:9.3f} ms/request")
+
+    labels = [(i, equipment_url(FRONTEND_URL, i), f"Device {i}", "Room 101") for i in range(1, devices + 1)]
+
+    async def inline():
+        return render_label_sheet(labels, "pdf")
+
+    async def pooled():
+        return await label_renderer.render(labels, "pdf", workers=2, queue_timeout=60)
+
+    label_renderer.start(2)
+    # Первый лист поднимает процесс — прогрев, чтобы замер показывал саму отрисовку
+    await label_renderer.render(labels[:1], "pdf", workers=2, queue_timeout=60)
+    body, elapsed, lag = await _max_lag(inline)
+    print(f"sheet inline {elapsed * 1000:9.0f} ms  max loop lag {lag * 1000:7.1f} ms  {len(body) / 1e6:.2f} MB")
+    body, elapsed, lag = await _max_lag(pooled)
+    assert body.startswith(b"%PDF")
+    print(f"sheet pool   {elapsed * 1000:9.0f} ms  max loop lag {lag * 1000:7.1f} ms  {len(body) / 1e6:.2f} MB")
+    label_renderer.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
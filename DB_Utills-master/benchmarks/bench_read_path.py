@@ -0,0 +1,181 @@
+"""
+Чтение /search и /tickets: ORM-путь (как было) против Core-строк (models/read_rows.py).
+
+Заполняет временную SQLite-базу (по умолчанию 50 000 устройств, у половины есть
+SNMP-конфигурация, и 10 000 тикетов) и замеряет строк/с от запроса до готовых
+словарей ответа для трёх вариантов:
+  orm+N+1   — прежний /search: ORM-объекты и отдельный запрос SNMP на устройство;
+  orm join  — ORM-объекты, SNMP в том же запросе (чистая цена гидратации);
+  core rows — Core select с явными колонками и __slots__ DTO.
+Перед замером проверяется, что ответы ORM- и Core-путей совпадают.
+
+    cd DB_Utills-master && python -m benchmarks.bench_read_path [число устройств]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models.db_session import Base
+import models.__all_models  # noqa: F401
+from models.category import category
+from models.device import device
+from models.device_snmp_config import DeviceSNMPConfig
+from models.read_rows import list_ticket_rows, search_device_rows
+from models.ticket import Ticket
+from models.web_user import WebUser
+from services.serialization import dumps
+
+TICKETS = 10_000
+REPEATS = 3
+
+
+async def _fill(factory, devices: int) -> None:
+    async with factory() as db:
+        await db.execute(insert(category), [{"id": i, "name": f"cat{i}", "icon": f"icon{i}"} for i in range(1, 21)])
+        await db.execute(insert(WebUser), [
+            {"id": i, "username": f"user{i}", "hashed_password": "x", "full_name": f"User {i}",
+             "role": "student", "is_active": True}
+            for i in range(1, 101)
+        ])
+        await db.execute(insert(device), [
+            {"id": i, "name": f"device-{i}", "category": f"cat{i % 20 + 1}", "category_id": i % 20 + 1,
+             "place_id": f"room{i % 300}", "version": "1.0", "releaseDate": date(2024, 1, 1),
+             "softwareStartDate": date(2024, 6, 1), "manufacturer": "HP", "xCord": i % 100, "yCord": i % 77,
+             "mapId": i % 3 + 1}
+            for i in range(1, devices + 1)
+        ])
+        await db.execute(insert(DeviceSNMPConfig), [
+            {"device_id": i, "enabled": i % 4 != 0, "ip_address": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+             "port": 161, "community": "public", "version": "2c", "status": ("up", "down", "disabled")[i % 3],
+             "last_check": datetime(2026, 1, 1) + timedelta(seconds=i), "response_time": 1.5,
+             "timeout": 5, "retries": 2, "check_interval": 300}
+            for i in range(1, devices + 1, 2)
+        ])
+        await db.execute(insert(Ticket), [
+            {"device_id": i % devices + 1, "author_id": i % 100 + 1, "title": f"t{i}", "description": "broken",
+             "status": "open", "created_at": datetime(2026, 1, 1) + timedelta(minutes=i)}
+            for i in range(TICKETS)
+        ])
+        await db.commit()
+
+
+def _snmp_part(device_dict: dict, snmp_config) -> None:
+    snmp_config_dict = snmp_config.to_dict()
+    if not snmp_config.enabled:
+        snmp_config_dict['status'] = None
+        snmp_config_dict['response_time'] = None
+        snmp_config_dict['last_check'] = None
+    device_dict["snmp_config"] = snmp_config_dict
+    if snmp_config.enabled and snmp_config.status and snmp_config.status != 'disabled':
+        device_dict["snmp_status"] = {
+            "status": snmp_config.status,
+            "message": f"Last check: {snmp_config.last_check.isoformat() if snmp_config.last_check else 'Never'}",
+            "response_time": snmp_config.response_time,
+            "timestamp": snmp_config.last_check.isoformat() if snmp_config.last_check else None
+        }
+
+
+def _device_part(d, cat) -> dict:
+    return {
+        "name": d.name, "category": d.category, "category_id": d.category_id,
+        "categoryIcon": cat.icon if cat else 'default', "xCord": d.xCord, "yCord": d.yCord, "id": d.id,
+        "place_id": d.place_id, "classroom_id": d.classroom_id, "version": d.version,
+        "releaseDate": d.releaseDate.isoformat() if d.releaseDate else None,
+        "softwareStartDate": d.softwareStartDate.isoformat() if d.softwareStartDate else None,
+        "softwareEndDate": d.softwareEndDate.isoformat() if d.softwareEndDate else None,
+        "updateDate": d.updateDate.isoformat() if d.updateDate else None,
+        "manufacturer": d.manufacturer, "manufacturer_id": d.manufacturer_id, "mapId": d.mapId,
+    }
+
+
+async def orm_n_plus_one(db) -> list:
+    result = await db.execute(select(device, category).outerjoin(category, device.category_id == category.id))
+    devices = []
+    for d, cat in result.all():
+        device_dict = _device_part(d, cat)
+        snmp_config = await DeviceSNMPConfig.get_by_device_id(db, d.id)
+        if snmp_config:
+            _snmp_part(device_dict, snmp_config)
+        devices.append(device_dict)
+    return devices
+
+
+async def orm_join(db) -> list:
+    result = await db.execute(
+        select(device, category, DeviceSNMPConfig)
+        .outerjoin(category, device.category_id == category.id)
+        .outerjoin(DeviceSNMPConfig, DeviceSNMPConfig.device_id == device.id)
+    )
+    devices = []
+    for d, cat, snmp_config in result.all():
+        device_dict = _device_part(d, cat)
+        if snmp_config:
+            _snmp_part(device_dict, snmp_config)
+        devices.append(device_dict)
+    return devices
+
+
+async def core_rows(db) -> list:
+    return [row.to_dict() for row in await search_device_rows(db)]
+
+
+async def orm_tickets(db) -> list:
+    return [t.to_dict() for t in await Ticket.get_all(db)]
+
+
+async def core_tickets(db) -> list:
+    return [t.to_dict() for t in await list_ticket_rows(db)]
+
+
+async def _measure(factory, title: str, fn, repeats: int = REPEATS) -> float:
+    best = None
+    rows = 0
+    for _ in range(repeats):
+        # Новая сессия на повтор — как новый запрос, identity map пустая
+        async with factory() as db:
+            started = time.perf_counter()
+            rows = len(await fn(db))
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{title:<22} {rows:>7} rows  {best * 1000:9.1f} ms  {rows / best:>10,.0f} rows/s")
+    return best
+
+
+async def main(devices: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        await _fill(factory, devices)
+
+        # Core-путь оставляет даты объектами — сравниваем ответы после кодирования
+        async with factory() as db:
+            assert json.loads(dumps(await orm_join(db))) == json.loads(dumps(await core_rows(db))), \
+                "ORM and Core /search responses differ"
+        async with factory() as db:
+            assert json.loads(dumps(await orm_tickets(db))) == json.loads(dumps(await core_tickets(db))), \
+                "ORM and Core /tickets responses differ"
+
+        print(f"/search, {devices} devices")
+        await _measure(factory, "orm+N+1 (before)", orm_n_plus_one, repeats=1)
+        orm = await _measure(factory, "orm join", orm_join)
+        core = await _measure(factory, "core rows", core_rows)
+        print(f"core vs orm join: x{orm / core:.1f}\n")
+
+        print(f"/tickets, {TICKETS} tickets")
+        orm = await _measure(factory, "orm selectin (before)", orm_tickets)
+        core = await _measure(factory, "core rows", core_tickets)
+        print(f"core vs orm: x{orm / core:.1f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000))
@@ -0,0 +1,101 @@
+"""
+Сериализация ответа /search: время и размер тела для 50 000 устройств.
+
+Строки строятся в памяти (без базы), как их отдаёт models/read_rows.py.
+Варианты:
+  before          — словари с isoformat, jsonable_encoder FastAPI и stdlib json (как было);
+  json            — encode_listing: общий сериализатор + orjson (или stdlib без orjson);
+  columnar json   — Accept: application/vnd.columnar+json;
+  msgpack         — Accept: application/msgpack;
+  columnar msgpack— Accept: application/vnd.columnar+msgpack.
+Размер показан и после gzip, как его увидит клиент за сжимающим прокси.
+
+    cd DB_Utills-master && python -m benchmarks.bench_search_serialization [число устройств]
+"""
+import gzip
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from starlette.datastructures import Headers
+
+from models.read_rows import DeviceRow
+from services import serialization
+from services.serialization import encode_listing
+
+REPEATS = 3
+
+
+class _Request:
+    """Минимальная замена Request: encode_listing смотрит только на заголовки"""
+
+    def __init__(self, accept: str = ""):
+        self.headers = Headers({"accept": accept} if accept else {})
+
+
+def _rows(count: int) -> list:
+    rows = []
+    for i in range(1, count + 1):
+        device_part = (
+            i, f"device-{i}", f"cat{i % 20}", i % 20 + 1, 0.5 * (i % 100), 0.25 * (i % 77),
+            f"room{i % 300}", i % 300 + 1, "1.0", date(2024, 1, 1), date(2024, 6, 1), None, None,
+            "HP", 1, i % 3 + 1, f"icon{i % 20}",
+        )
+        if i % 2:
+            snmp_part = (
+                i, i % 4 != 0, f"10.0.{i >> 8 & 255}.{i & 255}", 161, "public", "2c", None, None,
+                "MD5", "DES", datetime(2026, 1, 1) + timedelta(seconds=i), ("up", "down", "disabled")[i % 3],
+                1.5, 5, 2, 300,
+            )
+        else:
+            snmp_part = (None,) * 16
+        rows.append(DeviceRow(device_part + snmp_part))
+    return rows
+
+
+def _before(rows: list) -> bytes:
+    devices = []
+    for row in rows:
+        d = row.to_dict()
+        for key in ("releaseDate", "softwareStartDate", "softwareEndDate", "updateDate"):
+            d[key] = d[key].isoformat() if d[key] else None
+        devices.append(d)
+    content = jsonable_encoder({"devices": devices})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _listing(accept: str):
+    def encode(rows: list) -> bytes:
+        response = encode_listing(_Request(accept), rows, DeviceRow.to_dict, DeviceRow.FIELDS, DeviceRow.to_row,
+                                  key="devices")
+        return response.body
+    return encode
+
+
+def _measure(title: str, fn, rows: list) -> None:
+    best = None
+    body = b""
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        body = fn(rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{title:<18} {best * 1000:8.1f} ms  {len(body) / 1024:9.0f} KiB  gzip {len(gzip.compress(body)) / 1024:7.0f} KiB")
+
+
+def main(count: int) -> None:
+    rows = _rows(count)
+    print(f"/search, {count} devices  (orjson: {serialization.ORJSON_AVAILABLE}, msgpack: {serialization.MSGPACK_AVAILABLE})")
+    assert json.loads(_before(rows)) == json.loads(_listing("")(rows)), "JSON bodies differ"
+    _measure("before", _before, rows)
+    _measure("json", _listing(""), rows)
+    _measure("columnar json", _listing(serialization.COLUMNAR_MEDIA_TYPE), rows)
+    if serialization.MSGPACK_AVAILABLE:
+        _measure("msgpack", _listing(serialization.MSGPACK_MEDIA_TYPE), rows)
+        _measure("columnar msgpack", _listing(serialization.COLUMNAR_MSGPACK_MEDIA_TYPE), rows)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
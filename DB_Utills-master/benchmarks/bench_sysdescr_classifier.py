@@ -0,0 +1,147 @@
+"""
+Микробенчмарк классификатора sysDescr.
+
+Сравнивает SysDescrClassifier с последовательными re.search по тем же правилам
+(как было в network_discovery_service) на корпусе реальных sysDescr
+и проверяет, что результаты совпадают.
+
+    cd DB_Utills-master && python -m benchmarks.bench_sysdescr_classifier [повторов]
+"""
+import json
+import re
+import sys
+import time
+
+from services.sysdescr_classifier import RULES_PATH, SysDescrClassifier
+
+# Строки sysDescr, встречавшиеся в реальных сетях (серийные номера и версии как есть)
+CORPUS = [
+    'Cisco IOS Software, C2960 Software (C2960-LANBASEK9-M), Version 12.2(55)SE7, RELEASE SOFTWARE (fc1)',
+    'Cisco IOS Software, ISR Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), Version 16.9.4, RELEASE SOFTWARE (fc2)',
+    'Cisco Adaptive Security Appliance Version 9.8(4)',
+    'Cisco NX-OS(tm) n5000, Software (n5000-uk9), Version 7.3(8)N1(1), RELEASE SOFTWARE',
+    'Juniper Networks, Inc. ex2300-48p Ethernet Switch, kernel JUNOS 18.2R3-S2.9, Build date: 2019-12-11',
+    'Juniper Networks, Inc. srx300 internet router, kernel JUNOS 15.1X49-D170.4',
+    'Huawei Versatile Routing Platform Software VRP (R) software,Version 5.170 (S5720 V200R011C10SPC500)',
+    'S5735-L48T4X-A1 Huawei Versatile Routing Platform Software',
+    'RouterOS RB4011iGS+',
+    'RouterOS CCR1036-8G-2S+ MikroTik',
+    'HP J9774A 2530-8G-PoEP Switch, revision YA.16.10.0003, ROM YA.15.19 (/ws/swbuildm/rel_yakima_qaoff/code/build/lakes(swbuildm_rel_yakima_qaoff_rel_yakima))',
+    'HPE OfficeConnect Switch 1920S 24G 2SFP JL381A, PD.02.05, Linux 3.6.5-ac96795c, U-Boot 2012.10-00116-g3ab515c',
+    'HP ETHERNET MULTI-ENVIRONMENT,ROM none,JETDIRECT,JD153,EEPROM JSI23900013,CIDATE 07/07/2020',
+    'HP LaserJet Pro MFP M428fdw',
+    'Hewlett Packard Enterprise Comware Platform Software, Software Version 7.1.045, Release 3208P15',
+    'Dell EMC Networking N1548P, 6.6.0.2, Linux 4.14.138',
+    'Dell Networking N2048, 6.3.3.10, Linux 3.7.10-e0e3f3b5',
+    'Lenovo ThinkSystem NE1032 RackSwitch, Lenovo Networking OS Version 10.10.2.0',
+    'ArubaOS (MODEL: 7010), Version 8.6.0.9',
+    'Aruba JL256A 2930F-48G-PoE+-4SFP+ Switch, revision WC.16.10.0012',
+    'FortiGate-60F v6.4.8,build1914,211117 (GA)',
+    'Fortinet FortiSwitch-148E-FPOE v7.0.2',
+    'ZyXEL GS1920-24HP V2',
+    'Zyxel NWA1123-ACv3 wireless access point',
+    'D-Link DES-3200-28 Fast Ethernet Switch',
+    'DGS-1210-28P/ME/B1 6.10.007 D-Link',
+    'TP-LINK JetStream 24-Port Gigabit L2 Managed Switch with 4 SFP Slots',
+    'TL-SG3428 TP-Link JetStream 24-Port Gigabit L2+ Managed Switch',
+    'NETGEAR GS728TPv2 ProSAFE 24-port Gigabit Smart Switch',
+    'Netgear ReadyNAS 214',
+    'Canon iR-ADV C3525 /P',
+    'Canon imageRUNNER 2206N',
+    'EPSON Built-in 10Base-T/100Base-TX Print Server',
+    'EPSON WF-C5790 Series',
+    'Brother NC-8300h, Firmware Ver.1.09  (15.03.20),MID 8CE-F39,FID 2',
+    'Brother HL-L2340D series',
+    'Xerox WorkCentre 6515; System Software 64.60.11, ESS 201910231053',
+    'Xerox VersaLink B405 MFP; System 47.90.11',
+    'RICOH MP C3004ex 1.04 / RICOH Network Printer C model / RICOH Network Scanner C model',
+    'RICOH IM C3000 1.09 / RICOH Network Printer C model',
+    'KYOCERA Document Solutions Printing System',
+    'KYOCERA MITA Printing System',
+    'Samsung M332x 382x 402x Series; V4.00.01.32 JUL-12-2016;Engine 1.03.11;NIC V6.01.00',
+    'Samsung X4300 Series; V3.00.02.21',
+    'Hardware: Intel64 Family 6 Model 85 Stepping 7 AT/AT COMPATIBLE - Software: Windows Version 6.3 (Build 17763 Multiprocessor Free)',
+    'Hardware: AMD64 Family 25 Model 33 Stepping 0 AT/AT COMPATIBLE - Software: Windows Version 6.3 (Build 19045 Multiprocessor Free)',
+    'Microsoft Windows Server 2019 Standard',
+    'Linux gw01 5.10.0-21-amd64 #1 SMP Debian 5.10.162-1 (2023-01-21) x86_64',
+    'Linux nas01 4.4.302+ #72806 SMP Thu Sep 5 13:44:21 CST 2024 x86_64',
+    'Linux srv-backup 3.10.0-1160.el7.x86_64 #1 SMP Mon Oct 19 16:18:59 UTC 2020 x86_64',
+    'Linux raspberrypi 6.1.21-v8+ #1642 SMP PREEMPT Mon Apr  3 17:24:16 BST 2023 aarch64',
+    'FreeBSD fw.local 13.1-RELEASE-p6 FreeBSD 13.1-RELEASE-p6 amd64',
+    'pfSense fw01.example 2.7.0-RELEASE FreeBSD 14.0-CURRENT amd64',
+    'UniFi UAP-AC-Pro 6.5.28.14491',
+    'EdgeSwitch 24-Port 250W, 1.9.3.5389302, Linux 3.6.5-f4a26ed5',
+    'Ubiquiti EdgeRouter X 2.0.9',
+    'QNAP Systems, Inc. TS-451+',
+    'Linux TS-453D 5.10.60-qnap #1 SMP Thu Oct 5 01:15:57 CST 2023 x86_64',
+    'Synology DiskStation DS920+',
+    'Linux DiskStation 4.4.302+ #69057 SMP Fri Jan 12 17:02:28 CST 2024 x86_64',
+    'APC Web/SNMP Management Card (MB:v4.1.0 PF:v6.8.2 PN:apc_hw05_aos_682.bin AF1:v6.8.2 AN1:apc_hw05_sumx_682.bin MN:SMT1500RMI2U HR:03 SN: AS1234567890 MD:12/03/2019)',
+    'Smart-UPS 1500 FW:UPS 09.3 / ID=18',
+    'Hikvision DS-2CD2143G0-I IP camera',
+    'Dahua IPC-HDW2431T-AS-S2 network camera',
+    'AXIS P3245-LVE Network Camera 10.12.165',
+    'Yealink SIP-T46S VoIP phone 66.86.0.15',
+    'Grandstream GXP1628 IP Phone 1.0.11.23',
+    'Polycom SoundPoint IP 550',
+    'Eltex MES2324B ver.4.0.18.4 ROS',
+    'SNR-S2985G-24T SNR Switch',
+    'Keenetic Giga (KN-1011) маршрутизатор',
+    'Коммутатор уровня доступа QSW-2800-28T',
+    'Источник бесперебойного питания Ippon Smart Winner 2000',
+    'Eaton 5PX 1500 UPS',
+    'Ruckus R510 Multimedia Hotzone Wireless AP/SW Version: 110.0.0.0.2005',
+    'Wireless LAN Controller',
+    'Printer Network Interface',
+    'Unknown',
+    '',
+]
+
+
+def _naive(rules, sys_descr: str):
+    lower = sys_descr.lower()
+    result = []
+    for dim in ('manufacturers', 'device_types'):
+        found = ''
+        for rule in rules.get(dim, ()):
+            if re.search(rule['pattern'], lower):
+                found = rule['name']
+                break
+        result.append(found)
+    return result[0], result[1]
+
+
+def _measure(func, repeat: int) -> float:
+    """Среднее время классификации одной строки, мкс."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for descr in CORPUS:
+            func(descr)
+    return (time.perf_counter() - started) / (repeat * len(CORPUS)) * 1e6
+
+
+def main(repeat: int = 2000) -> None:
+    with open(RULES_PATH, encoding='utf-8') as f:
+        rules = json.load(f)
+    classifier = SysDescrClassifier.from_files([RULES_PATH])
+
+    mismatches = [
+        (descr, _naive(rules, descr), classifier.classify(descr))
+        for descr in CORPUS
+        if _naive(rules, descr) != classifier.classify(descr)
+    ]
+    for descr, expected, actual in mismatches:
+        print(f'MISMATCH {descr!r}: re.search={expected} classifier={actual}')
+    if mismatches:
+        sys.exit(1)
+
+    naive = _measure(lambda d: _naive(rules, d), repeat)
+    compiled = _measure(classifier.classify, repeat)
+    print(f'corpus: {len(CORPUS)} sysDescr, rules: '
+          f'{len(rules["manufacturers"])} manufacturers + {len(rules["device_types"])} device types')
+    print(f're.search loop:    {naive:8.2f} us/sysDescr')
+    print(f'SysDescrClassifier:{compiled:8.2f} us/sysDescr  (x{naive / compiled:.1f})')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,112 @@
+"""
+Очередь тикетов (/tickets) и счётчики (/tickets/counters) на накопленной истории.
+
+Заполняет временную SQLite-базу: N тикетов (по умолчанию 200 000) за несколько
+лет по 2 000 устройствам на 4 картах, почти все закрыты. Замеры:
+  before    — весь список тикетов, как отдавал /tickets до постраничного чтения;
+  page 1    — первая страница (100), новые первыми;
+  page deep — страница по курсору в середине истории;
+  open      — первая страница открытых тикетов одной карты;
+  counters  — один GROUP BY по устройствам (холодный) и из кэша.
+Перед замером проверяется, что страницы по курсору вместе дают тот же список,
+что и один запрос без страниц, а счётчики сходятся с подсчётом в Python.
+
+    cd DB_Utills-master && python -m benchmarks.bench_tickets [тикетов]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models.db_session import Base
+import models.__all_models  # noqa: F401
+from models.device import device
+from models.read_rows import encode_ticket_cursor, decode_ticket_cursor, list_ticket_rows
+from models.ticket import Ticket
+from models.web_user import WebUser
+from services.ticket_counters import ticket_counters
+
+DEVICES = 2000
+PAGE = 100
+
+
+async def _pages(db, **filters) -> list:
+    ids, after = [], None
+    while True:
+        rows = await list_ticket_rows(db, after=after, limit=PAGE + 1, **filters)
+        ids += [row.id for row in rows[:PAGE]]
+        if len(rows) <= PAGE:
+            return ids
+        after = decode_ticket_cursor(encode_ticket_cursor(rows[PAGE - 1]))
+
+
+def _timed(label: str, started: float, extra: str = "") -> None:
+    print(f"{label:<10} {(time.perf_counter() - started) * 1000:9.2f} ms  {extra}")
+
+
+async def main(tickets: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        rng = random.Random(42)
+        start = datetime(2022, 1, 1)
+        span = (datetime(2026, 1, 1) - start).total_seconds()
+        rows = []
+        for i in range(tickets):
+            created = start + timedelta(seconds=int(span * i / tickets))
+            rows.append({"device_id": rng.randint(1, DEVICES), "author_id": rng.randint(1, 50), "title": f"t{i}",
+                         "description": "x", "created_at": created,
+                         "status": "closed" if i < tickets * 0.98 else rng.choice(["open", "in_progress", "closed"])})
+        async with factory() as db:
+            await db.execute(insert(WebUser), [{"id": i, "username": f"u{i}", "full_name": f"u{i}",
+                                                "hashed_password": "-", "role": "student"} for i in range(1, 51)])
+            await db.execute(insert(device), [{"id": i, "name": f"d{i}", "place_id": "x", "category_id": None,
+                                               "mapId": i % 4 + 1} for i in range(1, DEVICES + 1)])
+            for i in range(0, tickets, 20_000):
+                await db.execute(insert(Ticket), rows[i:i + 20_000])
+            await db.commit()
+
+        async with factory() as db:
+            for filters in ({"status": "open"}, {"map_id": 2, "status": "in_progress"}, {"device_id": 7}):
+                assert await _pages(db, **filters) == [r.id for r in await list_ticket_rows(db, **filters)], filters
+            counters = await ticket_counters.get(db, ttl=60)
+            by_status = Counter(row["status"] for row in rows)
+            assert counters["totals"] == {s: by_status[s] for s in ("open", "in_progress", "closed")}
+            assert sum(m["closed"] for m in counters["maps"]) == by_status["closed"]
+
+        print(f"{tickets} tickets, {DEVICES} devices")
+        async with factory() as db:
+            started = time.perf_counter()
+            everything = await list_ticket_rows(db)
+            _timed("before", started, f"{len(everything)} rows")
+            started = time.perf_counter()
+            page = await list_ticket_rows(db, limit=PAGE + 1)
+            _timed("page 1", started)
+            middle = everything[len(everything) // 2]
+            started = time.perf_counter()
+            await list_ticket_rows(db, after=(middle.created_at, middle.id), limit=PAGE + 1)
+            _timed("page deep", started)
+            started = time.perf_counter()
+            opened = await list_ticket_rows(db, status="open", map_id=2, limit=PAGE + 1)
+            _timed("open", started, f"{len(opened)} rows")
+            ticket_counters.__init__()
+            started = time.perf_counter()
+            await ticket_counters.get(db, ttl=60)
+            _timed("counters", started, "cold")
+            started = time.perf_counter()
+            await ticket_counters.get(db, ttl=60)
+            _timed("counters", started, "cached")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -1,12 +1,12 @@
-import asyncio
-from models.db_session import global_init, create_session
-from models.category import category
+from alembic import command
+from models.db_session import alembic_config
 
-async def init_database():
-    """Инициализация базы данных с созданием таблицы category"""
-    await global_init()
+
+def init_database():
+    """Создание и обновление схемы базы данных (alembic upgrade head)"""
+    command.upgrade(alembic_config(), "head")
     print("База данных инициализирована")
-    print("Таблица category создана")
+
 
 if __name__ == "__main__":
-    asyncio.run(init_database())
+    init_database()
@@ -0,0 +1,181 @@
+"""baseline: схема, которую раньше создавал create_all
+
+Таблицы создаются только если их ещё нет, поэтому на базе, поднятой
+старым create_all, миграция просто ставит версию.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_table(name: str, *columns) -> None:
+    # В offline-режиме (--sql) проверить нечего — печатаем DDL целиком
+    if context.is_offline_mode() or not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns)
+
+
+def upgrade() -> None:
+    _create_table(
+        'category',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False, unique=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('icon', sa.String(50), nullable=True),
+    )
+    _create_table(
+        'places',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False),
+    )
+    op.create_index('ix_places_id', 'places', ['id'], if_not_exists=True)
+    op.create_index('ix_places_name', 'places', ['name'], unique=True, if_not_exists=True)
+
+    _create_table(
+        'web_users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(255), nullable=True, unique=True),
+        sa.Column('hashed_password', sa.String(255), nullable=False),
+        sa.Column('full_name', sa.String(255), nullable=False),
+        sa.Column('role', sa.String(20), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_web_users_username', 'web_users', ['username'], unique=True, if_not_exists=True)
+
+    _create_table(
+        'device',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('place_id', sa.String(), nullable=True),
+        sa.Column('version', sa.String(), nullable=True),
+        sa.Column('releaseDate', sa.Date(), nullable=True),
+        sa.Column('softwareStartDate', sa.Date(), nullable=True),
+        sa.Column('softwareEndDate', sa.Date(), nullable=True),
+        sa.Column('updateDate', sa.Date(), nullable=True),
+        sa.Column('manufacturer', sa.String(), nullable=True),
+        sa.Column('xCord', sa.Float(), nullable=True),
+        sa.Column('yCord', sa.Float(), nullable=True),
+        sa.Column('mapId', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_device_name', 'device', ['name'], if_not_exists=True)
+
+    _create_table(
+        'manufacturer',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('category_id', sa.Integer(), sa.ForeignKey('category.id'), nullable=False),
+    )
+    _create_table(
+        'classrooms',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(200), nullable=False),
+        sa.Column('map_id', sa.Integer(), sa.ForeignKey('places.id'), nullable=False),
+        sa.Column('polygon_coordinates', sa.JSON(), nullable=False),
+        sa.Column('description', sa.String(500), nullable=True),
+    )
+    op.create_index('ix_classrooms_id', 'classrooms', ['id'], if_not_exists=True)
+    op.create_index('ix_classrooms_name', 'classrooms', ['name'], if_not_exists=True)
+
+    _create_table(
+        'device_snmp_config',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('device_id', sa.Integer(), sa.ForeignKey('device.id'), nullable=False, unique=True),
+        sa.Column('enabled', sa.Boolean(), nullable=False),
+        sa.Column('ip_address', sa.String(45), nullable=False),
+        sa.Column('port', sa.Integer(), nullable=False),
+        sa.Column('community', sa.String(255), nullable=True),
+        sa.Column('version', sa.String(10), nullable=False),
+        sa.Column('username', sa.String(255), nullable=True),
+        sa.Column('password', sa.String(255), nullable=True),
+        sa.Column('auth_protocol', sa.String(10), nullable=True),
+        sa.Column('priv_protocol', sa.String(10), nullable=True),
+        sa.Column('last_check', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('response_time', sa.Float(), nullable=True),
+        sa.Column('timeout', sa.Integer(), nullable=True),
+        sa.Column('retries', sa.Integer(), nullable=True),
+        sa.Column('check_interval', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_device_snmp_config_ip_address', 'device_snmp_config', ['ip_address'], if_not_exists=True)
+
+    _create_table(
+        'tickets',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('device_id', sa.Integer(), sa.ForeignKey('device.id'), nullable=False),
+        sa.Column('author_id', sa.Integer(), sa.ForeignKey('web_users.id'), nullable=False),
+        sa.Column('title', sa.String(255), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+    )
+
+    _create_table(
+        'discovered_hosts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('subnet', sa.String(43), nullable=False),
+        sa.Column('ip_address', sa.String(45), nullable=False),
+        sa.Column('mac', sa.String(17), nullable=True),
+        sa.Column('sys_name', sa.String(255), nullable=True),
+        sa.Column('sys_descr', sa.Text(), nullable=True),
+        sa.Column('fingerprint', sa.String(40), nullable=False),
+        sa.Column('has_snmp', sa.Boolean(), nullable=False),
+        sa.Column('alive', sa.Boolean(), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('subnet', 'ip_address', name='uq_discovered_hosts_subnet_ip'),
+    )
+    op.create_index('ix_discovered_hosts_subnet_alive', 'discovered_hosts', ['subnet', 'alive'], if_not_exists=True)
+
+    _create_table(
+        'discovery_profiles',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('subnets', sa.JSON(), nullable=False),
+        sa.Column('communities', sa.JSON(), nullable=False),
+        sa.Column('mode', sa.String(10), nullable=False),
+        sa.Column('port', sa.Integer(), nullable=False),
+        sa.Column('interval_minutes', sa.Integer(), nullable=False),
+        sa.Column('max_packets_per_second', sa.Integer(), nullable=False),
+        sa.Column('window_start', sa.Time(), nullable=True),
+        sa.Column('window_end', sa.Time(), nullable=True),
+        sa.Column('enabled', sa.Boolean(), nullable=False),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('next_run_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_discovery_profiles_next_run_at', 'discovery_profiles', ['next_run_at'], if_not_exists=True)
+
+    _create_table(
+        'discovery_runs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('profile_id', sa.Integer(), sa.ForeignKey('discovery_profiles.id'), nullable=False),
+        sa.Column('subnet', sa.String(43), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('packets_per_second', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('total_found', sa.Integer(), nullable=False),
+        sa.Column('diff', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+    )
+    op.create_index('ix_discovery_runs_profile_started', 'discovery_runs', ['profile_id', 'started_at'],
+                    if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name in ('discovery_runs', 'discovery_profiles', 'discovered_hosts', 'tickets',
+                 'device_snmp_config', 'classrooms', 'manufacturer', 'device',
+                 'web_users', 'places', 'category'):
+        op.drop_table(name)
@@ -0,0 +1,51 @@
+"""индексы под фильтры эндпоинтов и триграммный поиск по имени устройства
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, колонки)
+_INDEXES = (
+    ('ix_device_category', 'device', ['category']),
+    ('ix_device_manufacturer', 'device', ['manufacturer']),
+    ('ix_device_place_id', 'device', ['place_id']),
+    ('ix_device_mapId', 'device', ['mapId']),
+    ('ix_tickets_device_id', 'tickets', ['device_id']),
+    ('ix_tickets_author_created', 'tickets', ['author_id', 'created_at']),
+    ('ix_tickets_status_created', 'tickets', ['status', 'created_at']),
+    ('ix_tickets_created_at', 'tickets', ['created_at']),
+    ('ix_classrooms_map_id', 'classrooms', ['map_id']),
+)
+
+
+def upgrade() -> None:
+    for name, table, columns in _INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+    # Мониторинг выбирает только включённые конфиги — их мало, частичный индекс компактнее
+    op.create_index(
+        'ix_device_snmp_config_enabled', 'device_snmp_config', ['enabled'],
+        postgresql_where=sa.text('enabled'), sqlite_where=sa.text('enabled'),
+        if_not_exists=True,
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # ILIKE '%...%' по имени: btree тут не помогает, нужен GIN по триграммам
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_device_name_trgm ON device USING gin (name gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_device_name_trgm')
+    op.drop_index('ix_device_snmp_config_enabled', table_name='device_snmp_config', if_exists=True)
+    for name, table, _columns in reversed(_INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
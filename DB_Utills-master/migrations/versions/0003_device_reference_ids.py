@@ -0,0 +1,63 @@
+"""целочисленные ссылки device -> category / manufacturer / classrooms
+
+Строковые device.category, device.manufacturer и device.place_id (имя аудитории)
+остаются для API; рядом появляются category_id, manufacturer_id и classroom_id,
+заполняемые по совпадению имени. Имена производителей и аудиторий не уникальны:
+предпочитается производитель той же категории и аудитория той же карты.
+Устройства, для которых совпадения нет, остаются с NULL.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (колонка, таблица, имя внешнего ключа)
+_REFERENCES = (
+    ('category_id', 'category', 'fk_device_category_id'),
+    ('manufacturer_id', 'manufacturer', 'fk_device_manufacturer_id'),
+    ('classroom_id', 'classrooms', 'fk_device_classroom_id'),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('device') as batch:
+        for column, table, fk_name in _REFERENCES:
+            batch.add_column(sa.Column(column, sa.Integer(), nullable=True))
+            batch.create_foreign_key(fk_name, table, [column], ['id'])
+    for column, _table, _fk_name in _REFERENCES:
+        op.create_index(f'ix_device_{column}', 'device', [column], if_not_exists=True)
+
+    op.execute(
+        'UPDATE device SET category_id = '
+        '(SELECT c.id FROM category c WHERE c.name = device.category) '
+        'WHERE category IS NOT NULL'
+    )
+    op.execute(
+        'UPDATE device SET manufacturer_id = COALESCE('
+        '(SELECT MIN(m.id) FROM manufacturer m '
+        ' WHERE m.name = device.manufacturer AND m.category_id = device.category_id), '
+        '(SELECT MIN(m.id) FROM manufacturer m WHERE m.name = device.manufacturer)) '
+        'WHERE manufacturer IS NOT NULL'
+    )
+    op.execute(
+        'UPDATE device SET classroom_id = COALESCE('
+        '(SELECT MIN(cl.id) FROM classrooms cl '
+        ' WHERE cl.name = device.place_id AND cl.map_id = device."mapId"), '
+        '(SELECT MIN(cl.id) FROM classrooms cl WHERE cl.name = device.place_id)) '
+        'WHERE place_id IS NOT NULL'
+    )
+
+def downgrade() -> None:
+    for column, _table, _fk_name in reversed(_REFERENCES):
+        op.drop_index(f'ix_device_{column}', table_name='device', if_exists=True)
+    with op.batch_alter_table('device') as batch:
+        for column, _table, fk_name in reversed(_REFERENCES):
+            batch.drop_constraint(fk_name, type_='foreignkey')
+            batch.drop_column(column)
@@ -0,0 +1,59 @@
+"""ограничивающие прямоугольники аудиторий
+
+classrooms.min_x / min_y / max_x / max_y — прямоугольник polygon_coordinates,
+чтобы отбирать аудитории по точке и окну просмотра в SQL, а не разбирать JSON
+всех аудиторий карты. Индекс (map_id, min_x, max_x, min_y, max_y).
+Существующие аудитории заполняются по своим полигонам.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+_COLUMNS = ('min_x', 'min_y', 'max_x', 'max_y')
+
+
+def _bbox(polygon):
+    # Как services.classroom_index.polygon_bbox; миграция не зависит от кода приложения
+    if not polygon:
+        return None, None, None, None
+    xs = [float(p.get('x', 0)) for p in polygon]
+    ys = [float(p.get('y', 0)) for p in polygon]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('classrooms') as batch:
+        for column in _COLUMNS:
+            batch.add_column(sa.Column(column, sa.Float(), nullable=True))
+    op.create_index('ix_classrooms_map_bbox', 'classrooms', ['map_id', 'min_x', 'max_x', 'min_y', 'max_y'],
+                    if_not_exists=True)
+
+    if context.is_offline_mode():
+        return
+    classrooms = sa.table(
+        'classrooms', sa.column('id', sa.Integer), sa.column('polygon_coordinates', sa.JSON),
+        *(sa.column(column, sa.Float) for column in _COLUMNS),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(classrooms.c.id, classrooms.c.polygon_coordinates)).all()
+    values = [{'b_id': row_id, **dict(zip(_COLUMNS, _bbox(polygon)))} for row_id, polygon in rows]
+    if values:
+        bind.execute(
+            classrooms.update().where(classrooms.c.id == sa.bindparam('b_id')),
+            values,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_classrooms_map_bbox', table_name='classrooms', if_exists=True)
+    with op.batch_alter_table('classrooms') as batch:
+        for column in reversed(_COLUMNS):
+            batch.drop_column(column)
@@ -0,0 +1,26 @@
+"""индекс устройств по карте и координатам
+
+ix_device_map_xy (mapId, xCord, yCord) — окно просмотра и кластеры карты
+(/maps/{mapId}/devices) читаются из индекса. Индекс ix_device_mapId из 0002
+становится лишним (mapId — первый столбец нового) и удаляется.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_device_map_xy', 'device', ['mapId', 'xCord', 'yCord'], if_not_exists=True)
+    op.drop_index('ix_device_mapId', table_name='device', if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index('ix_device_mapId', 'device', ['mapId'], if_not_exists=True)
+    op.drop_index('ix_device_map_xy', table_name='device', if_exists=True)
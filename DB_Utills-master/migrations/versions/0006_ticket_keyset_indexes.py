@@ -0,0 +1,51 @@
+"""индексы тикетов для постраничного чтения
+
+Очереди тикетов читаются страницами по ключу (created_at, id), новые первыми,
+с фильтрами по статусу, автору и устройству. Индексы из 0002 заменяются
+такими же с id в конце, чтобы порядок страницы целиком брался из индекса:
+  ix_tickets_created_at        -> ix_tickets_created_id (created_at, id)
+  ix_tickets_author_created    -> ix_tickets_author_created_id (author_id, created_at, id)
+  ix_tickets_status_created    -> ix_tickets_status_created_id (status, created_at, id)
+  ix_tickets_device_id         -> ix_tickets_device_created_id (device_id, created_at, id)
+На SQLite created_at, записанные CURRENT_TIMESTAMP (без дробной части секунд),
+дополняются до формата SQLAlchemy, чтобы сравниваться с курсором.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+_NEW = (
+    ('ix_tickets_created_id', ['created_at', 'id']),
+    ('ix_tickets_author_created_id', ['author_id', 'created_at', 'id']),
+    ('ix_tickets_status_created_id', ['status', 'created_at', 'id']),
+    ('ix_tickets_device_created_id', ['device_id', 'created_at', 'id']),
+)
+_OLD = (
+    ('ix_tickets_created_at', ['created_at']),
+    ('ix_tickets_author_created', ['author_id', 'created_at']),
+    ('ix_tickets_status_created', ['status', 'created_at']),
+    ('ix_tickets_device_id', ['device_id']),
+)
+
+
+def upgrade() -> None:
+    for name, columns in _NEW:
+        op.create_index(name, 'tickets', columns, if_not_exists=True)
+    for name, _ in _OLD:
+        op.drop_index(name, table_name='tickets', if_exists=True)
+    if not context.is_offline_mode() and op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE tickets SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+
+
+def downgrade() -> None:
+    for name, columns in _OLD:
+        op.create_index(name, 'tickets', columns, if_not_exists=True)
+    for name, _ in _NEW:
+        op.drop_index(name, table_name='tickets', if_exists=True)
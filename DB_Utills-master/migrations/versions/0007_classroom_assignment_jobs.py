@@ -0,0 +1,39 @@
+"""таблица заданий назначения аудиторий
+
+Состояние фоновых заданий назначения аудиторий хранилось в памяти процесса:
+при нескольких воркерах запрос состояния, попавший в другой воркер, получал 404.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'classroom_assignment_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('map_ids', sa.JSON(), nullable=True),
+        sa.Column('device_ids', sa.JSON(), nullable=True),
+        sa.Column('clear_unmatched', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index('ix_classroom_assignment_jobs_status', 'classroom_assignment_jobs', ['status'],
+                    if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_classroom_assignment_jobs_status', table_name='classroom_assignment_jobs', if_exists=True)
+    op.drop_table('classroom_assignment_jobs', if_exists=True)
@@ -0,0 +1,27 @@
+"""отметка воркера у заданий назначения аудиторий
+
+Задания, чей воркер убит или упал, оставались queued / running навсегда.
+Воркер-владелец теперь обновляет heartbeat_at; задания без обновлений помечаются
+failed. У заданий, созданных до миграции, отметки нет — они считаются устаревшими.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('classroom_assignment_jobs') as batch:
+        batch.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('classroom_assignment_jobs') as batch:
+        batch.drop_column('heartbeat_at')
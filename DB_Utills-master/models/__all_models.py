@@ -6,5 +6,8 @@ from .device_snmp_config import DeviceSNMPConfig
 from .classroom import classroom
 from .web_user import WebUser
 from .ticket import Ticket
+from .discovered_host import DiscoveredHost
+from .discovery_profile import DiscoveryProfile, DiscoveryRun
+from .classroom_assignment_job import ClassroomAssignmentJob
 
-__all__ = ["device", "place", "category", "manufacturer", "DeviceSNMPConfig", "classroom", "WebUser", "Ticket"]
+__all__ = ["device", "place", "category", "manufacturer", "DeviceSNMPConfig", "classroom", "WebUser", "Ticket", "DiscoveredHost", "DiscoveryProfile", "DiscoveryRun", "ClassroomAssignmentJob"]
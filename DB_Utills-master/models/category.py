@@ -4,6 +4,7 @@ from typing import Optional, Sequence
 from sqlalchemy import select, delete, update
 from sqlalchemy.orm import relationship
 from models.db_session import Base
+from services.table_versions import invalidate_categories
 
 
 class category(Base):
@@ -24,6 +25,7 @@ class category(Base):
         session.add(new_category)
         await session.commit()
         await session.refresh(new_category)
+        await invalidate_categories()
         return new_category
 
     @classmethod
@@ -47,8 +49,15 @@ class category(Base):
     @classmethod
     async def update_category(cls, session: AsyncSession, category_id: int, update_data: dict) -> Optional['category']:
         """Update category information."""
+        from models.device import device as device_model
         await session.execute(update(cls).where(cls.id == category_id).values(**update_data))
+        if 'name' in update_data:
+            # Строковое поле устройств — копия имени для API, переименовываем вместе с категорией
+            await session.execute(
+                update(device_model).where(device_model.category_id == category_id).values(category=update_data['name'])
+            )
         await session.commit()
+        await invalidate_categories()
         return await cls.get_category_by_id(session, category_id)
 
     @classmethod
@@ -56,6 +65,7 @@ class category(Base):
         """Delete a category from the database."""
         result = await session.execute(delete(cls).where(cls.id == category_id))
         await session.commit()
+        await invalidate_categories()
         return result.rowcount > 0
 
     def to_dict(self) -> dict:
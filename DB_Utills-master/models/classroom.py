@@ -1,26 +1,45 @@
 from typing import Optional, Sequence, List
-from sqlalchemy import Column, Integer, String, JSON, ForeignKey, update, delete, select
+from sqlalchemy import Column, Float, Index, Integer, String, JSON, ForeignKey, update, delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from models.db_session import Base
+from models.db_session import Base, create_session
+from services.classroom_index import IndexedClassroom, classroom_index, invalidate_classrooms, polygon_bbox
 
 
 class classroom(Base):
     __tablename__ = 'classrooms'
+    __table_args__ = (
+        # Отбор кандидатов по точке / окну просмотра в SQL: карта, затем прямоугольник
+        Index('ix_classrooms_map_bbox', 'map_id', 'min_x', 'max_x', 'min_y', 'max_y'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(200), index=True)
-    map_id: Mapped[int] = mapped_column(Integer, ForeignKey('places.id'), nullable=False)
+    map_id: Mapped[int] = mapped_column(Integer, ForeignKey('places.id'), nullable=False, index=True)
     polygon_coordinates: Mapped[dict] = mapped_column(JSON, nullable=False)  # Массив точек [{x, y}, ...]
     description: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    # Ограничивающий прямоугольник polygon_coordinates; ведётся в insert_classroom / update_classroom
+    min_x: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    min_y: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    max_x: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    max_y: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    @staticmethod
+    def _with_bbox(data: dict) -> dict:
+        """Copy of insert/update values with min/max x/y derived from polygon_coordinates."""
+        if 'polygon_coordinates' not in data:
+            return data
+        bbox = polygon_bbox(data['polygon_coordinates']) or (None, None, None, None)
+        return {**data, **dict(zip(('min_x', 'min_y', 'max_x', 'max_y'), bbox))}
 
     @classmethod
     async def insert_classroom(cls, session: AsyncSession, classroom_data: dict) -> 'classroom':
         """Insert a new classroom into the database."""
-        new_classroom = cls(**classroom_data)
+        new_classroom = cls(**cls._with_bbox(classroom_data))
         session.add(new_classroom)
         await session.commit()
         await session.refresh(new_classroom)
+        await invalidate_classrooms(new_classroom.map_id)
         return new_classroom
 
     @classmethod
@@ -38,7 +57,7 @@ class classroom(Base):
     @classmethod
     async def get_classrooms_by_map(cls, session: AsyncSession, map_id: int) -> Sequence['classroom']:
         """Get all classrooms for a specific map."""
-        result = await session.execute(select(cls).where(cls.map_id == map_id))
+        result = await session.execute(select(cls).where(cls.map_id == map_id).order_by(cls.id))
         return result.scalars().all()
 
     @classmethod
@@ -48,63 +67,87 @@ class classroom(Base):
         return result.scalar_one_or_none()
 
     @classmethod
-    async def find_classroom_by_point(cls, session: AsyncSession, map_id: int, x: float, y: float) -> Optional['classroom']:
-        """Find classroom that contains the given point (x, y in percentages 0-100)."""
-        classrooms = await cls.get_classrooms_by_map(session, map_id)
-        
-        for classroom in classrooms:
-            if cls._point_in_polygon(x, y, classroom.polygon_coordinates):
-                return classroom
-        
-        return None
+    async def get_classrooms_in_bbox(cls, session: AsyncSession, map_id: int, min_x: float, min_y: float,
+                                     max_x: float, max_y: float) -> Sequence['classroom']:
+        """Classrooms of the map whose bounding box intersects the given rectangle (viewport)."""
+        result = await session.execute(
+            select(cls)
+            .where(cls.map_id == map_id, cls.min_x <= max_x, cls.max_x >= min_x,
+                   cls.min_y <= max_y, cls.max_y >= min_y)
+            .order_by(cls.id)
+        )
+        return result.scalars().all()
 
-    @staticmethod
-    def _point_in_polygon(x: float, y: float, polygon: List[dict]) -> bool:
+    @classmethod
+    async def find_classroom_by_point(cls, session: AsyncSession, map_id: int, x: float, y: float) -> Optional['classroom']:
         """
-        Check if point (x, y) is inside polygon using ray casting algorithm.
-        Polygon is a list of points: [{"x": float, "y": float}, ...]
+        Find classroom that contains the given point (x, y in percentages 0-100).
+        Uses the in-memory index of the map. Until it is built (in the background),
+        candidates are prefiltered by bounding box in SQL and ray-cast exactly.
+        A classroom found through the index is not attached to the session.
         """
-        if not polygon or len(polygon) < 3:
-            return False
-        
-        n = len(polygon)
-        inside = False
-        
-        p1x, p1y = polygon[0].get('x', 0), polygon[0].get('y', 0)
-        
-        for i in range(1, n + 1):
-            p2x, p2y = polygon[i % n].get('x', 0), polygon[i % n].get('y', 0)
-            
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        
-        return inside
+        index = classroom_index.get(map_id)
+        if index is not None:
+            found = index.find(x, y)
+            return cls(**found.data) if found is not None else None
+
+        classroom_index.warm(map_id, lambda: cls._build_map_index(map_id))
+        result = await session.execute(
+            select(cls)
+            .where(cls.map_id == map_id, cls.min_x <= x, cls.max_x >= x, cls.min_y < y, cls.max_y >= y)
+            .order_by(cls.id)
+        )
+        for candidate in result.scalars():
+            if IndexedClassroom(candidate.to_dict()).contains(x, y):
+                return candidate
+        return None
+
+    @classmethod
+    async def _build_map_index(cls, map_id: int) -> None:
+        async with create_session() as session:
+            await cls.get_map_index(session, map_id)
+
+    @classmethod
+    async def get_map_index(cls, session: AsyncSession, map_id: int):
+        """Spatial index of the map's classrooms, built on first use."""
+        index = classroom_index.get(map_id)
+        if index is None:
+            generation = classroom_index.generation(map_id)
+            classrooms = await cls.get_classrooms_by_map(session, map_id)
+            index = classroom_index.put(map_id, [c.to_dict() for c in classrooms], generation)
+        return index
 
     @classmethod
     async def update_classroom(cls, session: AsyncSession, classroom_id: int, update_data: dict) -> Optional['classroom']:
         """Update classroom information."""
-        await session.execute(update(cls).where(cls.id == classroom_id).values(**update_data))
+        from models.device import device as device_model
+        old_map_id = (await session.execute(select(cls.map_id).where(cls.id == classroom_id))).scalar()
+        await session.execute(update(cls).where(cls.id == classroom_id).values(**cls._with_bbox(update_data)))
+        if 'name' in update_data:
+            # device.place_id хранит имя аудитории для API — переименовываем вместе с ней
+            await session.execute(
+                update(device_model).where(device_model.classroom_id == classroom_id).values(place_id=update_data['name'])
+            )
         await session.commit()
-        return await cls.get_classroom_by_id(session, classroom_id)
+        updated = await cls.get_classroom_by_id(session, classroom_id)
+        if updated is not None:
+            await invalidate_classrooms(old_map_id, updated.map_id)
+        return updated
 
     @classmethod
     async def delete_classroom(cls, session: AsyncSession, classroom_id: int) -> bool:
         """Delete a classroom from the database."""
-        result = await session.execute(delete(cls).where(cls.id == classroom_id))
+        result = await session.execute(delete(cls).where(cls.id == classroom_id).returning(cls.map_id))
+        map_ids = result.scalars().all()
         await session.commit()
-        return result.rowcount > 0
+        await invalidate_classrooms(*map_ids)
+        return len(map_ids) > 0
 
     @classmethod
-    async def get_devices_by_classroom(cls, session: AsyncSession, classroom_name: str) -> Sequence:
+    async def get_devices_by_classroom(cls, session: AsyncSession, classroom_id: int) -> Sequence:
         """Get all devices in a classroom."""
         from models.device import device as device_model
-        result = await session.execute(select(device_model).where(device_model.place_id == classroom_name))
+        result = await session.execute(select(device_model).where(device_model.classroom_id == classroom_id))
         devices = result.scalars().all()
         return list(devices)  # Преобразуем в список для избежания проблем с lazy loading
 
@@ -0,0 +1,99 @@
+"""
+Фоновые задания назначения аудиторий (services/classroom_assignment.py).
+Состояние хранится в базе, чтобы его видел любой воркер uvicorn, а не только
+тот, что принял задание. Воркер-владелец регулярно обновляет heartbeat_at своих
+незавершённых заданий; задание без обновлений (воркер убит, упал) помечается failed.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import JSON, Boolean, Column, DateTime, Integer, String, Text, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.db_session import Base
+
+FINISHED_STATUSES = ("done", "failed")
+UNFINISHED_STATUSES = ("queued", "running")
+
+
+class ClassroomAssignmentJob(Base):
+    __tablename__ = "classroom_assignment_jobs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(20), default="queued", nullable=False, index=True)  # queued, running, done, failed
+    map_ids = Column(JSON, nullable=True)  # None — все карты
+    device_ids = Column(JSON, nullable=True)
+    clear_unmatched = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    heartbeat_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    @classmethod
+    async def create(cls, session: AsyncSession, **kwargs) -> "ClassroomAssignmentJob":
+        job = cls(**kwargs)
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+    @classmethod
+    async def get_by_id(cls, session: AsyncSession, job_id: int) -> Optional["ClassroomAssignmentJob"]:
+        result = await session.execute(select(cls).where(cls.id == job_id))
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def set_status(cls, session: AsyncSession, job_ids, status: str, **values) -> None:
+        if status in FINISHED_STATUSES:
+            values.setdefault("finished_at", datetime.now())
+        else:
+            values.setdefault("heartbeat_at", datetime.now())
+        await session.execute(update(cls).where(cls.id.in_(list(job_ids))).values(status=status, **values))
+        await session.commit()
+
+    @classmethod
+    async def touch(cls, session: AsyncSession, job_ids) -> None:
+        """Отметка живого воркера-владельца для его незавершённых заданий."""
+        await session.execute(
+            update(cls).where(cls.id.in_(list(job_ids)), cls.status.in_(UNFINISHED_STATUSES))
+            .values(heartbeat_at=datetime.now())
+        )
+        await session.commit()
+
+    @classmethod
+    async def fail_stale(cls, session: AsyncSession, before: datetime) -> int:
+        """Помечает failed незавершённые задания без отметки воркера с момента before (или совсем без неё)."""
+        now = datetime.now()
+        result = await session.execute(
+            update(cls).where(cls.status.in_(UNFINISHED_STATUSES),
+                              or_(cls.heartbeat_at < before, cls.heartbeat_at.is_(None)))
+            .values(status="failed", finished_at=now, error="Worker stopped without finishing the job")
+        )
+        await session.commit()
+        return result.rowcount
+
+    @classmethod
+    async def trim_finished(cls, session: AsyncSession, keep: int) -> None:
+        """Удаляет завершённые задания, кроме keep последних; queued и running не трогает."""
+        finished = cls.status.in_(FINISHED_STATUSES)
+        # id самого старого из оставляемых; NULL (завершённых не больше keep) — удалять нечего
+        oldest_kept = (
+            select(cls.id).where(finished).order_by(cls.id.desc())
+            .offset(max(keep, 1) - 1).limit(1).scalar_subquery()
+        )
+        await session.execute(delete(cls).where(finished, cls.id < oldest_kept))
+        await session.commit()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "map_ids": self.map_ids,
+            "device_ids": self.device_ids,
+            "clear_unmatched": self.clear_unmatched,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
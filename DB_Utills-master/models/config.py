@@ -8,16 +8,68 @@ load_dotenv()
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     
-    DB_HOST: str
-    DB_PORT: int
-    DB_USER: str
-    DB_PASSWORD: str
-    DB_NAME: str
+    # Адрес базы целиком; задан — DB_* не нужны. sqlite+aiosqlite:///data/equipment.db
+    # для одной машины (филиал) или тестов, иначе PostgreSQL из DB_*
+    DATABASE_URL: str = ""
+    DB_HOST: str = "localhost"
+    DB_PORT: int = 5432
+    DB_USER: str = ""
+    DB_PASSWORD: str = ""
+    DB_NAME: str = ""
     FRONTEND_URL: str = "http://localhost:5173"
+    # Пул соединений: на воркер до DB_POOL_SIZE + DB_MAX_OVERFLOW соединений
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    # statement_timeout на сервере (0 — без ограничения)
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Порог psycopg для prepared statements; отрицательное — отключить (pgbouncer)
+    DB_PREPARE_THRESHOLD: int = 5
+    # Реплики для GET-запросов (через запятую); пусто — всё читается с primary
+    DB_REPLICA_URLS: str = ""
+    # Реплика с большим отставанием не используется, чтение уходит на primary
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_CHECK_SECONDS: float = 5.0
+    # SQLite: ожидание блокировки писателя, synchronous (NORMAL безопасен в WAL), кэш и mmap
+    DB_SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    DB_SQLITE_SYNCHRONOUS: str = "NORMAL"
+    DB_SQLITE_CACHE_SIZE_MB: int = 64
+    DB_SQLITE_MMAP_SIZE_MB: int = 256
     JWT_SECRET_KEY: str = "change-me-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Кэш пользователя по id в get_current_user и LRU проверенных JWT
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_TOKEN_CACHE_SIZE: int = 4096
+    # bcrypt в отдельном пуле потоков: число потоков и ожидание свободного (иначе 503)
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    # После изменения полигонов аудиторий заново назначать аудитории устройствам карты
+    CLASSROOM_AUTO_ASSIGN: bool = True
+    # Отметка живого воркера у заданий назначения аудиторий; без отметки 4 периода — failed
+    CLASSROOM_ASSIGN_HEARTBEAT_SECONDS: float = 30.0
+    # Кластеры устройств на карте (/maps/{mapId}/devices): ячеек по стороне на zoom 0,
+    # максимальный zoom, порог отдельных маркеров в окне и время жизни сводки
+    MAP_CLUSTER_GRID: int = 8
+    MAP_CLUSTER_MAX_ZOOM: int = 6
+    MAP_CLUSTER_MAX_MARKERS: int = 300
+    MAP_CLUSTER_CACHE_TTL_SECONDS: float = 30.0
+    # Листы наклеек с QR-кодами: процессов отрисовки, максимум устройств за запрос (больше — частями по offset),
+    # ожидание свободного процесса (иначе 503) и TTF-шрифт с кириллицей (пусто — встроенный)
+    QR_LABEL_WORKERS: int = 2
+    QR_LABEL_MAX_DEVICES: int = 2500
+    QR_LABEL_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    QR_LABEL_FONT_PATH: str = ""
+    # Тикеты: размер страницы по умолчанию (запрос с cursor без limit) и максимальный,
+    # время жизни счётчиков
+    TICKETS_PAGE_SIZE: int = 100
+    TICKETS_MAX_PAGE_SIZE: int = 500
+    TICKET_COUNTERS_TTL_SECONDS: float = 10.0
+    # Плановая SNMP Discovery
+    DISCOVERY_SCHEDULER_ENABLED: bool = True
+    DISCOVERY_SCHEDULER_POLL_SECONDS: int = 30
     
     @property
     def DATABASE_URL_asycopg(self):
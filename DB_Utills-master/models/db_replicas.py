@@ -0,0 +1,156 @@
+"""
+Реплики PostgreSQL для чтения.
+
+Каждая реплика — свой движок и пул. Фоновая задача раз в check_interval секунд
+измеряет отставание каждой реплики; для чтения выбирается по кругу реплика,
+которая отвечает и отстаёт не больше max_lag секунд. Если таких нет, чтение
+идёт на primary (см. get_read_db в db_session). Запись на реплики не попадает.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+# Отставание в секундах; 0 — реплика проиграла всё, что получила.
+# NULL — приёмник WAL не в режиме streaming (связь с primary потеряна): такая реплика
+# проиграла всё полученное, но новых данных не получает, и её чтение устаревает без
+# предела. Строка pg_stat_wal_receiver есть, пока процесс приёмника жив; status виден
+# роли с pg_read_all_stats, без неё (NULL) достаточно самого процесса.
+_LAG_QUERY = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver"
+    "                  WHERE COALESCE(status, 'streaming') = 'streaming') THEN NULL"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class Replica:
+    """Одна реплика: движок, фабрика сессий и последнее измерение"""
+
+    def __init__(self, url: str, engine_options: dict):
+        parsed = make_url(url)
+        if parsed.drivername == "postgresql":
+            parsed = parsed.set(drivername="postgresql+psycopg_async")
+        self.name = parsed.render_as_string(hide_password=True)
+        self.engine = create_async_engine(parsed, **engine_options)
+        self.factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                lag = (await conn.execute(_LAG_QUERY)).scalar()
+            if lag is None:
+                self.lag, self.error = None, "WAL receiver is not streaming"
+            else:
+                self.lag, self.error = float(lag), None
+        except Exception as exc:
+            self.lag, self.error = None, str(exc)
+        self.checked_at = time.monotonic()
+
+    def mark_failed(self, exc: Exception) -> None:
+        self.lag, self.error = None, str(exc)
+
+    def to_dict(self) -> dict:
+        return {"url": self.name, "lag_s": self.lag, "error": self.error}
+
+
+class ReplicaSet:
+    """Выбор реплики для чтения с учётом отставания"""
+
+    def __init__(self):
+        self._replicas: List[Replica] = []
+        self._cycle = None
+        self.max_lag = 5.0
+        self.check_interval = 5.0
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, urls: List[str], engine_options: dict, max_lag: float = 5.0,
+                  check_interval: float = 5.0) -> None:
+        self._replicas = [Replica(url, engine_options) for url in urls]
+        self._cycle = itertools.cycle(self._replicas) if self._replicas else None
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+    def _usable(self, replica: Replica) -> bool:
+        if replica.lag is None or replica.lag > self.max_lag:
+            return False
+        # Давно не проверялась (монитор завис) — не доверяем старому измерению
+        return time.monotonic() - replica.checked_at <= 3 * self.check_interval
+
+    def pick(self) -> Optional[Replica]:
+        """Следующая пригодная реплика по кругу; None — читать с primary."""
+        for _ in range(len(self._replicas)):
+            replica = next(self._cycle)
+            if self._usable(replica):
+                return replica
+        return None
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self._replicas))
+
+    async def start(self) -> None:
+        if not self._replicas:
+            return
+        await self.check_all()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self._replicas:
+            await replica.engine.dispose()
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Replica lag check failed")
+
+    def stats(self) -> List[dict]:
+        return [{**replica.to_dict(), "usable": self._usable(replica) if replica.checked_at else False}
+                for replica in self._replicas]
+
+
+replicas = ReplicaSet()
+
+
+async def open_replica_session() -> Optional[AsyncSession]:
+    """
+    Сессия на пригодной реплике с уже взятым соединением или None.
+    Реплика, к которой не удалось подключиться, выбывает до следующей проверки.
+    """
+    while True:
+        replica = replicas.pick()
+        if replica is None:
+            return None
+        session = replica.factory()
+        try:
+            await session.connection()
+            return session
+        except Exception as exc:
+            logger.warning("Replica %s unavailable, falling back: %s", replica.name, exc)
+            replica.mark_failed(exc)
+            await session.close()
@@ -1,9 +1,23 @@
+import time
 from functools import wraps
 from os import environ
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from sqlalchemy.orm import declarative_base
+from fastapi import Depends
 import json
 
+from models.db_replicas import open_replica_session, replicas
+
 
 class Base:
     __allow_unmapped__ = True
@@ -17,10 +31,204 @@ Base = declarative_base(cls=Base)
 
 env = environ.get
 
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+CONFIG_DB_JSON = Path(__file__).resolve().parent.parent / "data" / "config_db.json"
+
 __factory = None
+__engine = None
+
+# Счётчики пула соединений (с момента запуска процесса)
+pool_counters = {"connects": 0, "checkouts": 0, "checkins": 0}
+
+# Ожидание свободного соединения в пуле
+pool_wait = {"count": 0, "total_s": 0.0, "max_s": 0.0, "timeouts": 0}
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет, сколько запрос ждал соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            pool_wait["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            pool_wait["count"] += 1
+            pool_wait["total_s"] += waited
+            if waited > pool_wait["max_s"]:
+                pool_wait["max_s"] = waited
+
+
+def _track_pool(engine) -> None:
+    pool = engine.sync_engine.pool
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        pool_counters["connects"] += 1
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_counters["checkouts"] += 1
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        pool_counters["checkins"] += 1
+
+
+def pool_stats() -> dict:
+    """
+    Состояние пула: выдано сейчас, overflow, ожидание соединения
+    и счётчики выдач/возвратов с момента запуска.
+    """
+    stats = dict(pool_counters)
+    stats["checked_out"] = stats["checkouts"] - stats["checkins"]
+    if __engine is not None:
+        pool = __engine.sync_engine.pool
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats["size"] = pool.size()
+            stats["checked_in"] = pool.checkedin()
+            stats["checked_out"] = pool.checkedout()
+            stats["overflow"] = pool.overflow()
+            stats["max_overflow"] = pool._max_overflow
+            stats["timeout_s"] = pool.timeout()
+    count = pool_wait["count"]
+    stats["wait_count"] = count
+    stats["wait_avg_ms"] = round(pool_wait["total_s"] / count * 1000, 3) if count else 0.0
+    stats["wait_max_ms"] = round(pool_wait["max_s"] * 1000, 3)
+    stats["wait_timeouts"] = pool_wait["timeouts"]
+    stats["replicas"] = replicas.stats()
+    return stats
+
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_sqlite_memory(url) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or database.startswith("file::memory:")
+
+
+def _engine_options(settings=None, url=None) -> dict:
+    """Параметры пула и соединения из Settings (без Settings — значения по умолчанию)."""
+    if url is not None and is_sqlite(url):
+        return _sqlite_engine_options(settings, url)
+    pool_size = getattr(settings, "DB_POOL_SIZE", 10)
+    max_overflow = getattr(settings, "DB_MAX_OVERFLOW", 10)
+    pool_timeout = getattr(settings, "DB_POOL_TIMEOUT", 30.0)
+    pool_recycle = getattr(settings, "DB_POOL_RECYCLE", 1800)
+    statement_timeout_ms = getattr(settings, "DB_STATEMENT_TIMEOUT_MS", 30000)
+    prepare_threshold = getattr(settings, "DB_PREPARE_THRESHOLD", 5)
+
+    connect_args = {
+        # Отрицательное значение отключает серверные prepared statements (нужно за pgbouncer)
+        "prepare_threshold": prepare_threshold if prepare_threshold >= 0 else None,
+    }
+    if statement_timeout_ms > 0:
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_pre_ping": True,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "connect_args": connect_args,
+    }
+
+
+def _sqlite_engine_options(settings, url) -> dict:
+    """
+    SQLite (aiosqlite): файл базы — пул из нескольких соединений (в WAL читатели
+    не ждут писателя), база в памяти — одно общее соединение на процесс.
+    """
+    busy_timeout_ms = getattr(settings, "DB_SQLITE_BUSY_TIMEOUT_MS", 5000)
+    connect_args = {"timeout": busy_timeout_ms / 1000}
+    if _is_sqlite_memory(url):
+        return {"poolclass": StaticPool, "connect_args": connect_args}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": getattr(settings, "DB_POOL_SIZE", 10),
+        "max_overflow": getattr(settings, "DB_MAX_OVERFLOW", 10),
+        "pool_timeout": getattr(settings, "DB_POOL_TIMEOUT", 30.0),
+        "connect_args": connect_args,
+    }
+
+
+def _sqlite_pragmas(settings=None, memory: bool = False) -> List[str]:
+    pragmas = [
+        # Внешние ключи в SQLite по умолчанию не проверяются — ведём себя как PostgreSQL
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA busy_timeout={int(getattr(settings, 'DB_SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        # NORMAL в WAL не теряет целостность, только последние транзакции при отключении питания
+        f"PRAGMA synchronous={getattr(settings, 'DB_SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        "PRAGMA temp_store=MEMORY",
+        # Отрицательное значение — размер в КиБ
+        f"PRAGMA cache_size=-{int(getattr(settings, 'DB_SQLITE_CACHE_SIZE_MB', 64)) * 1024}",
+    ]
+    if not memory:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+        pragmas.append(f"PRAGMA mmap_size={int(getattr(settings, 'DB_SQLITE_MMAP_SIZE_MB', 256)) * 1024 * 1024}")
+    return pragmas
+
+
+def _setup_sqlite(engine, settings=None) -> None:
+    pragmas = _sqlite_pragmas(settings, memory=_is_sqlite_memory(engine.url))
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def create_engine_for(url, settings=None):
+    """Асинхронный движок по адресу базы: PostgreSQL (psycopg) или SQLite (aiosqlite)."""
+    engine = create_async_engine(url, **_engine_options(settings, url))
+    if is_sqlite(url):
+        _setup_sqlite(engine, settings)
+    return engine
+
+
+def upsert(session: AsyncSession, model, rows: List[dict], index_elements: List, update_columns: List[str],
+           values: Optional[dict] = None):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE для PostgreSQL и SQLite.
+    update_columns берутся из вставляемой строки (excluded), values — постоянные значения.
+    """
+    dialect = session.get_bind().dialect.name
+    stmt = (sqlite_insert if dialect == "sqlite" else pg_insert)(model).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={**{name: stmt.excluded[name] for name in update_columns}, **(values or {})},
+    )
+
+
+def get_replica_urls(settings=None) -> List[str]:
+    """Адреса реплик для чтения из DB_REPLICA_URLS (через запятую)."""
+    raw = getattr(settings, "DB_REPLICA_URLS", None) or env("DB_REPLICA_URLS", "")
+    return [url.strip() for url in raw.split(",") if url.strip()]
 
 
 def get_database_url(alembic: bool = False) -> str:
+    """
+    Адрес базы: DATABASE_URL (например sqlite+aiosqlite:///data/equipment.db
+    для одной машины), иначе PostgreSQL из DB_* или data/config_db.json.
+    alembic=True — тот же адрес с синхронным драйвером.
+    """
+    database_url = env('DATABASE_URL')
+    if database_url:
+        url = make_url(database_url)
+        if url.get_backend_name() == "sqlite":
+            url = url.set(drivername="sqlite" if alembic else "sqlite+aiosqlite")
+        else:
+            url = url.set(drivername="postgresql+psycopg" if alembic else "postgresql+psycopg_async")
+        return url.render_as_string(hide_password=False)
+
     # psycopg_async стабильнее asyncpg на Windows (обрывы соединения / WinError 64)
     schema = "postgresql+psycopg_async"
     
@@ -33,9 +241,8 @@ def get_database_url(alembic: bool = False) -> str:
     
     # Если переменные окружения не заданы, используем JSON файл
     if not all([db_user, db_password, db_host, db_port, db_name]):
-        file = open(".\\data\\config_db.json")
-        data = json.load(file)
-        file.close()
+        with open(CONFIG_DB_JSON, encoding="utf-8") as file:
+            data = json.load(file)
         
         db_user = data['db_login']
         db_password = data['db_password']
@@ -44,28 +251,60 @@ def get_database_url(alembic: bool = False) -> str:
         db_name = data['db_name']
 
     if alembic:
-        schema = "postgresql"
+        schema = "postgresql+psycopg"
     return (f"{schema}://{db_user}:{db_password}@"
             f"{db_host}:{db_port}/{db_name}")
 
 
-async def global_init():
-    global __factory
+def alembic_config() -> Config:
+    return Config(str(ALEMBIC_INI))
+
+
+def _current_revision(connection) -> str:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+async def check_schema_version(engine) -> None:
+    """Проверяет, что база на последней миграции; схему при старте не меняет."""
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_current_revision)
+    if current != head:
+        raise RuntimeError(
+            f"Версия схемы базы {current or 'отсутствует'}, ожидается {head}: "
+            f"выполните `alembic upgrade head` (или python init_db.py)"
+        )
+
+
+async def global_init(settings=None):
+    global __factory, __engine
 
     if __factory:
         return
     conn_str = get_database_url()
 
-    print(conn_str)
-    engine = create_async_engine(conn_str, pool_pre_ping=True)
+    print(make_url(conn_str).render_as_string(hide_password=True))
+    engine = create_engine_for(conn_str, settings)
+    _track_pool(engine)
+    __engine = engine
 
-    async with engine.begin() as conn:
-        # await conn.run_sync(SqlAlchemyBase.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+    # Схему ведут миграции (migrations/), здесь только проверка версии
+    await check_schema_version(engine)
 
     __factory = async_sessionmaker(
         engine, expire_on_commit=False
     )
+
+    replica_urls = get_replica_urls(settings)
+    if replica_urls:
+        # Обычный пул: счётчики ожидания TimedQueuePool относятся только к primary
+        replica_options = {**_engine_options(settings), "poolclass": AsyncAdaptedQueuePool}
+        replicas.configure(
+            replica_urls,
+            replica_options,
+            max_lag=getattr(settings, "DB_REPLICA_MAX_LAG_SECONDS", 5.0),
+            check_interval=getattr(settings, "DB_REPLICA_CHECK_SECONDS", 5.0),
+        )
     from . import __all_models  # noqa
 
 
@@ -74,6 +313,31 @@ def create_session() -> AsyncSession:
     return __factory()  # noqa
 
 
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия на время запроса (FastAPI dependency). Одна и та же сессия достаётся
+    эндпоинту и get_current_user; закрывается всегда, в том числе при ошибке.
+    """
+    async with create_session() as session:
+        yield session
+
+
+async def get_read_db(db: AsyncSession = Depends(get_db)) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия только для чтения (FastAPI dependency): на реплике, если есть реплика
+    с допустимым отставанием, иначе та же сессия primary, что у get_db.
+    Писать через неё нельзя — данные могут отставать на DB_REPLICA_MAX_LAG_SECONDS.
+    """
+    session = await open_replica_session()
+    if session is None:
+        yield db
+        return
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 def session_db(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
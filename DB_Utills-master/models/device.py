@@ -1,27 +1,43 @@
 import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, Sequence
-from sqlalchemy import Integer, String, Column, Float, ForeignKey, update, select, delete, Date
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import Integer, String, Column, Float, ForeignKey, Index, update, select, delete, insert, Date
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from models.db_session import Base
+from models.device_snmp_config import DeviceSNMPConfig
+from models.category import category as category_model
+from models.manufacturer import manufacturer as manufacturer_model
+from models.classroom import classroom as classroom_model
+from services.serialization import device_serializer
+
+# Ограничение на число параметров в одном IN (...)
+_CHUNK_SIZE = 5000
 
 
 class device(Base):
     __tablename__ = 'device'
+    __table_args__ = (
+        # Окно просмотра и кластеры карты (/maps/{mapId}/devices); заменяет индекс по одному mapId
+        Index('ix_device_map_xy', 'mapId', 'xCord', 'yCord'),
+    )
 
     id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
-    category = Column(String)
-    place_id = Column(String)  # Название комнаты/помещения
+    name = Column(String, nullable=False, index=True)
+    category = Column(String, index=True)
+    place_id = Column(String, index=True)  # Название комнаты/помещения
     version = Column(String)
     releaseDate = Column(Date)  # дата закупки
     softwareStartDate = Column(Date)  # дата устаревания
     softwareEndDate = Column(Date, nullable=True)  # дата снятия
     updateDate = Column(Date, nullable=True)  # дата обновления по
-    manufacturer = Column(String)  # Оставляем для обратной совместимости
+    manufacturer = Column(String, index=True)  # Оставляем для обратной совместимости
     xCord = Column(Float)
     yCord = Column(Float)
     mapId = Column(Integer)
+    # Ссылки по id; строковые category / manufacturer / place_id остаются для API и синхронизируются
+    category_id = Column(Integer, ForeignKey('category.id', name='fk_device_category_id'), index=True)
+    manufacturer_id = Column(Integer, ForeignKey('manufacturer.id', name='fk_device_manufacturer_id'), index=True)
+    classroom_id = Column(Integer, ForeignKey('classrooms.id', name='fk_device_classroom_id'), index=True)
 
     # answers: Mapped[list[Answer]] = relationship(lazy="selectin")
     
@@ -35,6 +51,193 @@ class device(Base):
         await session.commit()
         return new_device
 
+    @classmethod
+    async def get_existing_names(cls, session: AsyncSession, names: Iterable[str]) -> Set[str]:
+        """
+        Names from the given list that are already taken (lookup by the name index).
+        :param session: database session
+        :param names: candidate device names
+        :return: set of existing names
+        """
+        names = list(names)
+        existing: Set[str] = set()
+        for i in range(0, len(names), _CHUNK_SIZE):
+            _ = await session.execute(select(cls.name).where(cls.name.in_(names[i:i + _CHUNK_SIZE])))
+            existing.update(_.scalars().all())
+        return existing
+
+    @classmethod
+    async def bulk_insert_with_snmp(cls, session: AsyncSession, devices_data: List[dict],
+                                    snmp_configs: List[dict]) -> List[int]:
+        """
+        Insert devices and their SNMP configs in one transaction:
+        a multi-row INSERT ... RETURNING for devices, then one bulk insert of configs.
+        Either everything is committed or nothing is.
+        :param session: database session
+        :param devices_data: device rows
+        :param snmp_configs: SNMP config rows, snmp_configs[i] belongs to devices_data[i]
+        :return: IDs of the new devices in the order of devices_data
+        """
+        if not devices_data:
+            return []
+        try:
+            _ = await session.execute(
+                insert(cls).returning(cls.id, sort_by_parameter_order=True),
+                devices_data,
+            )
+            device_ids = list(_.scalars().all())
+            await session.execute(
+                insert(DeviceSNMPConfig),
+                [{**config, 'device_id': device_id} for config, device_id in zip(snmp_configs, device_ids)],
+            )
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        return device_ids
+
+    @classmethod
+    async def resolve_references(cls, session: AsyncSession, rows: List[dict],
+                                 current: Optional['device'] = None) -> None:
+        """
+        Sync integer references with the legacy name fields of device rows, in place.
+        An id (category_id, manufacturer_id, classroom_id) wins and sets the name;
+        otherwise a name (category, manufacturer, place_id) sets the id, or None if nothing matches.
+        Manufacturer and classroom names are not unique: the one in the row's category / map is preferred.
+        :param session: database session
+        :param rows: device rows (insert values or update values)
+        :param current: the device being updated, for fields the row does not change
+        :raises ValueError: if a row references a missing id
+        """
+        async def load(model, columns, ids: Set[int], names: Set[str]) -> Dict[int, tuple]:
+            # Только строки, на которые ссылаются rows: по первичному ключу и по имени
+            found = {}
+            for column, keys in ((model.id, sorted(ids)), (model.name, sorted(names))):
+                for i in range(0, len(keys), _CHUNK_SIZE):
+                    _ = await session.execute(select(model.id, *columns).where(column.in_(keys[i:i + _CHUNK_SIZE])))
+                    found.update((r_id, tuple(values)) for r_id, *values in _.all())
+            return found
+
+        def wanted(id_key: str, name_key: str) -> Tuple[Set[int], Set[str]]:
+            ids = {row[id_key] for row in rows if row.get(id_key) is not None}
+            names = {row[name_key] for row in rows
+                     if row.get(id_key) is None and row.get(name_key) is not None}
+            return ids, names
+
+        categories: Dict[int, str] = {
+            c_id: name for c_id, (name,) in (await load(
+                category_model, (category_model.name,), *wanted('category_id', 'category'))).items()
+        }
+        manufacturers: Dict[int, Tuple[str, int]] = await load(
+            manufacturer_model, (manufacturer_model.name, manufacturer_model.category_id),
+            *wanted('manufacturer_id', 'manufacturer'))
+        classrooms: Dict[int, Tuple[str, int]] = await load(
+            classroom_model, (classroom_model.name, classroom_model.map_id), *wanted('classroom_id', 'place_id'))
+
+        category_ids = {name: c_id for c_id, name in categories.items()}
+
+        def by_name(candidates: Dict[int, Tuple[str, int]]) -> Dict[str, List[Tuple[int, int]]]:
+            grouped: Dict[str, List[Tuple[int, int]]] = {}
+            for c_id in sorted(candidates):
+                name, scope = candidates[c_id]
+                grouped.setdefault(name, []).append((c_id, scope))
+            return grouped
+
+        manufacturers_by_name, classrooms_by_name = by_name(manufacturers), by_name(classrooms)
+
+        def pick(candidates: Dict[str, List[Tuple[int, int]]], name: str, scope: Optional[int]) -> Optional[int]:
+            matches = candidates.get(name, [])
+            for c_id, c_scope in matches:
+                if c_scope == scope:
+                    return c_id
+            return matches[0][0] if matches else None
+
+        for row in rows:
+            if row.get('category_id') is not None:
+                if row['category_id'] not in categories:
+                    raise ValueError(f"Category {row['category_id']} not found")
+                row['category'] = categories[row['category_id']]
+            elif 'category' in row:
+                row['category_id'] = category_ids.get(row['category'])
+            elif 'category_id' in row:
+                row['category'] = None
+            category_id = row.get('category_id', current.category_id if current else None)
+
+            if row.get('manufacturer_id') is not None:
+                if row['manufacturer_id'] not in manufacturers:
+                    raise ValueError(f"Manufacturer {row['manufacturer_id']} not found")
+                row['manufacturer'] = manufacturers[row['manufacturer_id']][0]
+            elif 'manufacturer' in row:
+                row['manufacturer_id'] = pick(manufacturers_by_name, row['manufacturer'], category_id)
+            elif 'manufacturer_id' in row:
+                row['manufacturer'] = None
+
+            if row.get('classroom_id') is not None:
+                if row['classroom_id'] not in classrooms:
+                    raise ValueError(f"Classroom {row['classroom_id']} not found")
+                row['place_id'] = classrooms[row['classroom_id']][0]
+            elif 'place_id' in row:
+                map_id = row.get('mapId', current.mapId if current else None)
+                row['classroom_id'] = pick(classrooms_by_name, row['place_id'], map_id)
+            elif 'classroom_id' in row:
+                row['place_id'] = None
+
+    @classmethod
+    async def assign_classrooms(cls, session: AsyncSession, map_ids: Optional[Iterable[int]] = None,
+                                device_ids: Optional[Iterable[int]] = None,
+                                clear_unmatched: bool = False) -> dict:
+        """
+        Set classroom_id / place_id of devices from their coordinates: the classroom whose
+        polygon contains (xCord, yCord) on the device's map. All devices of a map are
+        located at once through the map's spatial index.
+        :param session: database session
+        :param map_ids: only devices on these maps (default: all maps)
+        :param device_ids: only these devices
+        :param clear_unmatched: unlink devices that are outside every classroom (classroom_id and place_id)
+        :return: counters: checked, assigned, unchanged, unmatched, cleared, maps
+        """
+        query = select(cls.id, cls.mapId, cls.xCord, cls.yCord, cls.classroom_id, cls.place_id).where(
+            cls.mapId.is_not(None), cls.xCord.is_not(None), cls.yCord.is_not(None),
+        )
+        if map_ids is not None:
+            query = query.where(cls.mapId.in_(list(map_ids)))
+        # Длинный список id — частями, в пределах числа параметров запроса
+        queries = [query]
+        if device_ids is not None:
+            ids = sorted(set(device_ids))
+            queries = [query.where(cls.id.in_(ids[i:i + _CHUNK_SIZE])) for i in range(0, len(ids), _CHUNK_SIZE)]
+        by_map: Dict[int, List[tuple]] = {}
+        for part in queries:
+            for row in (await session.execute(part)).tuples():
+                by_map.setdefault(row[1], []).append(row)
+
+        stats = {'checked': 0, 'assigned': 0, 'unchanged': 0, 'unmatched': 0, 'cleared': 0, 'maps': len(by_map)}
+        changes = []
+        for map_id, rows in by_map.items():
+            index = await classroom_model.get_map_index(session, map_id)
+            located = index.locate([row[2] for row in rows], [row[3] for row in rows])
+            stats['checked'] += len(rows)
+            for (device_id, _, _, _, classroom_id, place_id), found in zip(rows, located):
+                if found is None:
+                    stats['unmatched'] += 1
+                    if clear_unmatched and classroom_id is not None:
+                        changes.append({'id': device_id, 'classroom_id': None, 'place_id': None})
+                        stats['cleared'] += 1
+                elif found.id == classroom_id and found.data['name'] == place_id:
+                    stats['unchanged'] += 1
+                else:
+                    changes.append({'id': device_id, 'classroom_id': found.id, 'place_id': found.data['name']})
+                    stats['assigned'] += 1
+        # Обновление по первичному ключу пакетом (executemany)
+        for i in range(0, len(changes), _CHUNK_SIZE):
+            await session.execute(update(cls), changes[i:i + _CHUNK_SIZE])
+        await session.commit()
+        if changes:
+            # Маркеры карты показывают аудиторию устройства
+            from services.map_clusters import invalidate_map_devices
+            await invalidate_map_devices(*by_map)
+        return stats
+
     @classmethod
     async def get_device_by_id(cls, session: AsyncSession, device_id: int) -> Optional['device']:
         _ = await session.execute(select(cls).where(cls.id == device_id))
@@ -86,6 +289,28 @@ class device(Base):
         _ = await session.execute(select(cls).where(cls.category == category))
         return _.scalars().all()
 
+    @classmethod
+    async def get_devices_by_category_id(cls, session: AsyncSession, category_id: int) -> Sequence['device']:
+        """
+        Get devices by category ID.
+        :param session: database session
+        :param category_id: category ID to filter devices by
+        :return: Sequence of devices in the specified category
+        """
+        _ = await session.execute(select(cls).where(cls.category_id == category_id))
+        return _.scalars().all()
+
+    @classmethod
+    async def get_devices_by_manufacturer_id(cls, session: AsyncSession, manufacturer_id: int) -> Sequence['device']:
+        """
+        Get devices by manufacturer ID.
+        :param session: database session
+        :param manufacturer_id: manufacturer ID to filter devices by
+        :return: Sequence of devices from the specified manufacturer
+        """
+        _ = await session.execute(select(cls).where(cls.manufacturer_id == manufacturer_id))
+        return _.scalars().all()
+
     @classmethod
     async def get_devices_by_manufacturer(cls, session: AsyncSession, manufacturer: str) -> Sequence['device']:
         """
@@ -99,22 +324,9 @@ class device(Base):
 
     def to_dict(self):
         """Convert device instance to dictionary"""
-        result = {
-            'id': self.id,
-            'name': self.name,
-            'category': self.category,
-            'place_id': self.place_id,
-            'version': self.version,
-            'releaseDate': self.releaseDate.isoformat() if self.releaseDate else None,
-            'softwareStartDate': self.softwareStartDate.isoformat() if self.softwareStartDate else None,
-            'softwareEndDate': self.softwareEndDate.isoformat() if self.softwareEndDate else None,
-            'updateDate': self.updateDate.isoformat() if self.updateDate else None,
-            'manufacturer': self.manufacturer,
-            'xCord': self.xCord,
-            'yCord': self.yCord,
-            'mapId': self.mapId,
-            'place': self.place_id,  # Добавляем поле place для совместимости с фронтендом
-        }
+        # Даты строками: результат уходит и в detail исключений, минуя кодировщик ответа
+        result = device_serializer.plain(self)
+        result['place'] = self.place_id  # Добавляем поле place для совместимости с фронтендом
         
         # Добавляем SNMP конфигурацию если она есть
         if hasattr(self, 'snmp_config') and self.snmp_config:
@@ -2,7 +2,7 @@
 Модель для SNMP конфигурации устройств
 Отдельная таблица для хранения SNMP настроек
 """
-from sqlalchemy import Integer, String, Column, Float, ForeignKey, Boolean, DateTime
+from sqlalchemy import Integer, String, Column, Float, ForeignKey, Boolean, DateTime, Index, text
 from sqlalchemy.orm import relationship
 from models.db_session import Base
 from datetime import datetime
@@ -10,13 +10,18 @@ from datetime import datetime
 class DeviceSNMPConfig(Base):
     """Конфигурация SNMP для устройства"""
     __tablename__ = 'device_snmp_config'
+    __table_args__ = (
+        # Частичный индекс: мониторинг выбирает только включённые конфиги
+        Index('ix_device_snmp_config_enabled', 'enabled',
+              postgresql_where=text('enabled'), sqlite_where=text('enabled')),
+    )
     
     id = Column(Integer, primary_key=True)
     device_id = Column(Integer, ForeignKey('device.id'), unique=True, nullable=False)
     
     # Основные SNMP настройки
     enabled = Column(Boolean, default=False, nullable=False)
-    ip_address = Column(String(45), nullable=False)  # IPv4/IPv6
+    ip_address = Column(String(45), nullable=False, index=True)  # IPv4/IPv6
     port = Column(Integer, default=161, nullable=False)
     community = Column(String(255), default='public')
     version = Column(String(10), default='2c', nullable=False)  # 1, 2c, 3
@@ -100,6 +105,18 @@ class DeviceSNMPConfig(Base):
             await session.commit()
             return new_config
     
+    @classmethod
+    async def get_device_ids_by_ips(cls, session, ips):
+        """{ip: device_id} для адресов, уже заведённых в инвентарь (индекс по ip_address)"""
+        from sqlalchemy import select
+        found = {}
+        for i in range(0, len(ips), 5000):
+            result = await session.execute(
+                select(cls.ip_address, cls.device_id).where(cls.ip_address.in_(ips[i:i + 5000]))
+            )
+            found.update({ip: device_id for ip, device_id in result.all()})
+        return found
+
     @classmethod
     async def get_all_enabled(cls, session):
         """Получает все включенные SNMP конфигурации"""
@@ -0,0 +1,158 @@
+"""
+Результаты сканирования подсетей (SNMP Discovery).
+Хранятся по подсети, чтобы повторный проход мог опросить известные хосты первыми
+и вернуть разницу с предыдущим сканированием и с инвентарём.
+"""
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text, UniqueConstraint, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.db_session import Base, upsert
+from models.device_snmp_config import DeviceSNMPConfig
+
+# Ограничение на число параметров в одном IN (...) / VALUES
+_CHUNK_SIZE = 5000
+
+# Поля, по которым считается отпечаток хоста
+_FINGERPRINT_FIELDS = ('mac', 'name', 'description')
+
+
+def host_fingerprint(host: dict) -> str:
+    """Отпечаток хоста по MAC, sysName и sysDescr — меняется при замене устройства."""
+    raw = '\x1f'.join((host.get(k) or '').strip().lower() for k in _FINGERPRINT_FIELDS)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _chunks(items: List, size: int = _CHUNK_SIZE) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class DiscoveredHost(Base):
+    """Хост, найденный сканированием подсети"""
+    __tablename__ = 'discovered_hosts'
+    __table_args__ = (
+        UniqueConstraint('subnet', 'ip_address', name='uq_discovered_hosts_subnet_ip'),
+        Index('ix_discovered_hosts_subnet_alive', 'subnet', 'alive'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    subnet = Column(String(43), nullable=False)
+    ip_address = Column(String(45), nullable=False)
+    mac = Column(String(17))
+    sys_name = Column(String(255))
+    sys_descr = Column(Text)
+    fingerprint = Column(String(40), nullable=False)
+    has_snmp = Column(Boolean, default=False, nullable=False)
+    alive = Column(Boolean, default=True, nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'subnet': self.subnet,
+            'ip_address': self.ip_address,
+            'mac': self.mac,
+            'sys_name': self.sys_name,
+            'sys_descr': self.sys_descr,
+            'has_snmp': self.has_snmp,
+            'alive': self.alive,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+        }
+
+    @classmethod
+    async def get_by_subnet(cls, session: AsyncSession, subnet: str) -> Sequence['DiscoveredHost']:
+        """Все сохранённые хосты подсети."""
+        result = await session.execute(select(cls).where(cls.subnet == subnet))
+        return result.scalars().all()
+
+    @classmethod
+    async def get_known_alive_ips(cls, session: AsyncSession, subnet: str) -> List[str]:
+        """IP хостов, живых на прошлом сканировании — их опрашиваем первыми."""
+        result = await session.execute(
+            select(cls.ip_address).where(cls.subnet == subnet, cls.alive == True)
+        )
+        return list(result.scalars().all())
+
+    @classmethod
+    async def get_imported_ips(cls, session: AsyncSession, ips: List[str]) -> Dict[str, int]:
+        """{ip: device_id} для адресов, уже заведённых в инвентарь (индекс по ip_address)."""
+        return await DeviceSNMPConfig.get_device_ids_by_ips(session, ips)
+
+    @classmethod
+    async def apply_scan(
+        cls,
+        session: AsyncSession,
+        subnet: str,
+        discovered: List[dict],
+        scanned_at: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Сохраняет результат сканирования подсети и возвращает разницу:
+        new, disappeared, changed (по отпечатку) и already_imported.
+        Каждому хосту в discovered проставляются scan_status и imported_device_id.
+        """
+        scanned_at = scanned_at or datetime.now()
+        previous = {h.ip_address: h for h in await cls.get_by_subnet(session, subnet)}
+        found_ips = [d['ip'] for d in discovered]
+        imported = await cls.get_imported_ips(session, found_ips)
+
+        diff = {'new': [], 'disappeared': [], 'changed': [], 'already_imported': []}
+        rows = []
+        for host in discovered:
+            ip = host['ip']
+            fingerprint = host_fingerprint(host)
+            known = previous.get(ip)
+            if known is None or not known.alive:
+                host['scan_status'] = 'new'
+                diff['new'].append(ip)
+            elif known.fingerprint != fingerprint:
+                host['scan_status'] = 'changed'
+                diff['changed'].append({
+                    'ip': ip,
+                    'before': {'mac': known.mac, 'name': known.sys_name, 'description': known.sys_descr},
+                    'after': {k: host.get(k) for k in _FINGERPRINT_FIELDS},
+                })
+            else:
+                host['scan_status'] = 'unchanged'
+            host['imported_device_id'] = imported.get(ip)
+            if ip in imported:
+                diff['already_imported'].append({'ip': ip, 'device_id': imported[ip]})
+            rows.append({
+                'subnet': subnet,
+                'ip_address': ip,
+                'mac': host.get('mac') or None,
+                'sys_name': host.get('name') or None,
+                'sys_descr': host.get('description') or None,
+                'fingerprint': fingerprint,
+                'has_snmp': bool(host.get('has_snmp')),
+                'alive': True,
+                'first_seen': known.first_seen if known is not None else scanned_at,
+                'last_seen': scanned_at,
+            })
+
+        found = set(found_ips)
+        diff['disappeared'] = [
+            ip for ip, known in previous.items() if known.alive and ip not in found
+        ]
+
+        for chunk in _chunks(rows, _CHUNK_SIZE // 10):
+            await session.execute(upsert(
+                session, cls, chunk,
+                index_elements=[cls.subnet, cls.ip_address],
+                update_columns=['mac', 'sys_name', 'sys_descr', 'fingerprint', 'has_snmp', 'last_seen'],
+                values={'alive': True},
+            ))
+        for chunk in _chunks(diff['disappeared']):
+            await session.execute(
+                update(cls)
+                .where(cls.subnet == subnet, cls.ip_address.in_(chunk))
+                .values(alive=False)
+            )
+        await session.commit()
+        return diff
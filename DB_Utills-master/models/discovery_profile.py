@@ -0,0 +1,195 @@
+"""
+Профили плановой SNMP Discovery и история их запусков.
+Планировщик (services/discovery_scheduler.py) запускает профили по расписанию,
+результат каждого прохода по подсети сохраняется в DiscoveryRun вместе с diff.
+"""
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Time,
+    delete, func, select, update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.db_session import Base
+
+
+class DiscoveryProfile(Base):
+    """Расписание сканирования набора подсетей"""
+    __tablename__ = "discovery_profiles"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    subnets = Column(JSON, nullable=False)  # ["10.0.0.0/24", ...]
+    communities = Column(JSON, nullable=False)
+    mode = Column(String(10), default="icmp", nullable=False)  # icmp, sweep, both
+    port = Column(Integer, default=161, nullable=False)
+    interval_minutes = Column(Integer, default=1440, nullable=False)
+    max_packets_per_second = Column(Integer, default=200, nullable=False)
+    # Окно обслуживания (локальное время сервера); может переходить через полночь
+    window_start = Column(Time, nullable=True)
+    window_end = Column(Time, nullable=True)
+    enabled = Column(Boolean, default=True, nullable=False)
+    last_run_at = Column(DateTime, nullable=True)
+    next_run_at = Column(DateTime, nullable=True, index=True)
+    created_at = Column(DateTime, default=func.now())
+
+    @classmethod
+    async def get_all(cls, session: AsyncSession) -> Sequence["DiscoveryProfile"]:
+        result = await session.execute(select(cls).order_by(cls.id))
+        return result.scalars().all()
+
+    @classmethod
+    async def get_by_id(cls, session: AsyncSession, profile_id: int) -> Optional["DiscoveryProfile"]:
+        result = await session.execute(select(cls).where(cls.id == profile_id))
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def get_due(cls, session: AsyncSession, now: datetime) -> Sequence["DiscoveryProfile"]:
+        """Включённые профили, у которых подошло время запуска."""
+        result = await session.execute(
+            select(cls)
+            .where(cls.enabled == True, cls.next_run_at <= now)
+            .order_by(cls.next_run_at)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def claim(cls, session: AsyncSession, profile_id: int, expected_next_run: datetime,
+                    next_run_at: datetime) -> bool:
+        """
+        Переносит next_run_at, только если его никто не изменил раньше.
+        Так профиль запускает один процесс, даже если планировщиков несколько.
+        """
+        result = await session.execute(
+            update(cls)
+            .where(cls.id == profile_id, cls.next_run_at == expected_next_run)
+            .values(next_run_at=next_run_at, last_run_at=datetime.now())
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+    @classmethod
+    async def set_next_run(cls, session: AsyncSession, profile_id: int, next_run_at: datetime) -> None:
+        await session.execute(update(cls).where(cls.id == profile_id).values(next_run_at=next_run_at))
+        await session.commit()
+
+    @classmethod
+    async def create(cls, session: AsyncSession, **kwargs) -> "DiscoveryProfile":
+        profile = cls(**kwargs)
+        session.add(profile)
+        await session.commit()
+        await session.refresh(profile)
+        return profile
+
+    @classmethod
+    async def update_profile(cls, session: AsyncSession, profile_id: int, data: dict) -> Optional["DiscoveryProfile"]:
+        await session.execute(update(cls).where(cls.id == profile_id).values(**data))
+        await session.commit()
+        return await cls.get_by_id(session, profile_id)
+
+    @classmethod
+    async def delete_profile(cls, session: AsyncSession, profile_id: int) -> bool:
+        await session.execute(delete(DiscoveryRun).where(DiscoveryRun.profile_id == profile_id))
+        result = await session.execute(delete(cls).where(cls.id == profile_id))
+        await session.commit()
+        return result.rowcount > 0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "subnets": self.subnets,
+            "communities": self.communities,
+            "mode": self.mode,
+            "port": self.port,
+            "interval_minutes": self.interval_minutes,
+            "max_packets_per_second": self.max_packets_per_second,
+            "window_start": self.window_start.strftime("%H:%M") if self.window_start else None,
+            "window_end": self.window_end.strftime("%H:%M") if self.window_end else None,
+            "enabled": self.enabled,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class DiscoveryRun(Base):
+    """Один проход профиля по одной подсети и его разница с предыдущим"""
+    __tablename__ = "discovery_runs"
+    __table_args__ = (
+        Index("ix_discovery_runs_profile_started", "profile_id", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey("discovery_profiles.id"), nullable=False)
+    subnet = Column(String(43), nullable=False)
+    status = Column(String(20), default="running", nullable=False)  # running, success, failed, cancelled
+    packets_per_second = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    total_found = Column(Integer, default=0, nullable=False)
+    diff = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    @classmethod
+    async def get_by_id(cls, session: AsyncSession, run_id: int) -> Optional["DiscoveryRun"]:
+        result = await session.execute(select(cls).where(cls.id == run_id))
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def get_recent(cls, session: AsyncSession, profile_id: Optional[int] = None,
+                         limit: int = 50) -> Sequence["DiscoveryRun"]:
+        query = select(cls).order_by(cls.started_at.desc()).limit(limit)
+        if profile_id is not None:
+            query = query.where(cls.profile_id == profile_id)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def start(cls, session: AsyncSession, profile_id: int, subnet: str,
+                    packets_per_second: int) -> "DiscoveryRun":
+        run = cls(
+            profile_id=profile_id,
+            subnet=subnet,
+            status="running",
+            packets_per_second=packets_per_second,
+            started_at=datetime.now(),
+        )
+        session.add(run)
+        await session.commit()
+        await session.refresh(run)
+        return run
+
+    @classmethod
+    async def finish(cls, session: AsyncSession, run_id: int, status: str, total_found: int = 0,
+                     diff: Optional[dict] = None, error: Optional[str] = None) -> None:
+        await session.execute(
+            update(cls)
+            .where(cls.id == run_id)
+            .values(status=status, finished_at=datetime.now(), total_found=total_found,
+                    diff=diff, error=error)
+        )
+        await session.commit()
+
+    def diff_counts(self) -> dict:
+        diff = self.diff or {}
+        return {key: len(diff.get(key) or []) for key in ("new", "disappeared", "changed", "already_imported")}
+
+    def to_dict(self, with_diff: bool = False) -> dict:
+        result = {
+            "id": self.id,
+            "profile_id": self.profile_id,
+            "subnet": self.subnet,
+            "status": self.status,
+            "packets_per_second": self.packets_per_second,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "total_found": self.total_found,
+            "changes": self.diff_counts(),
+            "error": self.error,
+        }
+        if with_diff:
+            result["diff"] = self.diff
+        return result
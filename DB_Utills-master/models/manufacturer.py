@@ -56,7 +56,14 @@ class manufacturer(Base):
     @classmethod
     async def update_manufacturer(cls, session: AsyncSession, manufacturer_id: int, update_data: dict) -> Optional['manufacturer']:
         """Update manufacturer information."""
+        from models.device import device as device_model
         await session.execute(update(cls).where(cls.id == manufacturer_id).values(**update_data))
+        if 'name' in update_data:
+            await session.execute(
+                update(device_model)
+                .where(device_model.manufacturer_id == manufacturer_id)
+                .values(manufacturer=update_data['name'])
+            )
         await session.commit()
         return await cls.get_manufacturer_by_id(session, manufacturer_id)
 
@@ -70,6 +77,13 @@ class manufacturer(Base):
     @classmethod
     async def delete_manufacturers_by_category(cls, session: AsyncSession, category_id: int) -> int:
         """Delete all manufacturers by category."""
+        from models.device import device as device_model
+        # Устройства другой категории могут ссылаться на этих производителей — отвязываем по id
+        await session.execute(
+            update(device_model)
+            .where(device_model.manufacturer_id.in_(select(cls.id).where(cls.category_id == category_id)))
+            .values(manufacturer_id=None)
+        )
         result = await session.execute(delete(cls).where(cls.category_id == category_id))
         await session.commit()
         return result.rowcount
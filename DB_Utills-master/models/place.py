@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.ext.declarative import declarative_base
 from models.db_session import Base
+from services.table_versions import invalidate_places
 
 
 class place(Base):
@@ -36,6 +37,7 @@ class place(Base):
         """
         await session.execute(update(cls).where(cls.id == place_id).values(**update_data))
         await session.commit()
+        await invalidate_places(place_id)
         return await cls.get_place_by_id(session, place_id)
 
     @classmethod
@@ -48,6 +50,7 @@ class place(Base):
         """
         result = await session.execute(delete(cls).where(cls.id == place_id))
         await session.commit()
+        await invalidate_places(place_id)
         return result.rowcount > 0
 
 
@@ -0,0 +1,303 @@
+"""
+Быстрый путь чтения для горячих эндпоинтов (/search, /equipment/{id}, /tickets,
+/maps/{mapId}/devices).
+
+Core select с явным списком колонок: без ORM-объектов и identity map, связанные
+таблицы подтягиваются в том же запросе (outer join), а не отдельным запросом
+на каждую строку. Строки раскладываются в DTO со __slots__, которые сразу
+отдают словарь ответа в прежнем формате эндпоинтов (поля — через сериализаторы
+services/serialization.py; даты остаются объектами и кодируются в ответе).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.category import category
+from models.device import device
+from models.device_snmp_config import DeviceSNMPConfig
+from models.ticket import Ticket
+from models.web_user import WebUser
+from services.serialization import DEVICE_FIELDS, TICKET_FIELDS, device_serializer, ticket_serializer
+
+_DEVICE_COLUMNS = (
+    device.id, device.name, device.category, device.category_id, device.xCord, device.yCord,
+    device.place_id, device.classroom_id, device.version, device.releaseDate,
+    device.softwareStartDate, device.softwareEndDate, device.updateDate,
+    device.manufacturer, device.manufacturer_id, device.mapId,
+)
+
+_SNMP_COLUMNS = (
+    DeviceSNMPConfig.id, DeviceSNMPConfig.enabled, DeviceSNMPConfig.ip_address,
+    DeviceSNMPConfig.port, DeviceSNMPConfig.community, DeviceSNMPConfig.version,
+    DeviceSNMPConfig.username, DeviceSNMPConfig.password, DeviceSNMPConfig.auth_protocol,
+    DeviceSNMPConfig.priv_protocol, DeviceSNMPConfig.last_check, DeviceSNMPConfig.status,
+    DeviceSNMPConfig.response_time, DeviceSNMPConfig.timeout, DeviceSNMPConfig.retries,
+    DeviceSNMPConfig.check_interval,
+)
+
+_DEVICE_QUERY = (
+    select(*_DEVICE_COLUMNS, category.icon, *_SNMP_COLUMNS)
+    .outerjoin(category, device.category_id == category.id)
+    .outerjoin(DeviceSNMPConfig, DeviceSNMPConfig.device_id == device.id)
+)
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class DeviceRow:
+    """Устройство с иконкой категории и SNMP-конфигурацией из одной строки запроса"""
+    __slots__ = (
+        'id', 'name', 'category', 'category_id', 'xCord', 'yCord', 'place_id', 'classroom_id',
+        'version', 'releaseDate', 'softwareStartDate', 'softwareEndDate', 'updateDate',
+        'manufacturer', 'manufacturer_id', 'mapId', 'category_icon', 'snmp',
+    )
+    # Колонки columnar-ответа /search
+    FIELDS = DEVICE_FIELDS + ("categoryIcon", "snmp_config", "snmp_status")
+
+    def __init__(self, row):
+        (self.id, self.name, self.category, self.category_id, self.xCord, self.yCord,
+         self.place_id, self.classroom_id, self.version, self.releaseDate,
+         self.softwareStartDate, self.softwareEndDate, self.updateDate,
+         self.manufacturer, self.manufacturer_id, self.mapId, self.category_icon) = row[:17]
+        # Колонки SNMP; None, если конфигурации нет (outer join)
+        self.snmp = row[17:] if row[17] is not None else None
+
+    def _snmp(self):
+        """(snmp_config, snmp_status) в формате ответа; None там, где их нет."""
+        if self.snmp is None:
+            return None, None
+        (snmp_id, enabled, ip_address, port, community, version, username, password,
+         auth_protocol, priv_protocol, last_check, status, response_time, timeout,
+         retries, check_interval) = self.snmp
+        config = {
+            'id': snmp_id,
+            'device_id': self.id,
+            'enabled': enabled,
+            'ip_address': ip_address,
+            'port': port,
+            'community': community,
+            'version': version,
+            'username': username,
+            'password': password,
+            'auth_protocol': auth_protocol,
+            'priv_protocol': priv_protocol,
+            # Если SNMP отключен, статус не отдаём, чтобы фронтенд его не показывал
+            'last_check': last_check if enabled else None,
+            'status': status if enabled else None,
+            'response_time': response_time if enabled else None,
+            'timeout': timeout,
+            'retries': retries,
+            'check_interval': check_interval,
+        }
+        if not (enabled and status and status != 'disabled'):
+            return config, None
+        return config, {
+            "status": status,
+            "message": f"Last check: {_iso(last_check) or 'Never'}",
+            "response_time": response_time,
+            "timestamp": last_check,
+        }
+
+    def to_dict(self) -> dict:
+        result = device_serializer.dict(self)
+        result["categoryIcon"] = self.category_icon or 'default'
+        config, status = self._snmp()
+        if config is not None:
+            result["snmp_config"] = config
+        if status is not None:
+            result["snmp_status"] = status
+        return result
+
+    def to_row(self) -> list:
+        return [*device_serializer.values(self), self.category_icon or 'default', *self._snmp()]
+
+
+async def search_device_rows(session: AsyncSession, name_pattern: Optional[str] = None) -> List[DeviceRow]:
+    """Все устройства (или подходящие под ILIKE-шаблон имени) одним запросом."""
+    query = _DEVICE_QUERY
+    if name_pattern is not None:
+        query = query.where(device.name.ilike(name_pattern, escape="\\"))
+    result = await session.execute(query)
+    return [DeviceRow(row) for row in result.tuples()]
+
+
+async def get_device_row(session: AsyncSession, device_id: int) -> Optional[DeviceRow]:
+    result = await session.execute(_DEVICE_QUERY.where(device.id == device_id))
+    row = result.first()
+    return DeviceRow(row) if row is not None else None
+
+
+_TICKET_QUERY = (
+    select(
+        Ticket.id, Ticket.device_id, device.name, device.place_id, Ticket.author_id,
+        WebUser.full_name, Ticket.title, Ticket.description, Ticket.status,
+        Ticket.created_at, Ticket.closed_at,
+    )
+    .outerjoin(device, Ticket.device_id == device.id)
+    .outerjoin(WebUser, Ticket.author_id == WebUser.id)
+    # Порядок страниц — ключ (created_at, id); индексы тикетов заканчиваются на него
+    .order_by(Ticket.created_at.desc(), Ticket.id.desc())
+)
+
+TICKET_STATUSES = ('open', 'in_progress', 'closed')
+
+
+class TicketRow:
+    """Тикет с именем устройства и автора из одной строки запроса"""
+    __slots__ = (
+        'id', 'device_id', 'device_name', 'device_place', 'author_id', 'author_name',
+        'title', 'description', 'status', 'created_at', 'closed_at',
+    )
+    FIELDS = TICKET_FIELDS
+
+    def __init__(self, row):
+        (self.id, self.device_id, self.device_name, self.device_place, self.author_id,
+         self.author_name, self.title, self.description, self.status,
+         self.created_at, self.closed_at) = row
+
+    def to_dict(self) -> dict:
+        return ticket_serializer.dict(self)
+
+    def to_row(self) -> list:
+        return list(ticket_serializer.values(self))
+
+
+def encode_ticket_cursor(row: TicketRow) -> str:
+    """Курсор страницы после этого тикета: (created_at, id) в base64url."""
+    created_at = row.created_at.isoformat() if row.created_at else None
+    return base64.urlsafe_b64encode(json.dumps([created_at, row.id]).encode()).decode().rstrip('=')
+
+
+def decode_ticket_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) из курсора; ValueError для испорченного."""
+    try:
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), int(ticket_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+async def list_ticket_rows(session: AsyncSession, author_id: Optional[int] = None, *,
+                           status: Optional[str] = None, device_id: Optional[int] = None,
+                           map_id: Optional[int] = None, created_from: Optional[datetime] = None,
+                           created_to: Optional[datetime] = None,
+                           after: Optional[Tuple[datetime, int]] = None,
+                           limit: Optional[int] = None) -> List[TicketRow]:
+    """
+    Тикеты, новые первыми; фильтры по автору, статусу, устройству, карте устройства
+    и дате создания (created_from включительно, created_to — нет). after — ключ
+    (created_at, id) последнего тикета предыдущей страницы.
+    """
+    query = _TICKET_QUERY
+    if author_id is not None:
+        query = query.where(Ticket.author_id == author_id)
+    if status is not None:
+        query = query.where(Ticket.status == status)
+    if device_id is not None:
+        query = query.where(Ticket.device_id == device_id)
+    if map_id is not None:
+        query = query.where(device.mapId == map_id)
+    if created_from is not None:
+        query = query.where(Ticket.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Ticket.created_at < created_to)
+    if after is not None:
+        query = query.where(tuple_(Ticket.created_at, Ticket.id) < tuple_(*after))
+    if limit is not None:
+        query = query.limit(limit)
+    result = await session.execute(query)
+    return [TicketRow(row) for row in result.tuples()]
+
+
+async def ticket_counter_rows(session: AsyncSession) -> List[tuple]:
+    """
+    Число тикетов по статусам для каждого устройства одним GROUP BY:
+    (device_id, category_id, mapId, open, in_progress, closed).
+    """
+    counts = [func.count().filter(Ticket.status == status) for status in TICKET_STATUSES]
+    result = await session.execute(
+        select(Ticket.device_id, device.category_id, device.mapId, *counts)
+        .outerjoin(device, Ticket.device_id == device.id)
+        .group_by(Ticket.device_id, device.category_id, device.mapId)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+# Статус SNMP для карты: только у включённого мониторинга; чем больше ранг, тем хуже
+STATUS_RANKS = {'up': 1, 'unknown': 2, 'error': 3, 'down': 4}
+_RANK_STATUSES = {rank: status for status, rank in STATUS_RANKS.items()}
+
+_STATUS_RANK = case(
+    *((and_(DeviceSNMPConfig.enabled, DeviceSNMPConfig.status == status), rank)
+      for status, rank in STATUS_RANKS.items()),
+    else_=0,
+)
+
+
+def rank_status(rank: Optional[int]) -> Optional[str]:
+    return _RANK_STATUSES.get(rank or 0)
+
+
+def _in_viewport(viewport: Optional[Tuple[float, float, float, float]]) -> list:
+    if viewport is None:
+        return []
+    min_x, min_y, max_x, max_y = viewport
+    return [device.xCord.between(min_x, max_x), device.yCord.between(min_y, max_y)]
+
+
+async def map_cluster_rows(session: AsyncSession, map_id: int, cell_size: float) -> List[tuple]:
+    """
+    Устройства карты, сгруппированные по ячейкам сетки cell_size (индекс mapId, xCord, yCord):
+    (cell_x, cell_y, count, avg_x, avg_y, худший ранг статуса, min id).
+    """
+    cell_x = func.floor(device.xCord / cell_size)
+    cell_y = func.floor(device.yCord / cell_size)
+    result = await session.execute(
+        select(cell_x, cell_y, func.count(), func.avg(device.xCord), func.avg(device.yCord),
+               func.max(_STATUS_RANK), func.min(device.id))
+        .outerjoin(DeviceSNMPConfig, DeviceSNMPConfig.device_id == device.id)
+        .where(device.mapId == map_id, device.xCord.is_not(None), device.yCord.is_not(None))
+        .group_by(cell_x, cell_y)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def map_device_markers(session: AsyncSession, map_id: int,
+                             viewport: Optional[Tuple[float, float, float, float]] = None) -> List[dict]:
+    """Маркеры устройств карты в окне просмотра: id, имя, категория с иконкой, координаты, статус."""
+    result = await session.execute(
+        select(device.id, device.name, device.category, device.category_id, category.icon,
+               device.place_id, device.classroom_id, device.xCord, device.yCord, _STATUS_RANK)
+        .outerjoin(category, device.category_id == category.id)
+        .outerjoin(DeviceSNMPConfig, DeviceSNMPConfig.device_id == device.id)
+        .where(device.mapId == map_id, device.xCord.is_not(None), device.yCord.is_not(None),
+               *_in_viewport(viewport))
+        .order_by(device.id)
+    )
+    return [
+        {'id': device_id, 'name': name, 'category': category_name, 'category_id': category_id,
+         'categoryIcon': icon or 'default', 'place_id': place_id, 'classroom_id': classroom_id,
+         'xCord': x, 'yCord': y, 'status': rank_status(rank)}
+        for device_id, name, category_name, category_id, icon, place_id, classroom_id, x, y, rank in result.all()
+    ]
+
+
+async def label_rows(session: AsyncSession, category_id: Optional[int] = None, map_id: Optional[int] = None,
+                     offset: int = 0, limit: Optional[int] = None) -> List[tuple]:
+    """(id, имя, помещение) устройств категории и/или карты для листа наклеек, по id."""
+    query = select(device.id, device.name, device.place_id).order_by(device.id)
+    if category_id is not None:
+        query = query.where(device.category_id == category_id)
+    if map_id is not None:
+        query = query.where(device.mapId == map_id)
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return [tuple(row) for row in (await session.execute(query)).all()]
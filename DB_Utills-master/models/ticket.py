@@ -1,15 +1,23 @@
 from datetime import datetime
 from typing import Optional, Sequence
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, select, delete, update, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, select, delete, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship
 
 from models.db_session import Base
+from services.table_versions import invalidate_tickets
 
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    # Очереди читаются страницами по ключу (created_at, id) — id в конце каждого индекса
+    __table_args__ = (
+        Index("ix_tickets_created_id", "created_at", "id"),
+        Index("ix_tickets_author_created_id", "author_id", "created_at", "id"),
+        Index("ix_tickets_status_created_id", "status", "created_at", "id"),
+        Index("ix_tickets_device_created_id", "device_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     device_id = Column(Integer, ForeignKey("device.id"), nullable=False)
@@ -17,7 +25,9 @@ class Ticket(Base):
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
     status = Column(String(20), default="open", nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    # Время приложения, как у closed_at: на SQLite func.now() пишет секунды без дробной
+    # части, и такие значения не сравниваются с курсором страницы (SQLAlchemy пишет .ffffff)
+    created_at = Column(DateTime, default=datetime.now)
     closed_at = Column(DateTime, nullable=True)
 
     author = relationship("WebUser", lazy="selectin")
@@ -46,6 +56,7 @@ class Ticket(Base):
         session.add(ticket)
         await session.commit()
         await session.refresh(ticket)
+        await invalidate_tickets()
         return ticket
 
     @classmethod
@@ -56,6 +67,7 @@ class Ticket(Base):
             values["closed_at"] = closed_at
         await session.execute(update(cls).where(cls.id == ticket_id).values(**values))
         await session.commit()
+        await invalidate_tickets()
         return await cls.get_by_id(session, ticket_id)
 
     def to_dict(self) -> dict:
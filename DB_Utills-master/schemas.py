@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, Union
+from datetime import time
+from typing import List, Optional, Union
 
 class EquipmentCreate(BaseModel):
     name: str
@@ -15,6 +16,10 @@ class EquipmentCreate(BaseModel):
     xCord: Optional[float] = None
     yCord: Optional[float] = None
     mapId: Optional[int] = None
+    # Если переданы, имеют приоритет над category / manufacturer / place_id
+    category_id: Optional[int] = None
+    manufacturer_id: Optional[int] = None
+    classroom_id: Optional[int] = None
 
 class EquipmentUpdate(BaseModel):
     name: Optional[str] = None
@@ -29,6 +34,9 @@ class EquipmentUpdate(BaseModel):
     xCord: Optional[float] = None
     yCord: Optional[float] = None
     mapId: Optional[int] = None
+    category_id: Optional[int] = None
+    manufacturer_id: Optional[int] = None
+    classroom_id: Optional[int] = None
 
 
 class CategoryCreate(BaseModel):
@@ -83,6 +91,12 @@ class ClassroomResponse(BaseModel):
     polygon_coordinates: list
     description: Optional[str] = None
 
+class ClassroomAssignRequest(BaseModel):
+    map_id: Optional[int] = None  # None — все карты
+    device_ids: Optional[List[int]] = None
+    clear_unmatched: bool = False  # отвязать устройства вне всех аудиторий
+    background: bool = False  # выполнить фоновым заданием
+
 
 # --- Auth schemas ---
 
@@ -143,4 +157,29 @@ class TicketResponse(BaseModel):
     description: str
     status: str
     created_at: Optional[str] = None
-    closed_at: Optional[str] = None
\ No newline at end of file
+    closed_at: Optional[str] = None
+
+
+class DiscoveryProfileCreate(BaseModel):
+    name: str
+    subnets: List[str]
+    communities: List[str] = ["public"]
+    mode: str = "icmp"  # icmp, sweep, both
+    port: int = 161
+    interval_minutes: int = 1440
+    max_packets_per_second: int = 200
+    window_start: Optional[time] = None  # окно обслуживания, HH:MM
+    window_end: Optional[time] = None
+    enabled: bool = True
+
+class DiscoveryProfileUpdate(BaseModel):
+    name: Optional[str] = None
+    subnets: Optional[List[str]] = None
+    communities: Optional[List[str]] = None
+    mode: Optional[str] = None
+    port: Optional[int] = None
+    interval_minutes: Optional[int] = None
+    max_packets_per_second: Optional[int] = None
+    window_start: Optional[time] = None
+    window_end: Optional[time] = None
+    enabled: Optional[bool] = None
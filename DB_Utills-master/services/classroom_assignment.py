@@ -0,0 +1,129 @@
+"""
+Фоновое назначение аудиторий устройствам по координатам.
+
+Задания (карты или список устройств) ставятся в очередь и выполняются по одному
+через device.assign_classrooms. Состояние заданий хранится в таблице
+classroom_assignment_jobs: эндпоинт отдаёт его из любого воркера, а выполняет
+задание воркер, который его принял. Задания, не доделанные к остановке воркера,
+помечаются failed. Если воркер убит или упал, его задания перестают получать
+отметку heartbeat_at, и любой живой воркер (в том числе перезапущенный) помечает
+их failed через четыре периода отметки. Карта ставится в очередь и автоматически — после изменения
+полигонов её аудиторий (см. эндпоинты аудиторий в Backend).
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.classroom_assignment_job import ClassroomAssignmentJob
+from models.db_session import create_session
+from models.device import device
+
+logger = logging.getLogger(__name__)
+
+# Сколько завершённых заданий помнить; незавершённые не удаляются
+_MAX_JOBS = 50
+# Сколько пропущенных отметок считать остановкой воркера
+_STALE_HEARTBEATS = 4
+
+
+class ClassroomAssignmentJobs:
+    """Очередь заданий назначения аудиторий этого воркера"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._heartbeat_seconds = 30.0
+        # Незавершённые задания этого воркера: очередь и текущее
+        self._pending: Set[int] = set()
+
+    def start(self, heartbeat_seconds: Optional[float] = None) -> None:
+        if heartbeat_seconds is not None:
+            self._heartbeat_seconds = heartbeat_seconds
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        for task in (self._task, self._heartbeat_task):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = self._heartbeat_task = None
+        unfinished = sorted(self._pending)
+        self._pending.clear()
+        if unfinished:
+            try:
+                async with create_session() as db:
+                    await ClassroomAssignmentJob.set_status(db, unfinished, 'failed',
+                                                            error='Interrupted by worker shutdown')
+            except Exception:
+                logger.exception("Could not mark interrupted classroom assignment jobs %s", unfinished)
+
+    async def submit(self, session: AsyncSession, map_ids: Optional[List[int]] = None,
+                     device_ids: Optional[List[int]] = None, clear_unmatched: bool = False) -> dict:
+        """Ставит задание в очередь; map_ids и device_ids None — все устройства."""
+        # Обычно запущено в lifespan; без него (скрипты, тесты) — при первом задании
+        self.start()
+        job = (await ClassroomAssignmentJob.create(
+            session, map_ids=map_ids, device_ids=device_ids, clear_unmatched=clear_unmatched,
+        )).to_dict()
+        self._pending.add(job['id'])
+        self._queue.put_nowait(job)
+        return job
+
+    async def get(self, session: AsyncSession, job_id: int) -> Optional[dict]:
+        job = await ClassroomAssignmentJob.get_by_id(session, job_id)
+        return job.to_dict() if job is not None else None
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                async with create_session() as db:
+                    await ClassroomAssignmentJob.set_status(db, [job['id']], 'running')
+                    result = await device.assign_classrooms(
+                        db, map_ids=job['map_ids'], device_ids=job['device_ids'],
+                        clear_unmatched=job['clear_unmatched'],
+                    )
+                    await ClassroomAssignmentJob.set_status(db, [job['id']], 'done', result=result)
+                    await ClassroomAssignmentJob.trim_finished(db, _MAX_JOBS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception("Classroom assignment job %s failed", job['id'])
+                try:
+                    async with create_session() as db:
+                        await ClassroomAssignmentJob.set_status(db, [job['id']], 'failed', error=str(exc))
+                except Exception:
+                    logger.exception("Could not record failure of classroom assignment job %s", job['id'])
+            self._pending.discard(job['id'])
+
+    async def _heartbeat(self) -> None:
+        """Отмечает свои задания и снимает зависшие чужие; первый проход — сразу при запуске."""
+        while True:
+            try:
+                async with create_session() as db:
+                    if self._pending:
+                        await ClassroomAssignmentJob.touch(db, sorted(self._pending))
+                    stale_before = datetime.now() - timedelta(seconds=_STALE_HEARTBEATS * self._heartbeat_seconds)
+                    failed = await ClassroomAssignmentJob.fail_stale(db, stale_before)
+                if failed:
+                    logger.warning("Marked %s classroom assignment jobs of stopped workers as failed", failed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Classroom assignment heartbeat failed")
+            await asyncio.sleep(self._heartbeat_seconds)
+
+
+classroom_assignment_jobs = ClassroomAssignmentJobs()
@@ -0,0 +1,258 @@
+"""
+Пространственный индекс аудиторий в памяти: по одному на карту.
+
+Для каждой карты хранятся ограничивающие прямоугольники аудиторий, координаты
+вершин отдельными кортежами и равномерная сетка: в ячейке — аудитории, чей
+прямоугольник её задевает. Поиск по точке проверяет только аудитории своей
+ячейки, сначала по прямоугольнику, потом лучом по полигону.
+
+Для пакетного назначения аудиторий устройствам MapIndex.locate проверяет сразу
+все точки карты: кандидаты из ячейки сетки, отбор по прямоугольнику и луч по
+всем рёбрам кандидатов — одними операциями NumPy над массивами (без NumPy —
+поиском по сетке для каждой точки).
+
+Индекс карты строится при первом обращении (в фоне, см. warm) и выбрасывается по теме
+CLASSROOMS_TOPIC шины инвалидации (ключ — map_id), так что изменения
+аудиторий видны во всех воркерах.
+"""
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.invalidation_bus import invalidation_bus
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Тема шины инвалидации; ключ — map_id, None — все карты
+CLASSROOMS_TOPIC = "classrooms"
+
+# Не больше стольких ячеек сетки по каждой оси
+_MAX_GRID = 64
+
+
+def polygon_bbox(polygon: Optional[list]) -> Optional[Tuple[float, float, float, float]]:
+    """(min_x, min_y, max_x, max_y) полигона [{x, y}, ...]; None для пустого."""
+    if not polygon:
+        return None
+    xs = [float(p.get('x', 0)) for p in polygon]
+    ys = [float(p.get('y', 0)) for p in polygon]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class IndexedClassroom:
+    """Аудитория в индексе: данные ответа, прямоугольник и вершины полигона"""
+    __slots__ = ('id', 'data', 'min_x', 'min_y', 'max_x', 'max_y', 'xs', 'ys')
+
+    def __init__(self, data: dict):
+        self.id = data['id']
+        self.data = data
+        polygon = data['polygon_coordinates'] or []
+        self.xs = tuple(float(p.get('x', 0)) for p in polygon)
+        self.ys = tuple(float(p.get('y', 0)) for p in polygon)
+        if self.xs:
+            self.min_x, self.max_x = min(self.xs), max(self.xs)
+            self.min_y, self.max_y = min(self.ys), max(self.ys)
+        else:
+            self.min_x = self.max_x = self.min_y = self.max_y = 0.0
+
+    def contains(self, x: float, y: float) -> bool:
+        """Точка внутри полигона: луч вправо, чётность пересечений рёбер."""
+        if not (self.min_x <= x <= self.max_x and self.min_y < y <= self.max_y):
+            return False
+        xs, ys = self.xs, self.ys
+        n = len(xs)
+        if n < 3:
+            return False
+        inside = False
+        p1x, p1y = xs[-1], ys[-1]
+        for i in range(n):
+            p2x, p2y = xs[i], ys[i]
+            if (p1y < y <= p2y or p2y < y <= p1y) and x <= max(p1x, p2x):
+                if p1x == p2x or x <= (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x:
+                    inside = not inside
+            p1x, p1y = p2x, p2y
+        return inside
+
+
+class MapIndex:
+    """Аудитории одной карты и сетка по их прямоугольникам"""
+
+    def __init__(self, classrooms: Iterable[dict]):
+        # Порядок аудиторий сохраняется: при перекрытии побеждает первая, как в БД
+        self.items: List[IndexedClassroom] = [IndexedClassroom(data) for data in classrooms]
+        self._cells: Dict[Tuple[int, int], List[IndexedClassroom]] = {}
+        self._arrays = None
+        if not self.items:
+            self.min_x = self.min_y = 0.0
+            self.cols = self.rows = 1
+            self.cell_w = self.cell_h = 1.0
+            return
+        self.min_x = min(item.min_x for item in self.items)
+        self.min_y = min(item.min_y for item in self.items)
+        width = max(item.max_x for item in self.items) - self.min_x
+        height = max(item.max_y for item in self.items) - self.min_y
+        # Порядка одной-двух аудиторий на ячейку при равномерном плане
+        side = min(_MAX_GRID, max(1, math.ceil(math.sqrt(len(self.items)))))
+        self.cols = self.rows = side
+        self.cell_w = width / side or 1.0
+        self.cell_h = height / side or 1.0
+        for item in self.items:
+            c0, r0 = self._cell(item.min_x, item.min_y)
+            c1, r1 = self._cell(item.max_x, item.max_y)
+            for c in range(c0, c1 + 1):
+                for r in range(r0, r1 + 1):
+                    self._cells.setdefault((c, r), []).append(item)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        c = min(self.cols - 1, max(0, int((x - self.min_x) / self.cell_w)))
+        r = min(self.rows - 1, max(0, int((y - self.min_y) / self.cell_h)))
+        return c, r
+
+    def find(self, x: float, y: float) -> Optional[IndexedClassroom]:
+        for item in self._cells.get(self._cell(x, y), ()):
+            if item.contains(x, y):
+                return item
+        return None
+
+    def locate(self, xs: Sequence[float], ys: Sequence[float]) -> List[Optional[IndexedClassroom]]:
+        """Аудитория для каждой точки (xs[i], ys[i]) или None; результат совпадает с find."""
+        if not NUMPY_AVAILABLE:
+            return [self.find(x, y) for x, y in zip(xs, ys)]
+        if self._arrays is None:
+            self._arrays = self._build_arrays()
+        cell_start, cell_items, bbox, edge_start, edges = self._arrays
+        x = np.asarray(xs, dtype=np.float64)
+        y = np.asarray(ys, dtype=np.float64)
+
+        # Пары (точка, аудитория-кандидат из ячейки точки), точки по порядку, аудитории по позиции
+        c = np.clip(((x - self.min_x) / self.cell_w).astype(np.int64), 0, self.cols - 1)
+        r = np.clip(((y - self.min_y) / self.cell_h).astype(np.int64), 0, self.rows - 1)
+        cell = c * self.rows + r
+        counts = cell_start[cell + 1] - cell_start[cell]
+        pair_point = np.repeat(np.arange(x.size), counts)
+        pair_item = cell_items[_ranges(cell_start[cell], counts)]
+        px, py = x[pair_point], y[pair_point]
+        box = bbox[pair_item]
+        keep = (box[:, 0] <= px) & (px <= box[:, 2]) & (box[:, 1] < py) & (py <= box[:, 3])
+        pair_point, pair_item, px, py = pair_point[keep], pair_item[keep], px[keep], py[keep]
+
+        # Луч вправо по всем рёбрам каждой пары (горизонтальные рёбра исключены заранее)
+        counts = edge_start[pair_item + 1] - edge_start[pair_item]
+        pair = np.repeat(np.arange(pair_item.size), counts)
+        e = edges[_ranges(edge_start[pair_item], counts)]
+        ex, ey = px[pair], py[pair]
+        crosses = (((e[:, 1] < ey) & (ey <= e[:, 3])) | ((e[:, 3] < ey) & (ey <= e[:, 1])))
+        crosses &= ex <= np.maximum(e[:, 0], e[:, 2])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xinters = (ey - e[:, 1]) * (e[:, 2] - e[:, 0]) / (e[:, 3] - e[:, 1]) + e[:, 0]
+        crosses &= (e[:, 0] == e[:, 2]) | (ex <= xinters)
+        inside = np.bincount(pair, weights=crosses, minlength=pair_item.size).astype(np.int64) % 2 == 1
+
+        # Первая по порядку аудитория, содержащая точку
+        hits = np.flatnonzero(inside)
+        points, first = np.unique(pair_point[hits], return_index=True)
+        found: List[Optional[IndexedClassroom]] = [None] * x.size
+        for point, pos in zip(points.tolist(), pair_item[hits[first]].tolist()):
+            found[point] = self.items[pos]
+        return found
+
+    def _build_arrays(self) -> tuple:
+        """Сетка и рёбра полигонов массивами (CSR) для locate."""
+        position = {id(item): pos for pos, item in enumerate(self.items)}
+        cell_items, cell_start = [], [0]
+        for c in range(self.cols):
+            for r in range(self.rows):
+                cell_items.extend(position[id(item)] for item in self._cells.get((c, r), ()))
+                cell_start.append(len(cell_items))
+        edges, edge_start = [], [0]
+        for item in self.items:
+            n = len(item.xs)
+            if n >= 3:
+                for i in range(n):
+                    x1, y1, x2, y2 = item.xs[i - 1], item.ys[i - 1], item.xs[i], item.ys[i]
+                    if y1 != y2:
+                        edges.append((x1, y1, x2, y2))
+            edge_start.append(len(edges))
+        bbox = [(item.min_x, item.min_y, item.max_x, item.max_y) for item in self.items]
+        return (
+            np.asarray(cell_start, dtype=np.int64),
+            np.asarray(cell_items, dtype=np.int64),
+            np.asarray(bbox, dtype=np.float64).reshape(-1, 4),
+            np.asarray(edge_start, dtype=np.int64),
+            np.asarray(edges, dtype=np.float64).reshape(-1, 4),
+        )
+
+
+def _ranges(starts, counts):
+    """Индексы starts[k] .. starts[k] + counts[k] - 1 подряд для всех k."""
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+class ClassroomIndex:
+    """Индексы карт по map_id с инвалидацией через шину"""
+
+    def __init__(self):
+        self._maps: Dict[int, MapIndex] = {}
+        # Поколение карты растёт при каждой инвалидации: индекс, собранный
+        # из данных, прочитанных до неё, не сохраняется
+        self._generations: Dict[int, int] = {}
+        self._epoch = 0
+        self._building: Dict[int, asyncio.Task] = {}
+
+    def get(self, map_id: int) -> Optional[MapIndex]:
+        return self._maps.get(map_id)
+
+    def generation(self, map_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(map_id, 0)
+
+    def put(self, map_id: int, classrooms: Iterable[dict], generation: Tuple[int, int]) -> MapIndex:
+        index = MapIndex(classrooms)
+        if generation == self.generation(map_id):
+            self._maps[map_id] = index
+        return index
+
+    def warm(self, map_id: int, build: Callable[[], Awaitable]) -> None:
+        """Строит индекс карты фоновой задачей, если он ещё не строится."""
+        task = self._building.get(map_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(build())
+        self._building[map_id] = task
+        task.add_done_callback(lambda t: self._on_built(map_id, t))
+
+    def _on_built(self, map_id: int, task: asyncio.Task) -> None:
+        if self._building.get(map_id) is task:
+            del self._building[map_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to build classroom index for map %s", map_id, exc_info=task.exception())
+
+    def invalidate(self, key: Optional[str]) -> None:
+        if key is None:
+            self._maps.clear()
+            self._epoch += 1
+            return
+        map_id = int(key)
+        self._maps.pop(map_id, None)
+        self._generations[map_id] = self._generations.get(map_id, 0) + 1
+
+
+classroom_index = ClassroomIndex()
+invalidation_bus.subscribe(CLASSROOMS_TOPIC, classroom_index.invalidate)
+
+
+async def invalidate_classrooms(*map_ids: int) -> None:
+    """Сбрасывает индекс карт во всех воркерах — после изменения аудиторий (после commit)."""
+    for map_id in set(map_ids):
+        await invalidation_bus.publish(CLASSROOMS_TOPIC, str(map_id))
@@ -0,0 +1,171 @@
+"""
+Планировщик периодической SNMP Discovery.
+
+Раз в poll_interval секунд находит профили с подошедшим next_run_at и проходит
+их подсети по очереди. Если у профиля задано окно обслуживания, запуск
+переносится на его начало, а темп (packets_per_second) подбирается так,
+чтобы все пакеты распределились по оставшейся части окна, но не выше
+max_packets_per_second профиля. Результат каждой подсети — DiscoveryRun с diff.
+"""
+import asyncio
+import logging
+import math
+from datetime import datetime, time as dt_time, timedelta
+from typing import Optional
+
+from models.db_session import create_session
+from models.discovered_host import DiscoveredHost
+from models.discovery_profile import DiscoveryProfile, DiscoveryRun
+from services.network_discovery_service import NetworkDiscoveryService, normalize_subnet, subnet_host_count
+
+logger = logging.getLogger(__name__)
+
+# Темп не опускается ниже этого значения, даже если окно очень длинное
+_MIN_PACKETS_PER_SECOND = 5
+
+# Доля окна, по которой распределяются пакеты (остаток — на SNMP-опрос и хвост ответов)
+_WINDOW_FILL = 0.8
+
+
+def in_window(moment: datetime, start: Optional[dt_time], end: Optional[dt_time]) -> bool:
+    """Попадает ли момент в окно [start, end); окно без границ — всегда открыто."""
+    if start is None or end is None or start == end:
+        return True
+    now = moment.time()
+    if start < end:
+        return start <= now < end
+    return now >= start or now < end  # окно через полночь
+
+
+def window_remaining(moment: datetime, start: Optional[dt_time], end: Optional[dt_time]) -> Optional[float]:
+    """Секунд до закрытия окна; None — окна нет."""
+    if start is None or end is None or start == end:
+        return None
+    closes = datetime.combine(moment.date(), end)
+    if closes <= moment:
+        closes += timedelta(days=1)
+    return (closes - moment).total_seconds()
+
+
+def next_window_start(moment: datetime, start: Optional[dt_time], end: Optional[dt_time]) -> datetime:
+    """Ближайший момент не раньше moment, когда окно открыто."""
+    if in_window(moment, start, end):
+        return moment
+    opens = datetime.combine(moment.date(), start)
+    if opens <= moment:
+        opens += timedelta(days=1)
+    return opens
+
+
+def next_run_after(profile: DiscoveryProfile, moment: datetime) -> datetime:
+    """Следующий запуск: через interval_minutes, сдвинутый в окно обслуживания."""
+    planned = moment + timedelta(minutes=max(1, profile.interval_minutes))
+    return next_window_start(planned, profile.window_start, profile.window_end)
+
+
+def spread_packets_per_second(profile: DiscoveryProfile, moment: datetime) -> int:
+    """
+    Темп, при котором все probe-пакеты профиля укладываются в остаток окна.
+    Без окна — max_packets_per_second профиля.
+    """
+    limit = max(1, profile.max_packets_per_second)
+    remaining = window_remaining(moment, profile.window_start, profile.window_end)
+    if remaining is None:
+        return limit
+    per_host = 0
+    if profile.mode in ('icmp', 'both'):
+        per_host += 1
+    if profile.mode in ('sweep', 'both'):
+        per_host += len(profile.communities or ['public'])
+    packets = sum(subnet_host_count(subnet) for subnet in profile.subnets) * per_host
+    needed = math.ceil(packets / max(1.0, remaining * _WINDOW_FILL))
+    return min(limit, max(_MIN_PACKETS_PER_SECOND, needed))
+
+
+class DiscoveryScheduler:
+    """Фоновая задача, запускающая профили DiscoveryProfile по расписанию"""
+
+    def __init__(self, poll_interval: float = 30.0, timeout: float = 2.0):
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Discovery scheduler: ошибка при проверке профилей')
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_due(self) -> None:
+        """Запускает все профили, у которых подошло время; по одному, чтобы не складывать трафик."""
+        now = datetime.now()
+        async with create_session() as db:
+            due = await DiscoveryProfile.get_due(db, now)
+        for profile in due:
+            if not in_window(now, profile.window_start, profile.window_end):
+                async with create_session() as db:
+                    await DiscoveryProfile.set_next_run(
+                        db, profile.id, next_window_start(now, profile.window_start, profile.window_end),
+                    )
+                continue
+            async with create_session() as db:
+                claimed = await DiscoveryProfile.claim(
+                    db, profile.id, profile.next_run_at, next_run_after(profile, now),
+                )
+            if claimed:
+                await self.run_profile(profile)
+
+    async def run_profile(self, profile: DiscoveryProfile) -> None:
+        """Проходит подсети профиля, сохраняя по DiscoveryRun на каждую."""
+        started = datetime.now()
+        packets_per_second = spread_packets_per_second(profile, started)
+        logger.info(
+            'Discovery profile %s (%s): %d подсетей, %d пакетов/с',
+            profile.id, profile.name, len(profile.subnets), packets_per_second,
+        )
+        svc = NetworkDiscoveryService(timeout=self.timeout, retries=1, concurrency=50)
+        for subnet in profile.subnets:
+            subnet_key = normalize_subnet(subnet)
+            async with create_session() as db:
+                run = await DiscoveryRun.start(db, profile.id, subnet_key, packets_per_second)
+                known_alive = await DiscoveredHost.get_known_alive_ips(db, subnet_key)
+            try:
+                result = await svc.discover(
+                    subnet_key,
+                    communities=profile.communities or ['public'],
+                    port=profile.port,
+                    mode=profile.mode,
+                    packets_per_second=packets_per_second,
+                    priority_ips=known_alive,
+                )
+                async with create_session() as db:
+                    diff = await DiscoveredHost.apply_scan(db, subnet_key, result['discovered'])
+                    await DiscoveryRun.finish(
+                        db, run.id, 'success', total_found=result['total_found'], diff=diff,
+                    )
+            except asyncio.CancelledError:
+                async with create_session() as db:
+                    await DiscoveryRun.finish(db, run.id, 'cancelled')
+                raise
+            except Exception as exc:
+                logger.exception('Discovery profile %s: подсеть %s не просканирована', profile.id, subnet_key)
+                async with create_session() as db:
+                    await DiscoveryRun.finish(db, run.id, 'failed', error=str(exc))
@@ -0,0 +1,127 @@
+"""
+Шина инвалидации in-process кэшей между воркерами.
+
+Кэш подписывается на тему (subscribe) и получает ключ, который нужно выбросить;
+None — сбросить всё. publish сразу вызывает локальные обработчики и рассылает
+событие остальным процессам через PostgreSQL NOTIFY. Каждый процесс держит
+одно соединение с LISTEN; после его обрыва все кэши сбрасываются целиком,
+потому что пропущенные за это время события восстановить нельзя.
+Без PostgreSQL (или без psycopg) шина работает только внутри процесса.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+try:
+    import psycopg
+    _PSYCOPG_AVAILABLE = True
+except ImportError:
+    psycopg = None
+    _PSYCOPG_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'cache_invalidation'
+
+# Пауза перед повторным подключением LISTEN после обрыва
+_RECONNECT_DELAY = 2.0
+
+Handler = Callable[[Optional[str]], None]
+
+
+class InvalidationBus:
+    """Подписки на темы инвалидации и их доставка во все процессы"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._origin = uuid.uuid4().hex
+        self._conninfo: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def distributed(self) -> bool:
+        """True, если события уходят в другие процессы."""
+        return self._conninfo is not None
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def _deliver(self, topic: str, key: Optional[str]) -> None:
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(key)
+            except Exception:
+                logger.exception('Invalidation handler for %s failed', topic)
+
+    def _deliver_all(self) -> None:
+        for topic in list(self._handlers):
+            self._deliver(topic, None)
+
+    async def publish(self, topic: str, key: Optional[str] = None) -> None:
+        """Выбрасывает key из кэшей темы во всех процессах (вызывать после commit)."""
+        self._deliver(topic, key)
+        if not self.distributed:
+            return
+        payload = json.dumps({'origin': self._origin, 'topic': topic, 'key': key})
+        from models.db_session import create_session
+        try:
+            async with create_session() as db:
+                await db.execute(text('SELECT pg_notify(:channel, :payload)'),
+                                 {'channel': CHANNEL, 'payload': payload})
+                await db.commit()
+        except Exception:
+            # Другие процессы догонят по TTL своих кэшей
+            logger.exception('Failed to publish invalidation %s:%s', topic, key)
+
+    async def start(self, database_url: str) -> None:
+        """Запускает LISTEN, если база — PostgreSQL и установлен psycopg."""
+        url = make_url(database_url)
+        if url.get_backend_name() != 'postgresql' or not _PSYCOPG_AVAILABLE:
+            logger.info('Invalidation bus: process-local only (%s)', url.get_backend_name())
+            return
+        self._conninfo = url.set(drivername='postgresql').render_as_string(hide_password=False)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._conninfo = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self._conninfo, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {CHANNEL}')
+                    # Пока соединения не было, события могли потеряться
+                    self._deliver_all()
+                    async for notify in conn.notifies():
+                        self._on_notify(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning('Invalidation bus: LISTEN connection lost: %s', exc)
+                self._deliver_all()
+            await asyncio.sleep(_RECONNECT_DELAY)
+
+    def _on_notify(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        if event.get('origin') == self._origin:
+            return
+        self._deliver(event.get('topic', ''), event.get('key'))
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,164 @@
+"""
+Всё для открытия карты одним запросом (/maps/{mapId}/bundle).
+
+Пакет собирается из готовых JSON-фрагментов:
+  place      — место (карта);                    версия: места, ключ mapId;
+  classrooms — аудитории карты, при simplify —   версия: аудитории карты;
+               с упрощёнными полигонами;
+  devices    — маркеры устройств со статусом;    версии: устройства, аудитории
+               живут не дольше ttl (опрос SNMP     карты и категории (имена
+               меняет статус без инвалидации);     аудиторий и категорий в маркерах);
+  categories — таблица иконок категорий;         версия: категории.
+Фрагмент кодируется один раз и используется, пока версии его таблиц
+(services/table_versions.py) не изменились. Собранное тело и его ETag тоже
+кэшируются, так что тёплая карта отдаётся без запросов к базе.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.category import category
+from models.classroom import classroom
+from models.place import place
+from models.read_rows import map_device_markers
+from services.classroom_index import CLASSROOMS_TOPIC
+from services.map_clusters import MAP_DEVICES_TOPIC
+from services.serialization import dumps
+from services.table_versions import CATEGORIES_TOPIC, PLACES_TOPIC, table_versions
+
+table_versions.track(CLASSROOMS_TOPIC)
+table_versions.track(MAP_DEVICES_TOPIC)
+
+# Фрагментов и собранных пакетов в памяти (карты × варианты simplify)
+_MAX_ENTRIES = 256
+
+
+def simplify_polygon(polygon: list, tolerance: float) -> list:
+    """
+    Упрощение замкнутого полигона [{x, y}, ...] (Дуглас — Пекер): вершины, отстоящие от
+    упрощённой границы не дальше tolerance, отбрасываются. Меньше трёх вершин не остаётся.
+    """
+    n = len(polygon)
+    if n <= 3 or tolerance <= 0:
+        return polygon
+    points = [(float(p.get('x', 0)), float(p.get('y', 0))) for p in polygon]
+    # Замкнутый контур режется на две ломаные: от первой вершины до самой дальней от неё
+    x0, y0 = points[0]
+    far = max(range(n), key=lambda i: (points[i][0] - x0) ** 2 + (points[i][1] - y0) ** 2)
+    keep = [False] * n
+    keep[0] = keep[far] = True
+    stack = [(0, far), (far, n)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = points[start]
+        bx, by = points[end % n]
+        dx, dy = bx - ax, by - ay
+        length = (dx * dx + dy * dy) ** 0.5
+        best, best_i = -1.0, None
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length:
+                dist = abs(dy * (px - ax) - dx * (py - ay)) / length
+            else:
+                dist = ((px - ax) ** 2 + (py - ay) ** 2) ** 0.5
+            if dist > best:
+                best, best_i = dist, i
+        if best_i is not None and best > tolerance:
+            keep[best_i] = True
+            stack.append((start, best_i))
+            stack.append((best_i, end))
+    simplified = [polygon[i] for i in range(n) if keep[i]]
+    return simplified if len(simplified) >= 3 else polygon
+
+
+class MapBundleCache:
+    """Закодированные фрагменты и пакеты с версиями, по которым они собраны"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._serial = 0
+
+    async def piece(self, key: tuple, versions: tuple, build: Callable[[], Awaitable],
+                    ttl: Optional[float] = None) -> Tuple[int, Optional[bytes]]:
+        """(номер сборки, JSON) фрагмента; build вызывается, если версии изменились или истёк ttl."""
+        cached = self._entries.get(key)
+        if cached is not None:
+            cached_versions, stored_at, serial, body = cached
+            if cached_versions == versions and (ttl is None or time.monotonic() - stored_at <= ttl):
+                self._entries.move_to_end(key)
+                return serial, body
+        value = await build()
+        if value is None:
+            return 0, None
+        self._serial += 1
+        body = dumps(value)
+        # Версии прочитаны до запроса: если за время сборки пришла инвалидация,
+        # запись с устаревшими версиями не совпадёт при следующем обращении
+        self._store(key, (versions, time.monotonic(), self._serial, body))
+        return self._serial, body
+
+    def bundle(self, key: tuple, serials: tuple, parts: dict) -> Tuple[bytes, str]:
+        """Тело пакета и ETag; собирается заново, только если сменился какой-то фрагмент."""
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == serials:
+            self._entries.move_to_end(key)
+            return cached[2], cached[3]
+        body = b'{' + b','.join(b'"%s":%s' % (name.encode(), part) for name, part in parts.items()) + b'}'
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self._store(key, (serials, None, body, etag))
+        return body, etag
+
+    def _store(self, key: tuple, entry: tuple) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > _MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+
+map_bundle_cache = MapBundleCache()
+
+
+async def get_map_bundle(session: AsyncSession, map_id: int, simplify: Optional[float] = None, *,
+                         markers_ttl: float) -> Optional[Tuple[bytes, str]]:
+    """(JSON пакета карты, ETag) или None, если карты нет."""
+    classrooms_version = table_versions.version(CLASSROOMS_TOPIC, map_id)
+    categories_version = table_versions.version(CATEGORIES_TOPIC)
+
+    async def build_place():
+        found = await place.get_place_by_id(session, map_id)
+        return {'id': found.id, 'name': found.name} if found is not None else None
+
+    async def build_classrooms():
+        index = await classroom.get_map_index(session, map_id)
+        if not simplify:
+            return [item.data for item in index.items]
+        return [{**item.data, 'polygon_coordinates': simplify_polygon(item.data['polygon_coordinates'] or [], simplify)}
+                for item in index.items]
+
+    async def build_devices():
+        return await map_device_markers(session, map_id)
+
+    async def build_categories():
+        return [{'id': c.id, 'name': c.name, 'icon': c.icon or 'default'}
+                for c in await category.get_all_categories(session)]
+
+    place_serial, place_json = await map_bundle_cache.piece(
+        ('place', map_id), table_versions.version(PLACES_TOPIC, map_id), build_place)
+    if place_json is None:
+        return None
+    pieces = {
+        'place': (place_serial, place_json),
+        'classrooms': await map_bundle_cache.piece(
+            ('classrooms', map_id, simplify or 0), classrooms_version, build_classrooms),
+        'devices': await map_bundle_cache.piece(
+            ('devices', map_id),
+            (table_versions.version(MAP_DEVICES_TOPIC, map_id), classrooms_version, categories_version),
+            build_devices, ttl=markers_ttl),
+        'categories': await map_bundle_cache.piece(('categories',), categories_version, build_categories),
+    }
+    serials = tuple(serial for serial, _ in pieces.values())
+    return map_bundle_cache.bundle(('bundle', map_id, simplify or 0), serials,
+                                   {name: body for name, (_, body) in pieces.items()})
@@ -0,0 +1,125 @@
+"""
+Кластеры устройств на карте (/maps/{mapId}/devices).
+
+Координаты устройств — проценты от размеров изображения карты (0..100). На
+уровне масштаба zoom карта делится на квадратные ячейки со стороной
+100 / (MAP_CLUSTER_GRID * 2^zoom); кластер — все устройства ячейки: количество,
+средняя точка и худший статус SNMP. Сводка ячеек карты считается одним
+запросом GROUP BY по индексу (mapId, xCord, yCord) и кэшируется на каждый
+уровень масштаба отдельно.
+
+Кэш карты сбрасывается по теме MAP_DEVICES_TOPIC шины инвалидации (ключ —
+mapId) при добавлении, перемещении и удалении устройств во всех воркерах.
+Статус SNMP меняется опросом без инвалидации, поэтому сводка живёт не дольше
+MAP_CLUSTER_CACHE_TTL_SECONDS. Сводка для кэша читается с основной базы: реплика
+может отдать строки до перемещения уже после инвалидации, и они попали бы в кэш
+под новым поколением. Маркеры не кэшируются и читаются с сессии запроса (реплики).
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.read_rows import map_cluster_rows, map_device_markers, rank_status
+from services.invalidation_bus import invalidation_bus
+
+# Тема шины инвалидации; ключ — mapId, None — все карты
+MAP_DEVICES_TOPIC = "map_devices"
+
+Viewport = Tuple[float, float, float, float]
+
+
+def cell_size(zoom: int, grid: int) -> float:
+    """Сторона ячейки кластеризации на уровне zoom (в процентах карты)."""
+    return 100.0 / (grid * 2 ** zoom)
+
+
+class MapClusterCache:
+    """Сводки ячеек по (mapId, zoom) с TTL и инвалидацией через шину"""
+
+    def __init__(self):
+        self._cells: Dict[Tuple[int, int], Tuple[float, List[tuple]]] = {}
+        # Поколение карты растёт при каждой инвалидации: сводка, посчитанная
+        # по данным, прочитанным до неё, не сохраняется (как в classroom_index)
+        self._generations: Dict[int, int] = {}
+        self._epoch = 0
+
+    def generation(self, map_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(map_id, 0)
+
+    def get(self, map_id: int, zoom: int, ttl: float) -> Optional[List[tuple]]:
+        cached = self._cells.get((map_id, zoom))
+        if cached is None:
+            return None
+        stored_at, cells = cached
+        if time.monotonic() - stored_at > ttl:
+            del self._cells[(map_id, zoom)]
+            return None
+        return cells
+
+    def put(self, map_id: int, zoom: int, cells: List[tuple], generation: Tuple[int, int]) -> None:
+        if generation == self.generation(map_id):
+            self._cells[(map_id, zoom)] = (time.monotonic(), cells)
+
+    def invalidate(self, key: Optional[str]) -> None:
+        if key is None:
+            self._cells.clear()
+            self._epoch += 1
+            return
+        map_id = int(key)
+        for cache_key in [k for k in self._cells if k[0] == map_id]:
+            del self._cells[cache_key]
+        self._generations[map_id] = self._generations.get(map_id, 0) + 1
+
+
+map_cluster_cache = MapClusterCache()
+invalidation_bus.subscribe(MAP_DEVICES_TOPIC, map_cluster_cache.invalidate)
+
+
+async def invalidate_map_devices(*map_ids: Optional[int]) -> None:
+    """Сбрасывает кластеры карт во всех воркерах — после изменения устройств (после commit)."""
+    for map_id in {m for m in map_ids if m is not None}:
+        await invalidation_bus.publish(MAP_DEVICES_TOPIC, str(map_id))
+
+
+async def get_map_devices(session: AsyncSession, map_id: int, zoom: int, viewport: Optional[Viewport], *,
+                          grid: int, max_zoom: int, max_markers: int, ttl: float,
+                          primary: Optional[AsyncSession] = None) -> dict:
+    """
+    Устройства карты в окне просмотра: отдельные маркеры на максимальном zoom или если
+    их в окне не больше max_markers, иначе кластеры ячеек, задевающих окно.
+    session — для маркеров (может быть репликой), primary — для сводки в кэш (по умолчанию session).
+    """
+    zoom = max(0, min(zoom, max_zoom))
+    size = cell_size(zoom, grid)
+    response = {'map_id': map_id, 'zoom': zoom, 'cell_size': size}
+    if zoom == max_zoom:
+        return await _markers(session, map_id, viewport, response)
+
+    cells = map_cluster_cache.get(map_id, zoom, ttl)
+    if cells is None:
+        generation = map_cluster_cache.generation(map_id)
+        cells = await map_cluster_rows(primary or session, map_id, size)
+        map_cluster_cache.put(map_id, zoom, cells, generation)
+
+    if viewport is not None:
+        min_x, min_y, max_x, max_y = viewport
+        c0, c1 = min_x // size, max_x // size
+        r0, r1 = min_y // size, max_y // size
+        cells = [cell for cell in cells if c0 <= cell[0] <= c1 and r0 <= cell[1] <= r1]
+    # Ячейки на краю окна задевают его частично — оценка сверху
+    total = sum(cell[2] for cell in cells)
+    if total <= max_markers:
+        return await _markers(session, map_id, viewport, response)
+    response.update(mode='clusters', total=total, devices=[], clusters=[
+        {'cell': [int(cx), int(cy)], 'x': x, 'y': y, 'count': count, 'status': rank_status(rank),
+         'device_id': first_id if count == 1 else None}
+        for cx, cy, count, x, y, rank, first_id in cells
+    ])
+    return response
+
+
+async def _markers(session: AsyncSession, map_id: int, viewport: Optional[Viewport], response: dict) -> dict:
+    devices = await map_device_markers(session, map_id, viewport)
+    response.update(mode='devices', total=len(devices), devices=devices, clusters=[])
+    return response
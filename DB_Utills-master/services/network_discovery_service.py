@@ -1,6 +1,7 @@
 """
 Network Discovery Service — сканирование подсети через ICMP + ARP + SNMP.
 ICMP обходит все адреса в подсети; ARP даёт MAC; SNMP — детали (если доступен).
+В режиме sweep вместо ICMP на все адреса рассылается sysDescr GET с одного UDP-сокета.
 """
 import asyncio
 import ipaddress
@@ -10,11 +11,23 @@ import re
 import subprocess
 import sys
 import time
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, List, Optional, Set
+from contextlib import aclosing
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-# Максимум хостов за один проход (защита от случайного /8)
-_MAX_SUBNET_HOSTS = 4094
+from services.oui_registry import lookup_vendor
+from services.port_fingerprint import probe_ports
+from services.snmp_sweep import iter_snmp_sweep
+from services.sysdescr_classifier import classify_sys_descr
+
+# Максимум хостов за один проход (защита от случайного /8); /16 проходит
+_MAX_SUBNET_HOSTS = 65534
+
+# Размер очередей между стадиями конвейера discovery
+_PIPELINE_QUEUE_SIZE = 256
+
+# icmp — ping всех адресов; sweep — SNMP GET всех адресов; both — оба способа
+_DISCOVERY_MODES = ('icmp', 'sweep', 'both')
 
 logger = logging.getLogger(__name__)
 
@@ -38,52 +51,6 @@ SYSTEM_OIDS = {
     'sysServices': '1.3.6.1.2.1.1.7.0',
 }
 
-_MANUFACTURER_PATTERNS: List[tuple[str, str]] = [
-    (r'\bcisco\b', 'Cisco'),
-    (r'\bjuniper\b', 'Juniper'),
-    (r'\bhuawei\b', 'Huawei'),
-    (r'\bmikrotik\b', 'MikroTik'),
-    (r'\bhp\b|hewlett.packard|\bhpe\b', 'HP'),
-    (r'\bdell\b', 'Dell'),
-    (r'\blenovo\b', 'Lenovo'),
-    (r'\baruba\b', 'Aruba'),
-    (r'\bfortinet\b|fortigate', 'Fortinet'),
-    (r'\bzyxel\b', 'Zyxel'),
-    (r'\bd-?link\b', 'D-Link'),
-    (r'\btp-?link\b', 'TP-Link'),
-    (r'\bnetgear\b', 'Netgear'),
-    (r'\bcanon\b', 'Canon'),
-    (r'\bepson\b', 'Epson'),
-    (r'\bbrother\b', 'Brother'),
-    (r'\bxerox\b', 'Xerox'),
-    (r'\bricoh\b', 'Ricoh'),
-    (r'\bkyocera\b', 'Kyocera'),
-    (r'\bsamsung\b', 'Samsung'),
-    (r'\bwindows\b', 'Microsoft'),
-    (r'\blinux\b', 'Linux'),
-    (r'\bfreebsd\b', 'FreeBSD'),
-    (r'\bubiquiti\b|unifi|edgeswitch', 'Ubiquiti'),
-    (r'\bqnap\b', 'QNAP'),
-    (r'\bsynology\b', 'Synology'),
-    (r'\bapc\b|smart-?ups', 'APC'),
-]
-
-_DEVICE_TYPE_PATTERNS: List[tuple[str, str]] = [
-    (r'router|маршрутизатор', 'Router'),
-    (r'switch|коммутатор', 'Switch'),
-    (r'access.point|wireless|wi-?fi', 'Access Point'),
-    (r'printer|принтер|laserjet|imagerunner|mfp', 'Printer'),
-    (r'firewall|fortigate|asa', 'Firewall'),
-    (r'ups|smart-?ups|источник бесп', 'UPS'),
-    (r'nas|storage|diskstation', 'NAS'),
-    (r'windows.*server|linux.*server|freebsd', 'Server'),
-    (r'windows', 'Computer'),
-    (r'linux', 'Computer'),
-    (r'camera|видеокамера|ipcam', 'Camera'),
-    (r'phone|телефон|voip', 'Phone'),
-]
-
-
 @dataclass
 class DiscoveredDevice:
     ip: str
@@ -102,22 +69,9 @@ class DiscoveredDevice:
     # Как хост попал в список (для UI; SNMP — отдельно через has_snmp)
     seen_icmp: bool = False
     seen_arp: bool = False
-
-
-def _guess_manufacturer(sys_descr: str) -> str:
-    lower = sys_descr.lower()
-    for pattern, name in _MANUFACTURER_PATTERNS:
-        if re.search(pattern, lower):
-            return name
-    return ''
-
-
-def _guess_device_type(sys_descr: str) -> str:
-    lower = sys_descr.lower()
-    for pattern, dtype in _DEVICE_TYPE_PATTERNS:
-        if re.search(pattern, lower):
-            return dtype
-    return ''
+    seen_sweep: bool = False
+    # Открытые TCP-порты (только для хостов без SNMP)
+    open_ports: List[int] = field(default_factory=list)
 
 
 def _format_uptime(ticks_str: str) -> str:
@@ -272,42 +226,9 @@ async def _icmp_reachable(ip: str, timeout_ms: int) -> bool:
     return proc.returncode == 0
 
 
-async def _ping_sweep(
-    host_ips: List[str],
-    timeout_ms: int,
-    concurrency: int,
-) -> Set[str]:
-    """Параллельный ICMP по списку адресов."""
-    sem = asyncio.Semaphore(concurrency)
-
-    async def probe(addr: str) -> Optional[str]:
-        async with sem:
-            return addr if await _icmp_reachable(addr, timeout_ms) else None
-
-    results = await asyncio.gather(*[probe(ip) for ip in host_ips])
-    return {ip for ip in results if ip}
-
-
-# Well-known MAC OUI prefixes for manufacturer guessing when SNMP unavailable
-_MAC_OUI_VENDORS: List[tuple[str, str]] = [
-    ('b0:95:75', 'TP-Link'), ('50:c7:bf', 'TP-Link'), ('ec:41:18', 'TP-Link'),
-    ('fc:3c:d7', 'Xiaomi'), ('78:11:dc', 'Xiaomi'), ('64:cc:2e', 'Xiaomi'),
-    ('90:de:80', 'Samsung'), ('8c:f5:a3', 'Samsung'), ('bc:72:b1', 'Samsung'),
-    ('dc:97:58', 'Huawei'), ('48:46:fb', 'Huawei'), ('00:e0:fc', 'Huawei'),
-    ('a4:83:e7', 'Apple'), ('3c:06:30', 'Apple'), ('f0:18:98', 'Apple'),
-    ('d8:bb:c1', 'Apple'), ('ac:bc:32', 'Apple'), ('38:f9:d3', 'Apple'),
-    ('00:50:56', 'VMware'), ('00:0c:29', 'VMware'),
-    ('b8:27:eb', 'Raspberry Pi'), ('dc:a6:32', 'Raspberry Pi'),
-    ('7e:ca:82', 'Android'), ('6e:a1:a1', 'Android'),
-]
-
-
 def _guess_vendor_from_mac(mac: str) -> str:
-    prefix = mac[:8]
-    for oui, vendor in _MAC_OUI_VENDORS:
-        if prefix == oui:
-            return vendor
-    return ''
+    """Производитель по OUI из реестра IEEE (data/oui.bin, загружается при первом вызове)."""
+    return lookup_vendor(mac) if mac else ''
 
 
 async def _try_resolve_hostname(ip: str) -> str:
@@ -327,6 +248,112 @@ async def _try_resolve_hostname(ip: str) -> str:
     return ''
 
 
+def _parse_subnet(subnet: str) -> ipaddress.IPv4Network:
+    try:
+        network = ipaddress.IPv4Network(subnet, strict=False)
+    except ValueError as exc:
+        raise ValueError(f"Invalid subnet: {exc}")
+    if _host_count(network) > _MAX_SUBNET_HOSTS:
+        raise ValueError(
+            f'Subnet too large: at most {_MAX_SUBNET_HOSTS} addresses per scan',
+        )
+    return network
+
+
+def normalize_subnet(subnet: str) -> str:
+    """Каноническая запись подсети (ключ сохранённых результатов сканирования)."""
+    return str(_parse_subnet(subnet))
+
+
+def subnet_host_count(subnet: str) -> int:
+    """Сколько адресов будет опрошено в подсети."""
+    return _host_count(_parse_subnet(subnet))
+
+
+def _iter_addresses(network: ipaddress.IPv4Network, priority: Optional[List[str]] = None):
+    """Адреса подсети; сначала priority (известные живые хосты), затем остальные без повторов."""
+    first: List[str] = []
+    for ip in priority or ():
+        try:
+            if ipaddress.IPv4Address(ip) in network:
+                first.append(ip)
+        except ValueError:
+            continue
+    skip = set(first)
+    yield from first
+    for addr in network.hosts():
+        ip = str(addr)
+        if ip not in skip:
+            yield ip
+
+
+def _host_count(network: ipaddress.IPv4Network) -> int:
+    """Число адресов, которые вернёт network.hosts(), без их перечисления."""
+    if network.prefixlen >= 31:
+        return network.num_addresses
+    return network.num_addresses - 2
+
+
+@dataclass
+class _LiveHost:
+    """Живой хост между стадиями probe и enrichment."""
+    ip: str
+    seen_icmp: bool = False
+    seen_arp: bool = False
+    sweep_info: Optional[dict] = None
+
+
+@dataclass
+class DiscoveryProgress:
+    """Счётчики прохода; обновляются конвейером по мере сканирования."""
+    total_scanned: int = 0
+    probed: int = 0
+    found: int = 0
+    with_snmp: int = 0
+    scanner_host_ip: str = ''
+    started_at: float = field(default_factory=time.time)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'total_scanned': self.total_scanned,
+            'total_found': self.found,
+            'scan_time': round(time.time() - self.started_at, 2),
+            'snmp_library_available': _SNMP_AVAILABLE,
+            'scanner_host_ip': self.scanner_host_ip,
+        }
+
+
+class _ArpCache:
+    """
+    MAC-адреса из 'arp -a' для подсети. Таблица перечитывается лениво,
+    не чаще refresh_interval, чтобы на /16 не запускать arp на каждый хост.
+    """
+
+    def __init__(self, subnet: str, refresh_interval: float = 1.0):
+        self.subnet = subnet
+        self.refresh_interval = refresh_interval
+        self.table: Dict[str, str] = {}
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _reload(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.table.update(await loop.run_in_executor(None, _parse_arp_table, self.subnet))
+        self._refreshed_at = time.monotonic()
+
+    async def refresh(self) -> Dict[str, str]:
+        async with self._lock:
+            await self._reload()
+        return self.table
+
+    async def lookup(self, ip: str) -> str:
+        if ip not in self.table:
+            async with self._lock:
+                if ip not in self.table and time.monotonic() - self._refreshed_at > self.refresh_interval:
+                    await self._reload()
+        return self.table.get(ip, '')
+
+
 class NetworkDiscoveryService:
     """Scans a subnet: ping to find live hosts, then SNMP for details."""
 
@@ -336,12 +363,17 @@ class NetworkDiscoveryService:
         retries: int = 0,
         concurrency: int = 50,
         snmp_concurrency: int = 20,
+        tcp_budget: int = 128,
+        tcp_timeout: float = 0.8,
     ):
         self.timeout = timeout
         self.retries = retries
         self.concurrency = concurrency
         # Меньше параллельных SNMP — стабильнее на Wi‑Fi и при строгом файрволе
         self.snmp_concurrency = max(1, snmp_concurrency)
+        # Одновременных TCP-соединений на весь проход при определении типа по портам
+        self.tcp_budget = max(1, tcp_budget)
+        self.tcp_timeout = tcp_timeout
 
     def _snmp_bind_attempts(self, local_bind: Optional[str]) -> List[Optional[str]]:
         """Сначала привязка к интерфейсу подсети, затем без привязки (ОС сама выберет исходящий адрес)."""
@@ -404,8 +436,23 @@ class NetworkDiscoveryService:
         port: int,
         communities: List[str],
         local_bind: Optional[str] = None,
+        sweep_info: Optional[dict] = None,
     ) -> Optional[dict]:
         """Try SNMP on a host. Returns dict with info or None."""
+        if sweep_info:
+            # sysDescr и community уже известны из sweep — догружаем остальное
+            info = dict(sweep_info)
+            if _SNMP_AVAILABLE:
+                oid_keys = ['sysName', 'sysUpTime', 'sysLocation', 'sysContact']
+                values = await asyncio.gather(*[
+                    self._snmp_get_one(
+                        engine, ip, port, info['community'], SYSTEM_OIDS[k], local_bind,
+                    )
+                    for k in oid_keys
+                ])
+                info.update(zip(oid_keys, values))
+            return info
+
         if not _SNMP_AVAILABLE:
             return None
 
@@ -441,142 +488,241 @@ class NetworkDiscoveryService:
     async def _enrich_host(
         self,
         engine,
-        ip: str,
-        mac: str,
+        host: '_LiveHost',
         port: int,
         communities: List[str],
-        semaphore: asyncio.Semaphore,
         local_bind: Optional[str],
-        seen_icmp: bool,
-        seen_arp: bool,
+        arp: '_ArpCache',
+        local_mac: str,
+        tcp_budget: asyncio.Semaphore,
     ) -> DiscoveredDevice:
-        """Для живого хоста: SNMP + обратный DNS."""
-        async with semaphore:
-            snmp_info = await self._snmp_probe(
-                engine, ip, port, communities, local_bind,
-            )
+        """
+        Для живого хоста: SNMP + обратный DNS; MAC — из ARP после опроса.
+        Без SNMP тип определяется по открытым TCP-портам (параллельно с DNS).
+        """
+        ip = host.ip
+        snmp_info = await self._snmp_probe(
+            engine, ip, port, communities, local_bind, host.sweep_info,
+        )
+        if snmp_info:
             hostname = await _try_resolve_hostname(ip)
+            open_ports, port_device_type = [], ''
+        else:
+            hostname, (open_ports, port_device_type) = await asyncio.gather(
+                _try_resolve_hostname(ip),
+                probe_ports(ip, tcp_budget, self.tcp_timeout),
+            )
+        # К этому моменту ядро уже знает MAC хоста, ответившего на ping/SNMP
+        mac = local_mac if ip == local_bind and local_mac else await arp.lookup(ip)
+        seen_arp = host.seen_arp or ip in arp.table
+
+        if snmp_info:
+            descr = snmp_info.get('sysDescr', '')
+            manufacturer_guess, device_type_guess = classify_sys_descr(descr)
+            return DiscoveredDevice(
+                ip=ip,
+                mac=mac,
+                name=snmp_info.get('sysName') or hostname,
+                description=descr,
+                manufacturer_guess=manufacturer_guess,
+                device_type_guess=device_type_guess,
+                uptime=_format_uptime(snmp_info.get('sysUpTime') or ''),
+                location=snmp_info.get('sysLocation') or '',
+                contact=snmp_info.get('sysContact') or '',
+                community=snmp_info.get('community', ''),
+                snmp_version='2c',
+                response_time_ms=0,
+                has_snmp=True,
+                seen_icmp=host.seen_icmp,
+                seen_arp=seen_arp,
+                seen_sweep=host.sweep_info is not None,
+            )
+        mac_vendor = _guess_vendor_from_mac(mac)
+        return DiscoveredDevice(
+            ip=ip,
+            mac=mac,
+            name=hostname,
+            description='',
+            manufacturer_guess=mac_vendor,
+            device_type_guess=port_device_type,
+            uptime='',
+            location='',
+            contact='',
+            community='',
+            snmp_version='',
+            response_time_ms=0,
+            has_snmp=False,
+            seen_icmp=host.seen_icmp,
+            seen_arp=seen_arp,
+            seen_sweep=host.sweep_info is not None,
+            open_ports=open_ports,
+        )
 
-            if snmp_info:
-                descr = snmp_info.get('sysDescr', '')
-                return DiscoveredDevice(
-                    ip=ip,
-                    mac=mac,
-                    name=snmp_info.get('sysName') or hostname,
-                    description=descr,
-                    manufacturer_guess=_guess_manufacturer(descr),
-                    device_type_guess=_guess_device_type(descr),
-                    uptime=_format_uptime(snmp_info.get('sysUpTime') or ''),
-                    location=snmp_info.get('sysLocation') or '',
-                    contact=snmp_info.get('sysContact') or '',
-                    community=snmp_info.get('community', ''),
-                    snmp_version='2c',
-                    response_time_ms=0,
-                    has_snmp=True,
-                    seen_icmp=seen_icmp,
-                    seen_arp=seen_arp,
-                )
-            else:
-                mac_vendor = _guess_vendor_from_mac(mac)
-                return DiscoveredDevice(
-                    ip=ip,
-                    mac=mac,
-                    name=hostname,
-                    description='',
-                    manufacturer_guess=mac_vendor,
-                    device_type_guess='',
-                    uptime='',
-                    location='',
-                    contact='',
-                    community='',
-                    snmp_version='',
-                    response_time_ms=0,
-                    has_snmp=False,
-                    seen_icmp=seen_icmp,
-                    seen_arp=seen_arp,
-                )
-
-    async def discover(
+    async def discover_stream(
         self,
         subnet: str,
         communities: Optional[List[str]] = None,
         port: int = 161,
         ping_timeout_ms: int = 1200,
-    ) -> Dict[str, Any]:
+        mode: str = 'icmp',
+        packets_per_second: int = 2000,
+        progress: Optional[DiscoveryProgress] = None,
+        priority_ips: Optional[List[str]] = None,
+    ) -> AsyncIterator[DiscoveredDevice]:
+        """
+        Конвейер: генератор адресов -> probe (ICMP и/или SNMP sweep) ->
+        enrichment (SNMP, DNS, ARP) -> потребитель. Между стадиями — очереди
+        ограниченного размера, адреса не материализуются, поэтому память не зависит
+        от размера подсети; хосты отдаются по мере готовности, без сортировки.
+        Растёт только множество уже найденных хостов (для дедупликации).
+        priority_ips (живые на прошлом проходе) опрашиваются первыми.
+        """
         if communities is None:
             communities = ['public']
-
-        try:
-            network = ipaddress.IPv4Network(subnet, strict=False)
-        except ValueError as exc:
-            raise ValueError(f"Invalid subnet: {exc}")
-
-        if network.version != 4:
-            raise ValueError('Only IPv4 subnets are supported for discovery')
-
-        host_ips = [str(h) for h in network.hosts()]
-        if len(host_ips) > _MAX_SUBNET_HOSTS:
-            raise ValueError(
-                f'Subnet too large: at most {_MAX_SUBNET_HOSTS} addresses per scan',
-            )
-
-        start_time = time.time()
-        loop = asyncio.get_running_loop()
-        total_scanned = len(host_ips)
+        if mode not in _DISCOVERY_MODES:
+            raise ValueError(f"Unknown discovery mode: {mode}")
+        network = _parse_subnet(subnet)
+        if progress is None:
+            progress = DiscoveryProgress()
+        progress.total_scanned = _host_count(network)
 
         local_ip, local_mac = _get_local_address(subnet)
-        arp_before = await loop.run_in_executor(None, _parse_arp_table, subnet)
-
-        alive = await _ping_sweep(host_ips, ping_timeout_ms, self.concurrency)
-
-        arp_after = await loop.run_in_executor(None, _parse_arp_table, subnet)
-        mac_by_ip: Dict[str, str] = {**arp_before, **arp_after}
-        if local_ip and local_mac:
-            mac_by_ip[local_ip] = local_mac
-
-        arp_seen_ips: Set[str] = set(arp_before.keys()) | set(arp_after.keys())
-
-        targets: Set[str] = set(alive)
-        targets.update(mac_by_ip.keys())
-        if local_ip:
-            targets.add(local_ip)
-
-        if not targets:
-            return {
-                'discovered': [],
-                'total_scanned': total_scanned,
-                'total_found': 0,
-                'scan_time': round(time.time() - start_time, 2),
-                'snmp_library_available': _SNMP_AVAILABLE,
-                'scanner_host_ip': local_ip or '',
-            }
-
-        engine = SnmpEngine() if _SNMP_AVAILABLE else None
-        snmp_sem = asyncio.Semaphore(self.snmp_concurrency)
-        sorted_ips = sorted(targets, key=lambda x: tuple(int(p) for p in x.split('.')))
+        progress.scanner_host_ip = local_ip or ''
         local_bind = local_ip or None
-
-        tasks = [
-            self._enrich_host(
-                engine,
-                ip,
-                mac_by_ip.get(ip, '') if ip != local_ip else (local_mac or mac_by_ip.get(ip, '')),
-                port,
+        arp = _ArpCache(subnet)
+        arp_before = dict(await arp.refresh())
+
+        live_queue: asyncio.Queue = asyncio.Queue(maxsize=_PIPELINE_QUEUE_SIZE)
+        out_queue: asyncio.Queue = asyncio.Queue(maxsize=_PIPELINE_QUEUE_SIZE)
+        live: Dict[str, _LiveHost] = {}
+        workers = self.snmp_concurrency
+        tcp_budget = asyncio.Semaphore(self.tcp_budget)
+
+        async def submit(ip: str, icmp: bool = False, arp_hit: bool = False,
+                         sweep_info: Optional[dict] = None) -> None:
+            host = live.get(ip)
+            if host is not None:
+                # Хост уже в очереди enrichment — только дополняем признаки
+                host.seen_icmp = host.seen_icmp or icmp
+                host.seen_arp = host.seen_arp or arp_hit
+                host.sweep_info = host.sweep_info or sweep_info
+                return
+            host = _LiveHost(ip, seen_icmp=icmp, seen_arp=arp_hit, sweep_info=sweep_info)
+            live[ip] = host
+            await live_queue.put(host)
+
+        async def ping_probe() -> None:
+            addr_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+            async def feeder() -> None:
+                # ICMP тоже ограничен packets_per_second — плановые проходы растягиваются по окну
+                interval = 1.0 / max(1, int(packets_per_second))
+                next_at = time.monotonic()
+                for ip in _iter_addresses(network, priority_ips):
+                    now = time.monotonic()
+                    if next_at - now > 0.001:
+                        await asyncio.sleep(next_at - now)
+                    next_at = max(next_at, now - interval) + interval
+                    await addr_queue.put(ip)
+                for _ in range(self.concurrency):
+                    await addr_queue.put(None)
+
+            async def pinger() -> None:
+                while (ip := await addr_queue.get()) is not None:
+                    progress.probed += 1
+                    if await _icmp_reachable(ip, ping_timeout_ms):
+                        await submit(ip, icmp=True)
+
+            await asyncio.gather(feeder(), *[pinger() for _ in range(self.concurrency)])
+
+        async def sweep_probe() -> None:
+            sweep = iter_snmp_sweep(
+                _iter_addresses(network, priority_ips),
                 communities,
-                snmp_sem,
-                local_bind,
-                ip in alive,
-                ip in arp_seen_ips,
+                port=port,
+                packets_per_second=packets_per_second,
+                timeout=self.timeout,
+                local_bind=local_bind,
             )
-            for ip in sorted_ips
-        ]
-        results = await asyncio.gather(*tasks)
-
-        if (
-            _SNMP_AVAILABLE
-            and results
-            and not any(d.has_snmp for d in results)
-        ):
+            async with aclosing(sweep):
+                async for ip, info in sweep:
+                    await submit(ip, sweep_info=info)
+
+        async def probe_stage() -> None:
+            try:
+                if local_ip:
+                    await submit(local_ip)
+                for ip in arp_before:
+                    await submit(ip, arp_hit=True)
+                probes = []
+                if mode in ('icmp', 'both'):
+                    probes.append(ping_probe())
+                if mode in ('sweep', 'both'):
+                    probes.append(sweep_probe())
+                await asyncio.gather(*probes)
+                for ip in list(await arp.refresh()):
+                    await submit(ip, arp_hit=True)
+            finally:
+                for _ in range(workers):
+                    await live_queue.put(None)
+
+        async def enrich_worker(engine) -> None:
+            try:
+                while (host := await live_queue.get()) is not None:
+                    device = await self._enrich_host(
+                        engine, host, port, communities, local_bind, arp, local_mac, tcp_budget,
+                    )
+                    await out_queue.put(device)
+            finally:
+                await out_queue.put(None)
+
+        engine = SnmpEngine() if _SNMP_AVAILABLE else None
+        tasks = [asyncio.create_task(probe_stage())]
+        tasks += [asyncio.create_task(enrich_worker(engine)) for _ in range(workers)]
+        try:
+            finished = 0
+            while finished < workers:
+                device = await out_queue.get()
+                if device is None:
+                    finished += 1
+                    continue
+                progress.found += 1
+                if device.has_snmp:
+                    progress.with_snmp += 1
+                yield device
+            # Пробрасываем ошибки стадий, если они были
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def discover(
+        self,
+        subnet: str,
+        communities: Optional[List[str]] = None,
+        port: int = 161,
+        ping_timeout_ms: int = 1200,
+        mode: str = 'icmp',
+        packets_per_second: int = 2000,
+        priority_ips: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Полный проход конвейера; результат отсортирован по IP."""
+        progress = DiscoveryProgress()
+        stream = self.discover_stream(
+            subnet,
+            communities=communities,
+            port=port,
+            ping_timeout_ms=ping_timeout_ms,
+            mode=mode,
+            packets_per_second=packets_per_second,
+            progress=progress,
+            priority_ips=priority_ips,
+        )
+        async with aclosing(stream):
+            results = [d async for d in stream]
+
+        if _SNMP_AVAILABLE and results and not progress.with_snmp:
             logger.warning(
                 'SNMP: ни один из %d хостов не ответил. Частые причины: брандмауэр на машине '
                 'с Backend (исходящий UDP 161 для python.exe), неверный community, на цели '
@@ -586,13 +732,8 @@ class NetworkDiscoveryService:
 
         discovered = [asdict(d) for d in results]
         discovered.sort(key=lambda d: tuple(int(p) for p in d['ip'].split('.')))
-        scan_time = round(time.time() - start_time, 2)
-
         return {
             'discovered': discovered,
-            'total_scanned': total_scanned,
-            'total_found': len(discovered),
-            'scan_time': scan_time,
-            'snmp_library_available': _SNMP_AVAILABLE,
-            'scanner_host_ip': local_ip or '',
+            'subnet': normalize_subnet(subnet),
+            **progress.summary(),
         }
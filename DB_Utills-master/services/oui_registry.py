@@ -0,0 +1,239 @@
+"""
+Реестр OUI (IEEE MA-L / MA-M / MA-S) для определения производителя по MAC.
+
+Реестр хранится в data/oui.bin в компактном виде: отсортированные массивы
+24-, 28- и 36-битных префиксов и параллельные массивы индексов производителей.
+Файл отображается в память (mmap) при первом обращении, поиск — бинарный,
+от самого длинного префикса к короткому.
+
+Пересборка из выгрузок IEEE (https://standards-oui.ieee.org/):
+    python -m services.oui_registry oui.csv mam.csv oui36.csv
+Если в загруженном реестре меньше _MIN_FULL_REGISTRY префиксов (собран только
+из ручных дополнений), в лог пишется предупреждение с этой командой.
+Ручные дополнения (например, случайные MAC Android) — data/oui_seed.csv
+в том же формате, записи IEEE имеют приоритет.
+"""
+import array
+import bisect
+import csv
+import logging
+import mmap
+import re
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+OUI_DB_PATH = DATA_DIR / 'oui.bin'
+OUI_SEED_PATH = DATA_DIR / 'oui_seed.csv'
+
+logger = logging.getLogger(__name__)
+
+# Полный реестр IEEE — десятки тысяч префиксов; меньше — собран без выгрузок IEEE
+_MIN_FULL_REGISTRY = 10000
+_REBUILD_HINT = 'rebuild it from the IEEE exports: python -m services.oui_registry oui.csv mam.csv oui36.csv'
+
+_MAGIC = b'OUIX'
+_VERSION = 1
+# magic, version, reserved, MA-L, MA-M, MA-S, число производителей
+_HEADER = struct.Struct('<4sHHIIII')
+
+# Длина Assignment (hex-цифр) в выгрузке IEEE -> длина префикса в битах
+_PREFIX_BITS_BY_DIGITS = {6: 24, 7: 28, 9: 36}
+
+_VENDOR_SUFFIXES = re.compile(
+    r'[\s,.]+(co\.?,?\s*ltd|corporation|corp|incorporated|inc|ltd|llc|gmbh|ag|s\.?a|'
+    r'limited|technologies|technology|electronics|international|company)\.?$',
+    re.IGNORECASE,
+)
+
+
+def _short_vendor_name(name: str) -> str:
+    """'TP-LINK TECHNOLOGIES CO.,LTD.' -> 'TP-LINK': убираем юридические суффиксы."""
+    name = ' '.join(name.split())
+    while True:
+        short = _VENDOR_SUFFIXES.sub('', name).strip(' ,.')
+        if short == name or not short:
+            return name
+        name = short
+
+
+def _align(buf: bytearray, boundary: int = 8) -> None:
+    buf.extend(b'\0' * (-len(buf) % boundary))
+
+
+class OuiIndex:
+    """Отсортированные массивы префиксов поверх mmap; поиск — bisect по memoryview."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, version, _reserved, n_l, n_m, n_s, n_vendors = _HEADER.unpack_from(buffer, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('Unsupported OUI database format')
+        view = memoryview(buffer)
+        offset = _HEADER.size
+        offset += -offset % 8
+
+        def take(count: int, fmt: str):
+            nonlocal offset
+            size = count * struct.calcsize(fmt)
+            part = view[offset:offset + size].cast(fmt)
+            offset += size
+            offset += -offset % 8
+            return part
+
+        # (число бит префикса, ключи, индексы производителей) — от длинного к короткому
+        keys_l, vendors_l = take(n_l, 'I'), take(n_l, 'I')
+        keys_m, vendors_m = take(n_m, 'I'), take(n_m, 'I')
+        keys_s, vendors_s = take(n_s, 'Q'), take(n_s, 'I')
+        self._tables = ((36, keys_s, vendors_s), (28, keys_m, vendors_m), (24, keys_l, vendors_l))
+        self._name_offsets = take(n_vendors + 1, 'I')
+        self._names = view[offset:]
+        self._name_cache: Dict[int, str] = {}
+        self.size = n_l + n_m + n_s
+
+    def _vendor_name(self, index: int) -> str:
+        name = self._name_cache.get(index)
+        if name is None:
+            start, end = self._name_offsets[index], self._name_offsets[index + 1]
+            name = bytes(self._names[start:end]).decode('utf-8')
+            self._name_cache[index] = name
+        return name
+
+    def lookup(self, mac: str) -> str:
+        value = _mac_to_int(mac)
+        if value is None:
+            return ''
+        for bits, keys, vendors in self._tables:
+            key = value >> (48 - bits)
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                return self._vendor_name(vendors[i])
+        return ''
+
+
+def _mac_to_int(mac: str) -> Optional[int]:
+    digits = ''.join(c for c in mac if c not in ':-. ')
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+_index: Optional[OuiIndex] = None
+_index_lock = threading.Lock()
+_index_failed = False
+
+
+def get_index() -> Optional[OuiIndex]:
+    """Открывает data/oui.bin при первом обращении; None, если файла нет."""
+    global _index, _index_failed
+    if _index is not None or _index_failed:
+        return _index
+    with _index_lock:
+        if _index is None and not _index_failed:
+            try:
+                with open(OUI_DB_PATH, 'rb') as f:
+                    if sys.byteorder == 'little':
+                        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    else:
+                        buffer = _to_native(f.read())
+                _index = OuiIndex(buffer)
+            except (OSError, ValueError) as exc:
+                _index_failed = True
+                logger.warning('OUI registry %s is unavailable (%s), MAC vendors will be empty; %s',
+                               OUI_DB_PATH, exc, _REBUILD_HINT)
+            else:
+                if _index.size < _MIN_FULL_REGISTRY:
+                    logger.warning('OUI registry %s holds only %d prefixes (seed entries), most MAC vendors '
+                                   'will be empty; %s', OUI_DB_PATH, _index.size, _REBUILD_HINT)
+    return _index
+
+
+def _to_native(data: bytes) -> bytes:
+    """Файл всегда little-endian; на big-endian разворачиваем массивы в памяти."""
+    _magic, _version, _reserved, n_l, n_m, n_s, n_vendors = _HEADER.unpack_from(data, 0)
+    out = bytearray(data[:_HEADER.size])
+    _align(out)
+    offset = len(out)
+    for count, code in ((n_l, 'I'), (n_l, 'I'), (n_m, 'I'), (n_m, 'I'), (n_s, 'Q'), (n_s, 'I'),
+                        (n_vendors + 1, 'I')):
+        arr = array.array(code)
+        size = count * arr.itemsize
+        arr.frombytes(data[offset:offset + size])
+        arr.byteswap()
+        out.extend(arr.tobytes())
+        offset += size + (-(offset + size) % 8)
+        _align(out)
+    out.extend(data[offset:])
+    return bytes(out)
+
+
+def lookup_vendor(mac: str) -> str:
+    """Производитель по MAC ('' — не найден или реестр не собран)."""
+    index = get_index()
+    return index.lookup(mac) if index is not None else ''
+
+
+def read_registry_csv(path: Path) -> Iterable[Tuple[int, int, str]]:
+    """(бит префикса, префикс, производитель) из CSV выгрузки IEEE."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            assignment = (row.get('Assignment') or '').strip()
+            bits = _PREFIX_BITS_BY_DIGITS.get(len(assignment))
+            name = (row.get('Organization Name') or '').strip()
+            if bits is None or not name:
+                continue
+            try:
+                yield bits, int(assignment, 16), _short_vendor_name(name)
+            except ValueError:
+                continue
+
+
+def build_database(sources: List[Path], output: Path = OUI_DB_PATH) -> int:
+    """Собирает oui.bin; при повторе префикса побеждает первый источник."""
+    prefixes: Dict[int, Dict[int, str]] = {24: {}, 28: {}, 36: {}}
+    for source in sources:
+        for bits, prefix, name in read_registry_csv(source):
+            prefixes[bits].setdefault(prefix, name)
+
+    vendor_ids: Dict[str, int] = {}
+    sections = []
+    for bits in (24, 28, 36):
+        entries = sorted(prefixes[bits].items())
+        keys = array.array('Q' if bits == 36 else 'I', (p for p, _ in entries))
+        vendors = array.array('I', (vendor_ids.setdefault(n, len(vendor_ids)) for _, n in entries))
+        sections.append((keys, vendors))
+
+    names = bytearray()
+    name_offsets = array.array('I', [0])
+    for name in vendor_ids:  # dict сохраняет порядок присвоения индексов
+        names.extend(name.encode('utf-8'))
+        name_offsets.append(len(names))
+
+    out = bytearray(_HEADER.pack(
+        _MAGIC, _VERSION, 0,
+        len(sections[0][0]), len(sections[1][0]), len(sections[2][0]), len(vendor_ids),
+    ))
+    _align(out)
+    for part in (*sections[0], *sections[1], *sections[2], name_offsets):
+        if sys.byteorder != 'little':
+            part = array.array(part.typecode, part)
+            part.byteswap()
+        out.extend(part.tobytes())
+        _align(out)
+    out.extend(names)
+    output.write_bytes(bytes(out))
+    return sum(len(keys) for keys, _ in sections)
+
+
+if __name__ == '__main__':
+    csv_sources = [Path(p) for p in sys.argv[1:]]
+    if OUI_SEED_PATH.exists():
+        csv_sources.append(OUI_SEED_PATH)
+    total = build_database(csv_sources)
+    print(f'{OUI_DB_PATH}: {total} prefixes')
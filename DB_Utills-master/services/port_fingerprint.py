@@ -0,0 +1,90 @@
+"""
+Определение типа устройства по открытым TCP-портам — для хостов без SNMP.
+
+На хост параллельно открываются TCP-соединения к короткому списку портов;
+общее число одновременных соединений ограничено семафором на весь проход.
+Как только набор открытых портов однозначно определяет тип (сигнатуры более
+высокого приоритета уже не могут совпасть), оставшиеся попытки отменяются.
+"""
+import asyncio
+from typing import FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Порядок — очередь на семафоре: самые характерные порты первыми
+FINGERPRINT_PORTS: Tuple[int, ...] = (9100, 554, 3389, 631, 445, 22, 80, 443)
+
+# (обязательные открытые порты, тип устройства) — побеждает первая совпавшая
+_PORT_SIGNATURES: Sequence[Tuple[FrozenSet[int], str]] = (
+    (frozenset({9100}), 'Printer'),      # RAW/JetDirect
+    (frozenset({631, 80}), 'Printer'),   # IPP + веб-интерфейс
+    (frozenset({631, 443}), 'Printer'),
+    (frozenset({554}), 'Camera'),        # RTSP
+    (frozenset({3389}), 'Computer'),     # RDP
+    (frozenset({445, 22}), 'Server'),    # Samba на Linux / NAS
+    (frozenset({445}), 'Computer'),      # SMB без RDP — рабочая станция Windows
+    (frozenset({22}), 'Server'),
+)
+
+
+def _decide(open_ports: Set[int], pending: Set[int]) -> Optional[str]:
+    """
+    Тип по уже открытым портам или None, если ответ ещё может измениться:
+    сигнатура выше по приоритету совпадёт, если откроются ожидающие порты.
+    '' — ни одна сигнатура совпасть уже не может.
+    """
+    for required, device_type in _PORT_SIGNATURES:
+        if required <= open_ports:
+            return device_type
+        if required <= open_ports | pending:
+            return None
+    return ''
+
+
+def device_type_from_ports(open_ports: Iterable[int]) -> str:
+    """Тип устройства по полному набору открытых портов ('' — неизвестен)."""
+    return _decide(set(open_ports), set()) or ''
+
+
+async def _tcp_open(ip: str, port: int, timeout: float, budget: asyncio.Semaphore) -> bool:
+    async with budget:
+        try:
+            _reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+
+async def probe_ports(
+    ip: str,
+    budget: asyncio.Semaphore,
+    timeout: float = 0.8,
+    ports: Sequence[int] = FINGERPRINT_PORTS,
+) -> Tuple[List[int], str]:
+    """
+    TCP connect на ports хоста в пределах общего budget.
+    Возвращает (открытые порты по возрастанию, тип устройства); при раннем
+    выходе в списке только порты, проверенные до решения.
+    """
+    tasks = {asyncio.create_task(_tcp_open(ip, port, timeout, budget)): port for port in ports}
+    open_ports: Set[int] = set()
+    pending = set(ports)
+    waiting = set(tasks)
+    device_type: Optional[str] = None
+    try:
+        while waiting and device_type is None:
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                port = tasks[task]
+                pending.discard(port)
+                if task.result():
+                    open_ports.add(port)
+            device_type = _decide(open_ports, pending)
+    finally:
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+    return sorted(open_ports), device_type or ''
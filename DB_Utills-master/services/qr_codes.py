@@ -0,0 +1,228 @@
+"""
+QR-коды оборудования: одиночные (PNG / SVG) и листы наклеек (PDF / ZIP).
+
+Одиночный код зависит только от URL (FRONTEND_URL + id устройства) и формата,
+поэтому готовые байты кэшируются по (id, URL, формат), а ETag считается из тех
+же значений без отрисовки — повторный запрос с If-None-Match отвечается 304.
+Отрисовка идёт в пуле потоков, а не в цикле событий.
+
+Лист наклеек на сотни и тысячи устройств рисуется целиком в пуле процессов
+(LabelRenderer): Pillow и построение матриц QR держат GIL, и в потоке такой
+лист тормозил бы остальные запросы воркера. Очередь ограничена семафором —
+лишние запросы получают 503. Функции отрисовки — верхнего уровня: дочерний
+процесс (spawn) получает их по имени модуля, а модуль не импортирует модели и базу.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import qrcode
+import qrcode.image.svg
+
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+LABEL_FORMATS = {"pdf": "application/pdf", "zip": "application/zip"}
+
+# Сколько одиночных кодов держать в памяти
+_QR_CACHE_SIZE = 2048
+
+# Лист A4 при 150 dpi: 3 x 7 наклеек
+_PAGE_SIZE = (1240, 1754)
+_DPI = 150
+_COLUMNS, _ROWS = 3, 7
+_MARGIN = 60
+
+Label = Tuple[int, str, str, str]  # id, URL, название, помещение
+
+
+def equipment_url(frontend_url: str, device_id: int) -> str:
+    return f"{frontend_url}/equipment/{device_id}"
+
+
+def _qr(url: str, mask_pattern: Optional[int] = None) -> qrcode.QRCode:
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4,
+                       mask_pattern=mask_pattern)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr(url: str, fmt: str) -> bytes:
+    """Код для одного URL: PNG или SVG (вектор, масштабируется при печати)."""
+    qr = _qr(url)
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _batch_qr_image(url: str, side: Optional[int] = None):
+    """
+    Код для листа наклеек: маска 0 вместо перебора всех восьми (перебор — восемь
+    полных кодирований с подсчётом штрафов, ~85% времени) и картинка сразу из
+    матрицы, а не по квадрату на модуль. Любая маска допустима стандартом.
+    side None — 10 пикселей на модуль, как у одиночного PNG.
+    """
+    from PIL import Image
+    matrix = _qr(url, mask_pattern=0).get_matrix()
+    n = len(matrix)
+    image = Image.new("1", (n, n))
+    image.putdata([0 if module else 255 for row in matrix for module in row])
+    side = side or 10 * n
+    return image.resize((side, side), Image.NEAREST)
+
+
+def qr_etag(url: str, fmt: str) -> str:
+    return '"qr-' + hashlib.blake2b(f"{fmt}:{url}".encode(), digest_size=12).hexdigest() + '"'
+
+
+class QRCache:
+    """Готовые коды по (id устройства, URL, формат)"""
+
+    def __init__(self):
+        self._codes: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    async def get(self, device_id: int, url: str, fmt: str) -> bytes:
+        key = (device_id, url, fmt)
+        body = self._codes.get(key)
+        if body is not None:
+            self._codes.move_to_end(key)
+            return body
+        body = await asyncio.get_running_loop().run_in_executor(None, render_qr, url, fmt)
+        self._codes[key] = body
+        while len(self._codes) > _QR_CACHE_SIZE:
+            self._codes.popitem(last=False)
+        return body
+
+
+qr_cache = QRCache()
+
+
+# Шрифты с кириллицей, которые Pillow находит по имени в системных каталогах (Linux / Windows)
+_SYSTEM_FONTS = ("DejaVuSans.ttf", "arial.ttf")
+
+
+def _font(size: int, font_path: str):
+    from PIL import ImageFont
+    for path in (font_path, *_SYSTEM_FONTS):
+        if path:
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                pass
+    # Встроенный шрифт Pillow — без кириллицы
+    return ImageFont.load_default(size=size)
+
+
+def _fit(draw, text: str, font, width: int) -> str:
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def _wrap(draw, text: str, font, width: int, lines: int) -> List[str]:
+    """Не больше lines строк по словам; остаток последней строки обрезается."""
+    result, words = [], text.split()
+    while words and len(result) < lines - 1:
+        line = words.pop(0)
+        while words and draw.textlength(line + " " + words[0], font=font) <= width:
+            line += " " + words.pop(0)
+        result.append(_fit(draw, line, font, width))
+    if words:
+        result.append(_fit(draw, " ".join(words), font, width))
+    return result
+
+
+def _label_pages(labels: Sequence[Label], font_path: str) -> list:
+    from PIL import Image, ImageDraw
+    cell_w = (_PAGE_SIZE[0] - 2 * _MARGIN) // _COLUMNS
+    cell_h = (_PAGE_SIZE[1] - 2 * _MARGIN) // _ROWS
+    qr_side = cell_h - 40
+    text_w = cell_w - qr_side - 30
+    title_font, small_font = _font(26, font_path), _font(20, font_path)
+    per_page = _COLUMNS * _ROWS
+    pages = []
+    for start in range(0, len(labels), per_page):
+        page = Image.new("1", _PAGE_SIZE, 1)
+        draw = ImageDraw.Draw(page)
+        for n, (device_id, url, name, room) in enumerate(labels[start:start + per_page]):
+            x = _MARGIN + (n % _COLUMNS) * cell_w
+            y = _MARGIN + (n // _COLUMNS) * cell_h
+            draw.rectangle((x, y, x + cell_w - 4, y + cell_h - 4), outline=0)
+            page.paste(_batch_qr_image(url, qr_side), (x + 16, y + 16))
+            tx, ty = x + qr_side + 20, y + 36
+            for line in _wrap(draw, name, title_font, text_w, 2):
+                draw.text((tx, ty), line, font=title_font, fill=0)
+                ty += 34
+            draw.text((tx, ty + 10), f"#{device_id}", font=small_font, fill=0)
+            if room:
+                draw.text((tx, ty + 40), _fit(draw, room, small_font, text_w), font=small_font, fill=0)
+        pages.append(page)
+    return pages
+
+
+def render_label_sheet(labels: Sequence[Label], fmt: str, font_path: str = "") -> bytes:
+    """Наклейки: PDF (листы A4, 3 x 7 на листе) или ZIP с PNG-кодом каждого устройства."""
+    buffer = io.BytesIO()
+    if fmt == "zip":
+        # PNG уже сжат — хранить без повторного сжатия
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+            for device_id, url, _name, _room in labels:
+                png = io.BytesIO()
+                _batch_qr_image(url).save(png, format="PNG")
+                archive.writestr(f"qr_{device_id}.png", png.getvalue())
+        return buffer.getvalue()
+    pages = _label_pages(labels, font_path)
+    pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:], resolution=_DPI)
+    return buffer.getvalue()
+
+
+class LabelQueueFull(Exception):
+    """Все процессы отрисовки заняты дольше допустимого ожидания"""
+
+
+class LabelRenderer:
+    """Пул процессов для листов наклеек с ограниченной очередью"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._workers = 1
+
+    def start(self, workers: int) -> None:
+        if self._executor is None:
+            self._workers = max(1, workers)
+            # spawn: форк процесса с потоками (SQLAlchemy, пулы) небезопасен
+            self._executor = ProcessPoolExecutor(max_workers=self._workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            self._slots = asyncio.Semaphore(self._workers)
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, labels: List[Label], fmt: str, *, workers: int, font_path: str = "",
+                     queue_timeout: float) -> bytes:
+        # Обычно запущен в lifespan; без него (скрипты) — при первом листе
+        self.start(workers)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), queue_timeout)
+        except asyncio.TimeoutError:
+            raise LabelQueueFull()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, render_label_sheet, labels, fmt, font_path)
+        finally:
+            self._slots.release()
+
+
+label_renderer = LabelRenderer()
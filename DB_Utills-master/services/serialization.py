@@ -0,0 +1,129 @@
+"""
+Сериализация ответов API.
+
+FastJSONResponse — класс ответа приложения по умолчанию: orjson, если установлен
+(даты и datetime кодируются нативно), иначе stdlib json с isoformat для дат.
+RowSerializer — один сериализатор на ресурс: фиксированный список полей,
+значения читаются одним attrgetter. Для больших списков encode_listing
+выбирает кодирование по заголовку Accept: обычный JSON, columnar JSON
+(список полей + строки значений) или MessagePack (если установлен msgpack).
+"""
+import json
+from datetime import date, datetime, time
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+COLUMNAR_MEDIA_TYPE = "application/vnd.columnar+json"
+COLUMNAR_MSGPACK_MEDIA_TYPE = "application/vnd.columnar+msgpack"
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_encode_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ через orjson (или stdlib json с поддержкой дат)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RowSerializer:
+    """
+    Сериализатор ресурса: объект (ORM, Core DTO) -> dict по фиксированному списку полей.
+    Даты остаются объектами — их кодирует FastJSONResponse / encode_listing;
+    plain() отдаёт isoformat-строки для мест, где кодировщик неизвестен.
+    """
+
+    def __init__(self, fields: Sequence[str], date_fields: Iterable[str] = ()):
+        self.fields = tuple(fields)
+        self._get = attrgetter(*self.fields)
+        self._date_fields = tuple(name for name in self.fields if name in set(date_fields))
+
+    def values(self, obj) -> tuple:
+        return self._get(obj)
+
+    def dict(self, obj) -> dict:
+        return dict(zip(self.fields, self._get(obj)))
+
+    def plain(self, obj) -> dict:
+        result = self.dict(obj)
+        for name in self._date_fields:
+            value = result[name]
+            result[name] = value.isoformat() if value else None
+        return result
+
+
+def _wants(request: Optional[Request], media_type: str) -> bool:
+    return request is not None and media_type in request.headers.get("accept", "")
+
+
+def encode_listing(request: Optional[Request], items: Sequence, to_dict: Callable[[Any], dict],
+                   fields: Sequence[str], to_row: Callable[[Any], list], key: Optional[str] = None) -> Response:
+    """
+    Ответ со списком items в формате, запрошенном через Accept:
+      application/vnd.columnar+json    — {"fields": [...], "rows": [[...], ...]};
+      application/vnd.columnar+msgpack — то же в MessagePack;
+      application/msgpack              — обычная форма в MessagePack;
+      иначе                            — обычная форма JSON (to_dict на элемент).
+    key — обернуть список в объект {key: ...}, как в существующих ответах.
+    """
+    def wrap(listing):
+        return {key: listing} if key else listing
+
+    headers = {"Vary": "Accept"}
+    if _wants(request, COLUMNAR_MSGPACK_MEDIA_TYPE) and MSGPACK_AVAILABLE:
+        body = wrap({"fields": list(fields), "rows": [to_row(item) for item in items]})
+        return Response(msgpack.packb(body, default=_encode_default), media_type=COLUMNAR_MSGPACK_MEDIA_TYPE,
+                        headers=headers)
+    if _wants(request, COLUMNAR_MEDIA_TYPE):
+        body = wrap({"fields": list(fields), "rows": [to_row(item) for item in items]})
+        return Response(dumps(body), media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
+    content = wrap([to_dict(item) for item in items])
+    if _wants(request, MSGPACK_MEDIA_TYPE) and MSGPACK_AVAILABLE:
+        return Response(msgpack.packb(content, default=_encode_default), media_type=MSGPACK_MEDIA_TYPE,
+                        headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
+
+# Сериализаторы ресурсов (порядок полей — порядок колонок в columnar-ответах)
+DEVICE_FIELDS = (
+    "id", "name", "category", "category_id", "place_id", "classroom_id", "version",
+    "releaseDate", "softwareStartDate", "softwareEndDate", "updateDate",
+    "manufacturer", "manufacturer_id", "xCord", "yCord", "mapId",
+)
+device_serializer = RowSerializer(
+    DEVICE_FIELDS, date_fields=("releaseDate", "softwareStartDate", "softwareEndDate", "updateDate"),
+)
+
+TICKET_FIELDS = (
+    "id", "device_id", "device_name", "device_place", "author_id", "author_name",
+    "title", "description", "status", "created_at", "closed_at",
+)
+ticket_serializer = RowSerializer(TICKET_FIELDS, date_fields=("created_at", "closed_at"))
@@ -0,0 +1,270 @@
+"""
+SNMP sweep — рассылка sysDescr GET на все адреса подсети с одного UDP-сокета.
+
+Не зависит от ICMP и от pysnmp: пакеты SNMPv2c собираются вручную (BER),
+ответы принимаются асинхронно тем же сокетом. Состояние по хостам не хранится —
+request-id вычисляется из IP-адреса отправителя (как SYN-cookie), поэтому
+ответ можно проверить без таблицы отправленных запросов.
+"""
+import asyncio
+import logging
+import secrets
+import socket
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SYS_DESCR_OID = '1.3.6.1.2.1.1.1.0'
+
+# Младшие 4 бита request-id — индекс community, остальное — cookie от IP
+_MAX_SWEEP_COMMUNITIES = 16
+
+# Сколько пакетов отправляем между проверками темпа
+_PACING_BATCH = 32
+
+# Как часто забираем ответы, пока ждём хвост после последнего пакета
+_DRAIN_INTERVAL = 0.05
+
+_TAG_INTEGER = 0x02
+_TAG_OCTET_STRING = 0x04
+_TAG_NULL = 0x05
+_TAG_OID = 0x06
+_TAG_SEQUENCE = 0x30
+_TAG_GET_REQUEST = 0xA0
+_TAG_GET_RESPONSE = 0xA2
+# noSuchObject / noSuchInstance / endOfMibView
+_EXCEPTION_TAGS = (0x80, 0x81, 0x82)
+
+
+def _ber_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes((length,))
+    body = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(body),)) + body
+
+
+def _ber_tlv(tag: int, payload: bytes) -> bytes:
+    return bytes((tag,)) + _ber_length(len(payload)) + payload
+
+
+def _ber_int(value: int) -> bytes:
+    body = value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big', signed=True)
+    return _ber_tlv(_TAG_INTEGER, body)
+
+
+def _ber_oid(oid: str) -> bytes:
+    parts = [int(p) for p in oid.split('.')]
+    body = bytearray((parts[0] * 40 + parts[1],))
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return _ber_tlv(_TAG_OID, bytes(body))
+
+
+def build_get_request(community: str, request_id: int, oid: str = SYS_DESCR_OID) -> bytes:
+    """SNMPv2c GetRequest с одним varbind (значение NULL)."""
+    return _GetRequestTemplate(community, oid).render(request_id)
+
+
+class _GetRequestTemplate:
+    """
+    Заготовка GetRequest: на каждый хост меняется только request-id,
+    поэтому community и varbind кодируются один раз на весь sweep.
+    """
+
+    def __init__(self, community: str, oid: str = SYS_DESCR_OID):
+        varbind = _ber_tlv(_TAG_SEQUENCE, _ber_oid(oid) + _ber_tlv(_TAG_NULL, b''))
+        self.pdu_tail = _ber_int(0) + _ber_int(0) + _ber_tlv(_TAG_SEQUENCE, varbind)
+        self.head = _ber_int(1) + _ber_tlv(_TAG_OCTET_STRING, community.encode('utf-8'))
+
+    def render(self, request_id: int) -> bytes:
+        pdu = _ber_tlv(_TAG_GET_REQUEST, _ber_int(request_id) + self.pdu_tail)
+        return _ber_tlv(_TAG_SEQUENCE, self.head + pdu)
+
+
+def _ber_read(data: bytes, pos: int) -> Tuple[int, int, int]:
+    """Возвращает (tag, начало значения, конец значения)."""
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        n = length & 0x7F
+        if n == 0 or n > 4:
+            raise ValueError('unsupported BER length')
+        length = int.from_bytes(data[pos:pos + n], 'big')
+        pos += n
+    end = pos + length
+    if end > len(data):
+        raise ValueError('truncated BER value')
+    return tag, pos, end
+
+
+def parse_get_response(data: bytes) -> Optional[Tuple[int, str]]:
+    """
+    Разбирает SNMP GetResponse.
+    Возвращает (request_id, значение первого varbind) или None,
+    если пакет не ответ, содержит ошибку или значение отсутствует.
+    """
+    try:
+        tag, pos, end = _ber_read(data, 0)
+        if tag != _TAG_SEQUENCE:
+            return None
+        tag, pos, value_end = _ber_read(data, pos)        # version
+        if tag != _TAG_INTEGER:
+            return None
+        tag, pos, value_end = _ber_read(data, value_end)  # community
+        tag, pos, pdu_end = _ber_read(data, value_end)    # PDU
+        if tag != _TAG_GET_RESPONSE:
+            return None
+        tag, pos, value_end = _ber_read(data, pos)
+        request_id = int.from_bytes(data[pos:value_end], 'big', signed=True)
+        tag, pos, value_end = _ber_read(data, value_end)
+        if int.from_bytes(data[pos:value_end], 'big'):     # error-status
+            return None
+        tag, pos, value_end = _ber_read(data, value_end)  # error-index
+        tag, pos, _ = _ber_read(data, value_end)          # varbind list
+        tag, pos, _ = _ber_read(data, pos)                # first varbind
+        tag, pos, value_end = _ber_read(data, pos)        # oid
+        tag, pos, value_end = _ber_read(data, value_end)  # value
+        if tag in _EXCEPTION_TAGS or tag == _TAG_NULL:
+            return None
+        raw = data[pos:value_end]
+        if tag == _TAG_OCTET_STRING:
+            value = raw.decode('utf-8', errors='replace')
+        else:
+            value = str(int.from_bytes(raw, 'big'))
+        return request_id, value
+    except (IndexError, ValueError):
+        return None
+
+
+def _sweep_cookie(ip: str, secret: int) -> int:
+    """request-id для хоста без индекса community (младшие 4 бита нулевые)."""
+    mixed = (int.from_bytes(socket.inet_aton(ip), 'big') * 2654435761) ^ secret
+    return mixed & 0x7FFFFFF0
+
+
+class _SweepProtocol(asyncio.DatagramProtocol):
+    def __init__(self, secret: int, communities: List[str], on_reply: Callable[[str, dict], None]):
+        self.secret = secret
+        self.communities = communities
+        self.on_reply = on_reply
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        parsed = parse_get_response(data)
+        if parsed is None:
+            return
+        request_id, value = parsed
+        ip = addr[0]
+        try:
+            cookie = _sweep_cookie(ip, self.secret)
+        except OSError:
+            return
+        if request_id & 0x7FFFFFF0 != cookie:
+            logger.debug('SNMP sweep: чужой request-id от %s', ip)
+            return
+        index = request_id & 0x0F
+        if index >= len(self.communities):
+            return
+        self.on_reply(ip, {'sysDescr': value, 'community': self.communities[index]})
+
+    def error_received(self, exc):
+        logger.debug('SNMP sweep socket error: %s', exc)
+
+
+async def iter_snmp_sweep(
+    host_ips: Iterable[str],
+    communities: List[str],
+    port: int = 161,
+    packets_per_second: int = 2000,
+    timeout: float = 2.0,
+    local_bind: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Отправляет sysDescr GET на каждый адрес для каждого community с темпом
+    packets_per_second и отдаёт (ip, {'sysDescr', 'community'}) по мере прихода
+    ответов; после последнего пакета ждёт ещё timeout секунд.
+    Пока потребитель не забрал ответ, отправка стоит — это backpressure
+    для конвейера discovery. Адреса читаются из итератора лениво.
+    """
+    if not communities:
+        return
+    if len(communities) > _MAX_SWEEP_COMMUNITIES:
+        raise ValueError(f'At most {_MAX_SWEEP_COMMUNITIES} communities per SNMP sweep')
+
+    pending: Deque[Tuple[str, dict]] = deque()
+    answered: Set[str] = set()
+
+    def _record(ip: str, info: dict) -> None:
+        if ip in answered:
+            return
+        answered.add(ip)
+        pending.append((ip, info))
+
+    secret = secrets.randbits(31)
+    loop = asyncio.get_running_loop()
+    transport, _protocol = await loop.create_datagram_endpoint(
+        lambda: _SweepProtocol(secret, communities, _record),
+        local_addr=(local_bind or '0.0.0.0', 0),
+    )
+    batch_interval = _PACING_BATCH / max(1, int(packets_per_second))
+    started = time.monotonic()
+    next_batch_at = started
+    sent = 0
+    templates = [_GetRequestTemplate(community) for community in communities]
+    try:
+        for ip in host_ips:
+            cookie = _sweep_cookie(ip, secret)
+            for index, template in enumerate(templates):
+                transport.sendto(template.render(cookie | index), (ip, port))
+                sent += 1
+                if sent % _PACING_BATCH == 0:
+                    # После паузы потребителя не «догоняем» расписание — без всплесков
+                    now = time.monotonic()
+                    next_batch_at = max(next_batch_at, now - batch_interval) + batch_interval
+                    # Отдаём цикл событий даже без задержки, чтобы принимать ответы
+                    await asyncio.sleep(max(0.0, next_batch_at - now))
+                    while pending:
+                        yield pending.popleft()
+        deadline = time.monotonic() + timeout
+        while True:
+            while pending:
+                yield pending.popleft()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(_DRAIN_INTERVAL, remaining))
+    finally:
+        transport.close()
+        logger.info(
+            'SNMP sweep: отправлено %d пакетов, ответили %d хостов за %.2f с',
+            sent, len(answered), time.monotonic() - started,
+        )
+
+
+async def snmp_sweep(
+    host_ips: Iterable[str],
+    communities: List[str],
+    port: int = 161,
+    packets_per_second: int = 2000,
+    timeout: float = 2.0,
+    local_bind: Optional[str] = None,
+) -> Dict[str, dict]:
+    """Полный sweep; возвращает {ip: {'sysDescr': ..., 'community': ...}}."""
+    found: Dict[str, dict] = {}
+    sweep = iter_snmp_sweep(host_ips, communities, port, packets_per_second, timeout, local_bind)
+    async with aclosing(sweep):
+        async for ip, info in sweep:
+            found[ip] = info
+    return found
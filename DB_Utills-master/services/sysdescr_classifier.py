@@ -0,0 +1,142 @@
+"""
+Классификатор sysDescr: производитель и тип устройства за один проход.
+
+Правила лежат в data/sysdescr_rules.json (порядок = приоритет, побеждает
+первое совпавшее правило, как при последовательных re.search). Дополнительные
+правила можно подключить файлом из переменной окружения SYSDESCR_RULES_FILE —
+они проверяются раньше встроенных.
+
+Для каждого правила заранее извлекаются обязательные литералы (по одному на ветку
+альтернативы). При классификации строка один раз проходит через индекс литералов
+общий для обоих измерений, и регулярные выражения проверяются только у правил,
+чьи литералы в ней встретились.
+"""
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+RULES_PATH = DATA_DIR / 'sysdescr_rules.json'
+
+_DIMENSIONS = ('manufacturers', 'device_types')
+
+
+def _required_literals(pattern: str) -> Optional[List[str]]:
+    """
+    Литералы, без которых шаблон не может совпасть: самый длинный литерал
+    каждой ветки верхнего уровня. None — извлечь не удалось, правило проверяется всегда.
+    """
+    try:
+        tree = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    branches = [tree]
+    if len(tree) == 1 and tree[0][0] is sre_constants.BRANCH:
+        branches = tree[0][1][1]
+
+    literals = []
+    for branch in branches:
+        runs, current = [], ''
+        for op, av in branch:
+            if op is sre_constants.LITERAL:
+                # Строка сравнивается в нижнем регистре; лишний кандидат отсеет regex
+                current += chr(av).lower()
+            else:
+                if current:
+                    runs.append(current)
+                current = ''
+        if current:
+            runs.append(current)
+        if not runs:
+            return None
+        literals.append(max(runs, key=len))
+    return literals
+
+
+class SysDescrClassifier:
+    """Производитель и тип устройства по sysDescr; приоритет — порядок правил."""
+
+    def __init__(self, rules: Dict[str, Sequence[Tuple[str, str]]]):
+        self._names: Dict[str, List[str]] = {}
+        self._regexes: Dict[str, List[re.Pattern]] = {}
+        # литерал -> [(измерение, индекс правила)]
+        self._literal_index: Dict[str, List[Tuple[str, int]]] = {}
+        # Правила без извлекаемых литералов — кандидаты всегда
+        self._always: Dict[str, List[int]] = {}
+
+        for dim in _DIMENSIONS:
+            self._names[dim] = []
+            self._regexes[dim] = []
+            self._always[dim] = []
+            for index, (pattern, name) in enumerate(rules.get(dim, ())):
+                self._names[dim].append(name)
+                self._regexes[dim].append(re.compile(pattern))
+                literals = _required_literals(pattern)
+                if literals is None:
+                    self._always[dim].append(index)
+                    continue
+                for literal in set(literals):
+                    self._literal_index.setdefault(literal, []).append((dim, index))
+        self._literals = tuple(self._literal_index)
+
+    @classmethod
+    def from_files(cls, paths: Sequence[Path]) -> 'SysDescrClassifier':
+        """Правила из нескольких файлов; более ранний файл — более высокий приоритет."""
+        rules: Dict[str, List[Tuple[str, str]]] = {dim: [] for dim in _DIMENSIONS}
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            for dim in _DIMENSIONS:
+                rules[dim].extend((r['pattern'], r['name']) for r in data.get(dim, ()))
+        return cls(rules)
+
+    def classify(self, sys_descr: str) -> Tuple[str, str]:
+        """(производитель, тип устройства); '' — правило не нашлось."""
+        lower = (sys_descr or '').lower()
+        candidates: Dict[str, List[int]] = {dim: list(self._always[dim]) for dim in _DIMENSIONS}
+        for literal in self._literals:
+            if literal in lower:
+                for dim, index in self._literal_index[literal]:
+                    candidates[dim].append(index)
+
+        result = []
+        for dim in _DIMENSIONS:
+            found = ''
+            regexes = self._regexes[dim]
+            for index in sorted(set(candidates[dim])):
+                if regexes[index].search(lower):
+                    found = self._names[dim][index]
+                    break
+            result.append(found)
+        return result[0], result[1]
+
+
+_classifier: Optional[SysDescrClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> SysDescrClassifier:
+    """Классификатор по умолчанию; правила читаются при первом обращении."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                paths = [RULES_PATH]
+                extra = os.environ.get('SYSDESCR_RULES_FILE')
+                if extra:
+                    paths.insert(0, Path(extra))
+                _classifier = SysDescrClassifier.from_files(paths)
+    return _classifier
+
+
+def classify_sys_descr(sys_descr: str) -> Tuple[str, str]:
+    return get_classifier().classify(sys_descr)
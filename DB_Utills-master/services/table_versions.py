@@ -0,0 +1,62 @@
+"""
+Версии таблиц для кэшей, собранных из нескольких источников.
+
+Счётчик на (тема шины инвалидации, ключ) растёт при каждом событии темы во всех
+воркерах; событие без ключа (None) поднимает общий счётчик темы. Кэш хранит
+значение вместе с версиями, прочитанными до запроса к базе, и считает его
+актуальным, пока версии не изменились (см. services/map_bundle.py).
+
+Здесь же темы мест, категорий и тикетов: модели публикуют их после commit.
+Модуль не импортирует модели, чтобы они могли импортировать его.
+"""
+from typing import Dict, Optional, Tuple
+
+from services.invalidation_bus import invalidation_bus
+
+# Темы шины инвалидации; ключ — id места, у категорий и тикетов ключа нет
+PLACES_TOPIC = "places"
+CATEGORIES_TOPIC = "categories"
+TICKETS_TOPIC = "tickets"
+
+
+class TableVersions:
+    """Счётчики событий по темам и ключам"""
+
+    def __init__(self):
+        self._versions: Dict[Tuple[str, Optional[str]], int] = {}
+        self._tracked = set()
+
+    def track(self, topic: str) -> None:
+        if topic not in self._tracked:
+            self._tracked.add(topic)
+            invalidation_bus.subscribe(topic, lambda key: self._bump(topic, key))
+
+    def _bump(self, topic: str, key: Optional[str]) -> None:
+        self._versions[(topic, key)] = self._versions.get((topic, key), 0) + 1
+
+    def version(self, topic: str, key=None) -> Tuple[int, int]:
+        """(общий счётчик темы, счётчик ключа)"""
+        return (self._versions.get((topic, None), 0),
+                self._versions.get((topic, str(key)), 0) if key is not None else 0)
+
+
+table_versions = TableVersions()
+table_versions.track(PLACES_TOPIC)
+table_versions.track(CATEGORIES_TOPIC)
+table_versions.track(TICKETS_TOPIC)
+
+
+async def invalidate_places(*place_ids: int) -> None:
+    """После изменения или удаления мест (после commit)."""
+    for place_id in set(place_ids):
+        await invalidation_bus.publish(PLACES_TOPIC, str(place_id))
+
+
+async def invalidate_categories() -> None:
+    """После изменения категорий (после commit)."""
+    await invalidation_bus.publish(CATEGORIES_TOPIC)
+
+
+async def invalidate_tickets() -> None:
+    """После создания тикета или смены статуса (после commit)."""
+    await invalidation_bus.publish(TICKETS_TOPIC)
@@ -0,0 +1,64 @@
+"""
+Счётчики тикетов (/tickets/counters): open / in_progress / closed всего и по
+устройствам, категориям и картам.
+
+Один GROUP BY по устройствам (models/read_rows.ticket_counter_rows), категории
+и карты складываются из его строк. Результат кэшируется, пока не изменилась
+версия темы тикетов (создание, смена статуса — во всех воркерах), но не дольше
+ttl: перенос устройства в другую категорию или на другую карту тикеты не
+инвалидирует.
+"""
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.read_rows import TICKET_STATUSES, ticket_counter_rows
+from services.table_versions import TICKETS_TOPIC, table_versions
+
+
+def _zero() -> dict:
+    return dict.fromkeys(TICKET_STATUSES, 0)
+
+
+def _add(target: dict, counts: tuple) -> None:
+    for status, count in zip(TICKET_STATUSES, counts):
+        target[status] += count
+
+
+class TicketCounters:
+    """Последний результат счётчиков и версия тикетов, по которой он собран"""
+
+    def __init__(self):
+        self._cached: Optional[Tuple[tuple, float, dict]] = None
+
+    async def get(self, session: AsyncSession, ttl: float) -> dict:
+        version = table_versions.version(TICKETS_TOPIC)
+        if self._cached is not None:
+            cached_version, stored_at, result = self._cached
+            if cached_version == version and time.monotonic() - stored_at <= ttl:
+                return result
+        rows = await ticket_counter_rows(session)
+
+        totals = _zero()
+        categories: Dict[Optional[int], dict] = {}
+        maps: Dict[Optional[int], dict] = {}
+        devices = []
+        for device_id, category_id, map_id, *counts in rows:
+            _add(totals, counts)
+            _add(categories.setdefault(category_id, _zero()), counts)
+            _add(maps.setdefault(map_id, _zero()), counts)
+            devices.append({'device_id': device_id, 'category_id': category_id, 'map_id': map_id,
+                            **dict(zip(TICKET_STATUSES, counts))})
+        result = {
+            'totals': totals,
+            'devices': devices,
+            'categories': [{'category_id': key, **value} for key, value in categories.items()],
+            'maps': [{'map_id': key, **value} for key, value in maps.items()],
+        }
+        # Версия прочитана до запроса: пришедшая за это время инвалидация не потеряется
+        self._cached = (version, time.monotonic(), result)
+        return result
+
+
+ticket_counters = TicketCounters()